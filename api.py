@@ -3,44 +3,55 @@
 API Server สำหรับรับและจัดการไฟล์อัปโหลด + Authentication
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, request, jsonify, send_file, current_app
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import FileWrapper
+from urllib.parse import quote
 import logging
-import os
+import mimetypes
+import time
+import threading
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
-# Import Auth
-from auth import auth_manager, require_auth, require_role
+# Import Auth, Database และ Verification (ใช้ instance เดียวกันทั้งระบบ)
+from auth import auth_manager, require_auth, require_role, current_context
+from database import db_manager
+from verification import verification_manager
+from verification_routes import register_all_verification_routes
+from system_monitor import system_sampler, health_status
+from config import (
+    WARMUP_ENABLED, DOWNLOAD_OFFLOAD, DOWNLOAD_ACCEL_PREFIX, DOWNLOAD_CHUNK_SIZE, ensure_directories
+)
+from rate_limit import rate_limiter, client_ip, json_field
+import metrics
+import http_cache
+from http_cache import conditional
+from profiling import profiler, register_profiling_routes
+from bulk_users import register_bulk_user_routes
+from audit_rollups import register_analytics_routes
+from readiness import warmup, deep_health
+from upload_store import upload_store
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+# routes หลักอยู่ใน blueprint แอปจริงสร้างด้วย create_app() (api.app สร้างเมื่อถูกใช้ครั้งแรก)
+bp = Blueprint('api', __name__)
 
 # ตั้งค่า
-UPLOAD_FOLDER = Path(__file__).parent / "data" / "uploads"
+UPLOAD_FOLDER = upload_store.root
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'csv', 'json'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
-# สร้างโฟลเดอร์หากไม่มี
-UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = str(UPLOAD_FOLDER)
-app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
-
-
-def allowed_file(filename):
-    """ตรวจสอบนามสกุลไฟล์ที่อนุญาต"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 
 def allowed_file(filename):
     """ตรวจสอบนามสกุลไฟล์ที่อนุญาต"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def home():
     """หน้าแรก"""
     return jsonify({
@@ -49,11 +60,13 @@ def home():
         "status": "ทำงานปกติ",
         "authenticated_endpoints": {
             "POST /login": "เข้าสู่ระบบ",
+            "POST /logout": "ออกจากระบบ",
             "POST /register": "สมัครสมาชิก (Admin only)",
             "POST /upload": "อัปโหลดไฟล์",
             "GET /files": "ดูรายการไฟล์",
             "DELETE /file/<filename>": "ลบไฟล์",
-            "GET /health": "ตรวจสอบสถานะ"
+            "GET /health": "ตรวจสอบสถานะ (?deep=1 ตรวจ storage, stores และ scheduler)",
+            "GET /ready": "พร้อมรับคำขอหรือยัง (warm-up เสร็จแล้ว)"
         },
         "note": "ต้องเพิ่ม Authorization header: Bearer <token>"
     })
@@ -61,7 +74,8 @@ def home():
 
 # ===== Authentication Endpoints =====
 
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
+@rate_limiter.limit(("login_ip", client_ip), ("login_user", json_field('username')))
 def login():
     """เข้าสู่ระบบ"""
     try:
@@ -82,6 +96,7 @@ def login():
             )
             return jsonify({"error": "ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง"}), 401
         
+        rate_limiter.reset("login_user", username.lower())
         token = auth_manager.create_token(username)
         
         # บันทึก successful login
@@ -108,10 +123,47 @@ def login():
         return jsonify({"error": str(e)}), 500
 
 
-from datetime import timedelta
+@bp.route('/logout', methods=['POST'])
+@require_auth
+def logout():
+    """ออกจากระบบ (เพิกถอน token ปัจจุบัน)"""
+    try:
+        username = request.current_user['username']
+        token = current_context().token
+        if not auth_manager.revoke_token(token):
+            return jsonify({"error": "เพิกถอน token ไม่สำเร็จ"}), 400
+        
+        db_manager.end_session(token)
+        db_manager.add_audit_log(action="LOGOUT", username=username)
+        return jsonify({"success": True, "message": "ออกจากระบบสำเร็จ"}), 200
+    
+    except Exception as e:
+        logger.error(f"❌ ข้อผิดพลาด: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/users/<username>/revoke-tokens', methods=['POST'])
+@require_auth
+@require_role('admin')
+def revoke_user_tokens(username):
+    """เพิกถอนทุก token ของผู้ใช้ (Admin only)"""
+    try:
+        if not auth_manager.revoke_user_tokens(username):
+            return jsonify({"error": "เพิกถอน token ไม่สำเร็จ"}), 500
+        
+        db_manager.add_audit_log(
+            action="TOKENS_REVOKED",
+            username=request.current_user['username'],
+            details={"target_user": username}
+        )
+        return jsonify({"success": True, "message": f"เพิกถอน token ของ {username} แล้ว"}), 200
+    
+    except Exception as e:
+        logger.error(f"❌ ข้อผิดพลาด: {e}")
+        return jsonify({"error": str(e)}), 500
 
 
-@app.route('/register', methods=['POST'])
+@bp.route('/register', methods=['POST'])
 @require_auth
 @require_role('admin')
 def register():
@@ -149,13 +201,12 @@ def register():
 
 # ===== Profile Management =====
 
-@app.route('/profile', methods=['GET'])
+@bp.route('/profile', methods=['GET'])
 @require_auth
 def get_profile():
     """ดึงโปรไฟล์ของผู้ใช้ปัจจุบัน"""
     try:
-        username = request.current_user['username']
-        profile = db_manager.get_profile(username)
+        profile = current_context().profile
         
         if not profile:
             return jsonify({"error": "ไม่พบโปรไฟล์"}), 404
@@ -170,12 +221,13 @@ def get_profile():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/profile', methods=['PUT'])
+@bp.route('/profile', methods=['PUT'])
 @require_auth
 def update_profile():
     """อัปเดตโปรไฟล์"""
     try:
-        username = request.current_user['username']
+        context = current_context()
+        username = context.username
         data = request.get_json()
         
         if db_manager.update_profile(username, **data):
@@ -185,11 +237,11 @@ def update_profile():
                 details=data
             )
             
-            profile = db_manager.get_profile(username)
+            context.invalidate_profile()
             return jsonify({
                 "success": True,
                 "message": "อัปเดตโปรไฟล์สำเร็จ",
-                "profile": profile
+                "profile": context.profile
             }), 200
         else:
             return jsonify({"error": "อัปเดตโปรไฟล์ไม่สำเร็จ"}), 400
@@ -201,7 +253,7 @@ def update_profile():
 
 # ===== Data Export =====
 
-@app.route('/export/data', methods=['GET'])
+@bp.route('/export/data', methods=['GET'])
 @require_auth
 @require_role('admin')
 def export_all_data():
@@ -222,7 +274,7 @@ def export_all_data():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/export/user', methods=['GET'])
+@bp.route('/export/user', methods=['GET'])
 @require_auth
 def export_user_data():
     """ส่งออกข้อมูลของผู้ใช้"""
@@ -245,23 +297,38 @@ def export_user_data():
 
 # ===== Audit Logs =====
 
-@app.route('/audit-logs', methods=['GET'])
+@bp.route('/audit-logs', methods=['GET'])
 @require_auth
 @require_role('admin')
+@conditional(lambda: [db_manager.audit_db])
 def get_audit_logs():
-    """ดึง audit logs (Admin only)"""
+    """ค้นหา audit logs แบบแบ่งหน้าด้วย cursor (Admin only)
+    
+    Query: username, action, since, until (ISO 8601), after_id / before_id, limit
+    """
     try:
-        username = request.args.get('username')
-        limit = int(request.args.get('limit', 100))
-        
-        logs = db_manager.get_audit_logs(username=username, limit=limit)
+        args = request.args
+        result = db_manager.query_audit_logs(
+            username=args.get('username'),
+            action=args.get('action'),
+            since=args.get('since'),
+            until=args.get('until'),
+            after_id=int(args['after_id']) if args.get('after_id') else None,
+            before_id=int(args['before_id']) if args.get('before_id') else None,
+            limit=int(args.get('limit', 100))
+        )
         
         return jsonify({
             "success": True,
-            "count": len(logs),
-            "logs": logs
+            "count": len(result['logs']),
+            "total": result['total'],
+            "next_before_id": result['next_before_id'],
+            "next_after_id": result['next_after_id'],
+            "logs": result['logs']
         }), 200
     
+    except ValueError:
+        return jsonify({"error": "limit, after_id, before_id ต้องเป็นตัวเลข และ since/until ต้องเป็น ISO 8601"}), 400
     except Exception as e:
         logger.error(f"❌ ข้อผิดพลาด: {e}")
         return jsonify({"error": str(e)}), 500
@@ -269,9 +336,10 @@ def get_audit_logs():
 
 # ===== Statistics =====
 
-@app.route('/statistics', methods=['GET'])
+@bp.route('/statistics', methods=['GET'])
 @require_auth
 @require_role('admin')
+@conditional(lambda: [db_manager.users.users_file, db_manager.profiles_db, db_manager.audit_db, db_manager.sessions_db])
 def get_statistics():
     """ดึงสถิติ (Admin only)"""
     try:
@@ -287,9 +355,36 @@ def get_statistics():
         return jsonify({"error": str(e)}), 500
 
 
+@bp.route('/statistics/history', methods=['GET'])
+@require_auth
+@require_role('admin')
+@conditional(lambda: [db_manager.stats_file])
+def get_statistics_history():
+    """snapshot สถิติรายชั่วโมงย้อนหลังสำหรับกราฟแนวโน้ม (Admin only)"""
+    try:
+        since = request.args.get('since')
+        limit = min(max(1, int(request.args.get('limit', 168))), 24 * 90)
+        history = db_manager.get_statistics_history(
+            since=since,
+            limit=limit
+        )
+        
+        return jsonify({
+            "success": True,
+            "count": len(history),
+            "history": history
+        }), 200
+    
+    except ValueError:
+        return jsonify({"error": "limit ต้องเป็นตัวเลข และ since ต้องเป็น ISO 8601"}), 400
+    except Exception as e:
+        logger.error(f"❌ ข้อผิดพลาด: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 # ===== File Upload Endpoints =====
 
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
 @require_auth
 @require_role('admin', 'user')
 def upload_file():
@@ -310,8 +405,16 @@ def upload_file():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
         unique_filename = timestamp + filename
         
-        filepath = UPLOAD_FOLDER / unique_filename
-        file.save(str(filepath))
+        start = time.perf_counter()
+        filepath = upload_store.save_new(file, unique_filename)
+        unique_filename = filepath.name
+        elapsed = time.perf_counter() - start
+        size = filepath.stat().st_size
+        
+        metrics.upload_bytes.inc(amount=size)
+        metrics.upload_duration.observe(elapsed)
+        if elapsed > 0:
+            metrics.upload_throughput.observe(size / elapsed)
         
         logger.info(f"✓ อัปโหลดไฟล์สำเร็จ: {unique_filename} (ผู้ใช้: {request.current_user['username']})")
         
@@ -319,7 +422,7 @@ def upload_file():
             "success": True,
             "message": "อัปโหลดสำเร็จ",
             "filename": unique_filename,
-            "size": filepath.stat().st_size,
+            "size": size,
             "uploaded_by": request.current_user['username'],
             "timestamp": datetime.now().isoformat()
         }), 200
@@ -329,20 +432,21 @@ def upload_file():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/files', methods=['GET'])
+@bp.route('/files', methods=['GET'])
 @require_auth
 @require_role('admin', 'user', 'viewer')
+@conditional(upload_store.version)
 def list_files():
-    """แสดงรายการไฟล์ที่อัปโหลด"""
+    """แสดงรายการไฟล์ที่อัปโหลด (ไฟล์ใหม่สุดก่อนตาม shard วันที่)"""
     try:
         files = []
-        for file_path in UPLOAD_FOLDER.glob("*"):
-            if file_path.is_file():
-                files.append({
-                    "filename": file_path.name,
-                    "size": file_path.stat().st_size,
-                    "modified": datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
-                })
+        for entry in upload_store.iter_files():
+            stat = entry.stat()
+            files.append({
+                "filename": entry.name,
+                "size": stat.st_size,
+                "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
+            })
         
         return jsonify({
             "success": True,
@@ -355,18 +459,16 @@ def list_files():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/file/<filename>', methods=['DELETE'])
+@bp.route('/file/<filename>', methods=['DELETE'])
+@bp.route('/files/<filename>', methods=['DELETE'])
 @require_auth
 @require_role('admin', 'user')
 def delete_file(filename):
     """ลบไฟล์"""
     try:
-        filepath = UPLOAD_FOLDER / secure_filename(filename)
-        
-        if not filepath.exists():
+        if not upload_store.delete(secure_filename(filename)):
             return jsonify({"error": "ไฟล์ไม่พบ"}), 404
         
-        filepath.unlink()
         logger.info(f"✓ ลบไฟล์สำเร็จ: {filename} (ผู้ใช้: {request.current_user['username']})")
         
         return jsonify({
@@ -379,262 +481,204 @@ def delete_file(filename):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """ตรวจสอบสถานะ (ไม่ต้อง login)"""
-    return jsonify({
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "upload_folder_exists": UPLOAD_FOLDER.exists()
-    }), 200
-
-
-@app.errorhandler(413)
-def request_entity_too_large(error):
-    """จัดการข้อผิดพลาดไฟล์ขนาดใหญ่"""
-    return jsonify({"error": f"ไฟล์ใหญ่เกินไป (สูงสุด {MAX_FILE_SIZE/1024/1024:.0f}MB)"}), 413
-
-
-@app.errorhandler(404)
-def not_found(error):
-    """จัดการ API ที่ไม่พบ"""
-    return jsonify({"error": "ไม่พบ Endpoint นี้"}), 404
-
-
-if __name__ == '__main__':
-    logger.info("🚀 เริ่มเรียกใช้ API Server ด้วย Authentication...")
-    app.run(host='0.0.0.0', port=5000, debug=False)
-
-
-@app.route('/upload', methods=['POST'])
-def upload_file_old():
-    """เพิ่มไฟล์ (POST) - เก่า"""
+@bp.route('/files/<filename>', methods=['GET'])
+@require_auth
+@require_role('admin', 'user', 'viewer')
+def download_file(filename):
+    """ดาวน์โหลดไฟล์"""
     try:
-        # ตรวจสอบว่ามีไฟล์ในคำขอหรือไม่
-        if 'file' not in request.files:
-            return jsonify({"error": "ไม่มีไฟล์ในคำขอ"}), 400
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({"error": "ไม่ได้เลือกไฟล์"}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({"error": f"ไม่อนุญาตนามสกุลนี้ อนุญาต: {ALLOWED_EXTENSIONS}"}), 400
-        
-        # บันทึกไฟล์ด้วยชื่อปลอดภัย
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-        unique_filename = timestamp + filename
-        
-        filepath = UPLOAD_FOLDER / unique_filename
-        file.save(str(filepath))
+        filepath = upload_store.resolve(secure_filename(filename))
         
-        logger.info(f"✓ อัปโหลดไฟล์สำเร็จ: {unique_filename}")
+        if filepath is None:
+            return jsonify({"error": "ไม่พบไฟล์"}), 404
         
-        return jsonify({
-            "success": True,
-            "message": "อัปโหลดสำเร็จ",
-            "filename": unique_filename,
-            "size": filepath.stat().st_size,
-            "timestamp": datetime.now().isoformat()
-        }), 200
+        response = _send_upload(filepath)
+        metrics.file_downloads.inc(DOWNLOAD_OFFLOAD or "direct", str(response.status_code))
+        logger.info(f"✓ ดาวน์โหลดไฟล์: {filename} (ผู้ใช้: {request.current_user['username']}, {response.status_code})")
+        return response
     
     except Exception as e:
-        logger.error(f"❌ ข้อผิดพลาดในการอัปโหลด: {e}")
+        logger.error(f"❌ ข้อผิดพลาด: {e}")
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/files', methods=['GET'])
-def list_files():
-    """แสดงรายการไฟล์ที่อัปโหลด"""
+class _ChunkedFileWrapper(FileWrapper):
+    """FileWrapper ที่อ่านครั้งละ DOWNLOAD_CHUNK_SIZE (ค่าเริ่มต้นของ werkzeug 8 KiB ทำให้วนใน Python มาก)"""
+    
+    def __init__(self, file, buffer_size=8192):
+        super().__init__(file, max(buffer_size, DOWNLOAD_CHUNK_SIZE))
+
+
+def _send_upload(filepath: Path):
+    """ส่งไฟล์อัปโหลด (ETag/Last-Modified, Range/If-Range) หรือให้ reverse proxy ส่งแทนตาม DOWNLOAD_OFFLOAD"""
+    if DOWNLOAD_OFFLOAD == 'x-accel':
+        # nginx อ่านไฟล์เองจาก internal location (รวม Range, ETag, Last-Modified และ sendfile)
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(filepath.name)[0] or 'application/octet-stream')
+        location = quote(upload_store.relative_path(filepath))
+        response.headers['X-Accel-Redirect'] = DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + location
+        response.headers.set('Content-Disposition', 'attachment', filename=filepath.name)
+    else:
+        # ไฟล์อัปโหลดถูกสร้าง/ลบเท่านั้น ไม่ถูกเขียนทับ ลายเซ็น (mtime_ns, size) จึงใช้เป็น strong ETag ได้
+        stat = filepath.stat()
+        if 'wsgi.file_wrapper' not in request.environ:
+            # server ที่มี file_wrapper ของตัวเอง (เช่น gunicorn ใช้ sendfile) ใช้ของ server
+            request.environ['wsgi.file_wrapper'] = _ChunkedFileWrapper
+        # USE_X_SENDFILE (x-sendfile) ทำให้ send_file ส่งเพียง header X-Sendfile
+        response = send_file(
+            filepath, as_attachment=True, conditional=True,
+            etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}", last_modified=stat.st_mtime
+        )
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
+
+
+@bp.route('/status', methods=['GET'])
+def status():
+    """ตรวจสอบสถานะโฟลเดอร์อัปโหลด"""
     try:
-        files = []
-        for file_path in UPLOAD_FOLDER.glob("*"):
-            if file_path.is_file():
-                files.append({
-                    "filename": file_path.name,
-                    "size": file_path.stat().st_size,
-                    "modified": datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
-                })
+        stats = upload_store.stats()
         
         return jsonify({
-            "success": True,
-            "count": len(files),
-            "files": files
+            "status": "ทำงานอยู่",
+            "total_files": stats["files"],
+            "total_size": stats["bytes"],
+            "upload_folder": str(UPLOAD_FOLDER)
         }), 200
     
     except Exception as e:
-        logger.error(f"❌ ข้อผิดพลาดในการดูรายการไฟล์: {e}")
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/file/<filename>', methods=['DELETE'])
-def delete_file(filename):
-    """ลบไฟล์"""
+@bp.route('/health', methods=['GET'])
+def health_check():
+    """ตรวจสอบสถานะ (ไม่ต้อง login) ?deep=1 ตรวจเชิงลึกจากผลที่แคชไว้ (503 ถ้าไม่ผ่าน)"""
+    system_sampler.ensure_started()
+    system = system_sampler.current()
+    response = {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "upload_folder_exists": UPLOAD_FOLDER.exists(),
+        "system": system,
+        "system_status": health_status(system) if system else None
+    }
+    
+    if request.args.get('deep', '').lower() in ('1', 'true'):
+        try:
+            deep = deep_health.check()
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            deep = {"healthy": False, "error": str(e)}
+        response["deep"] = deep
+        if not deep["healthy"]:
+            response["status"] = "unhealthy"
+            return jsonify(response), 503
+    
+    return jsonify(response), 200
+
+
+@bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """พร้อมรับคำขอเมื่อ warm-up ดัชนี/แคชเสร็จแล้ว (503 ระหว่าง warm-up) สำหรับ load balancer"""
+    progress = warmup.status()
+    ready = progress["ready"] or not WARMUP_ENABLED
+    return jsonify({"ready": ready, "warmup": progress}), 200 if ready else 503
+
+
+@bp.route('/health/system', methods=['GET'])
+def system_health():
+    """สถานะระบบล่าสุด + p50/p95 ตามหน้าต่างเวลา (ไม่ต้อง login)"""
     try:
-        filepath = UPLOAD_FOLDER / secure_filename(filename)
-        
-        if not filepath.exists():
-            return jsonify({"error": "ไฟล์ไม่พบ"}), 404
+        system_sampler.ensure_started()
         
-        filepath.unlink()
-        logger.info(f"✓ ลบไฟล์สำเร็จ: {filename}")
+        windows = request.args.get('windows')
+        if windows:
+            windows = tuple(int(w) for w in windows.split(',') if w.strip())
+            summary = system_sampler.summary(windows)
+        else:
+            summary = system_sampler.summary()
         
         return jsonify({
             "success": True,
-            "message": f"ลบไฟล์ {filename} สำเร็จ"
+            "interval": system_sampler.interval,
+            "current": system_sampler.current(),
+            "windows": summary
         }), 200
     
-    except Exception as e:
-        logger.error(f"❌ ข้อผิดพลาดในการลบไฟล์: {e}")
-        return jsonify({"error": str(e)}), 500
-
-
-@app.route('/health', methods=['GET'])
-def health_check():
-    """ตรวจสอบสถานะ"""
-    return jsonify({
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "upload_folder_exists": UPLOAD_FOLDER.exists()
-    }), 200
+    except ValueError:
+        return jsonify({"error": "windows ต้องเป็นตัวเลขวินาทีคั่นด้วย ,"}), 400
 
 
-@app.errorhandler(413)
+@bp.app_errorhandler(413)
 def request_entity_too_large(error):
     """จัดการข้อผิดพลาดไฟล์ขนาดใหญ่"""
     return jsonify({"error": f"ไฟล์ใหญ่เกินไป (สูงสุด {MAX_FILE_SIZE/1024/1024:.0f}MB)"}), 413
 
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     """จัดการ API ที่ไม่พบ"""
     return jsonify({"error": "ไม่พบ Endpoint นี้"}), 404
 
 
-if __name__ == '__main__':
-    logger.info("🚀 เริ่มเรียกใช้ API Server...")
-    app.run(host='0.0.0.0', port=5000, debug=False)
-
-
-@app.route('/upload', methods=['POST'])
-def upload_file_old():
-    """เพิ่มไฟล์ (POST) - เก่า"""
-    try:
-        # ตรวจสอบว่ามีไฟล์ในคำขอ
-        if 'file' not in request.files:
-            return jsonify({'error': 'ไม่พบไฟล์ในคำขอ'}), 400
-        
-        file = request.files['file']
-        
-        # ตรวจสอบชื่อไฟล์
-        if file.filename == '':
-            return jsonify({'error': 'ไม่ได้เลือกไฟล์'}), 400
-        
-        # ตรวจสอบนามสกุล
-        if not allowed_file(file.filename):
-            return jsonify({'error': f'ประเภทไฟล์ไม่ได้รับอนุญาต'}), 400
-        
-        # บันทึกไฟล์
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-        filename = timestamp + filename
-        
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        file_size = os.path.getsize(filepath)
-        logger.info(f"✓ อัปโหลดไฟล์: {filename} ({file_size} bytes)")
-        
-        return jsonify({
-            'message': 'อัปโหลดสำเร็จ',
-            'filename': filename,
-            'size': file_size,
-            'timestamp': datetime.now().isoformat()
-        }), 200
+def create_app():
+    """สร้าง Flask app พร้อม routes ทั้งหมด (stores ถูกโหลดโดย warm-up ใน background ไม่บล็อกการสร้างแอป)"""
+    app = Flask(__name__)
     
-    except Exception as e:
-        logger.error(f"ข้อผิดพลาด: {e}")
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/files', methods=['GET'])
-def list_files():
-    """ดูรายชื่อไฟล์ (GET)"""
-    try:
-        files = []
-        for file in UPLOAD_FOLDER.iterdir():
-            if file.is_file():
-                files.append({
-                    'name': file.name,
-                    'size': file.stat().st_size,
-                    'modified': datetime.fromtimestamp(file.stat().st_mtime).isoformat()
-                })
-        
-        return jsonify({
-            'total': len(files),
-            'files': files
-        }), 200
+    # สร้างโฟลเดอร์หากไม่มี
+    ensure_directories()
+    UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
+    app.config['UPLOAD_FOLDER'] = str(UPLOAD_FOLDER)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+    app.config['USE_X_SENDFILE'] = DOWNLOAD_OFFLOAD == 'x-sendfile'
     
-    except Exception as e:
-        logger.error(f"ข้อผิดพลาด: {e}")
-        return jsonify({'error': str(e)}), 500
+    # วัดเวลาคำขอทุก endpoint + เปิด /metrics
+    metrics.init_app(app)
+    
+    # บีบอัด response JSON ขนาดใหญ่ (gzip/brotli)
+    http_cache.init_app(app)
+    
+    app.register_blueprint(bp)
+    
+    # ลงทะเบียน verification routes และ profile sharing
+    register_all_verification_routes(app, verification_manager, db_manager, require_auth)
+    
+    # Profiling (Admin only)
+    register_profiling_routes(app, profiler, auth_manager, require_auth, require_role)
+    
+    # จัดการผู้ใช้จำนวนมาก (Admin only)
+    register_bulk_user_routes(app, auth_manager, db_manager, require_auth, require_role)
+    
+    # รายงานกิจกรรมจาก audit rollups (Admin only)
+    register_analytics_routes(app, db_manager, require_auth, require_role)
+    
+    # สร้างดัชนีและแคชใน background ให้คำขอแรกไม่ต้องรอ (/ready รายงานความคืบหน้า)
+    if WARMUP_ENABLED:
+        warmup.start()
+    
+    return app
 
 
-@app.route('/files/<filename>', methods=['GET'])
-def download_file(filename):
-    """ดาวน์โหลดไฟล์ (GET)"""
-    try:
-        filepath = UPLOAD_FOLDER / secure_filename(filename)
-        
-        if not filepath.exists():
-            return jsonify({'error': 'ไม่พบไฟล์'}), 404
-        
-        from flask import send_file
-        logger.info(f"✓ ดาวน์โหลดไฟล์: {filename}")
-        return send_file(filepath, as_attachment=True)
-    
-    except Exception as e:
-        logger.error(f"ข้อผิดพลาด: {e}")
-        return jsonify({'error': str(e)}), 500
+_app = None
+_app_lock = threading.Lock()
 
 
-@app.route('/files/<filename>', methods=['DELETE'])
-def delete_file(filename):
-    """ลบไฟล์ (DELETE)"""
-    try:
-        filepath = UPLOAD_FOLDER / secure_filename(filename)
-        
-        if not filepath.exists():
-            return jsonify({'error': 'ไม่พบไฟล์'}), 404
-        
-        filepath.unlink()
-        logger.info(f"✓ ลบไฟล์: {filename}")
-        
-        return jsonify({'message': 'ลบไฟล์สำเร็จ'}), 200
-    
-    except Exception as e:
-        logger.error(f"ข้อผิดพลาด: {e}")
-        return jsonify({'error': str(e)}), 500
+def get_app():
+    """app ร่วมของ process (สร้างครั้งแรกที่เรียก)"""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+    return _app
 
 
-@app.route('/status', methods=['GET'])
-def status():
-    """ตรวจสอบสถานะ"""
-    try:
-        total_size = sum(f.stat().st_size for f in UPLOAD_FOLDER.iterdir() if f.is_file())
-        file_count = len(list(UPLOAD_FOLDER.glob('*')))
-        
-        return jsonify({
-            'status': 'ทำงานอยู่',
-            'total_files': file_count,
-            'total_size': total_size,
-            'upload_folder': str(UPLOAD_FOLDER)
-        }), 200
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+def __getattr__(name):
+    # รองรับ `from api import app` / `api.app` แบบเดิม โดยไม่สร้างแอปตอน import
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == '__main__':
@@ -647,18 +691,7 @@ if __name__ == '__main__':
         ]
     )
     
-    # นำเข้า Database และ Verification
-    from database import DatabaseManager
-    from verification import VerificationManager
-    from verification_routes import register_all_verification_routes
-    
-    # สร้าง instance
-    db_manager = DatabaseManager()
-    verification_manager = VerificationManager(db_manager)
-    
-    # ลงทะเบียน verification routes
-    register_all_verification_routes(app, verification_manager, db_manager, require_auth)
-    
-    logger.info("🚀 เริ่ม API Server ที่ http://localhost:5000")
-    logger.info("✅ เพิ่มเสร็จ: Verification Routes และ Profile Sharing")
-    app.run(debug=False, host='0.0.0.0', port=5000)
+    app = get_app()
+    system_sampler.start()
+    logger.info("🚀 เริ่ม API Server ด้วย Authentication ที่ http://localhost:5000")
+    app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Audit Columns - audit log แบบคอลัมน์ (NumPy) สำหรับการวิเคราะห์แบบ ad-hoc
+
+ตัวอย่าง:
+    python audit_columns.py summary --action LOGIN_FAILED --by username --top 10
+    python audit_columns.py summary --since 2026-02-01 --by hour
+
+numpy อยู่ใน requirements.txt แต่ import เฉพาะเมื่อใช้โมดูลนี้
+"""
+
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List
+
+from json_store import read_json, write_json_atomic, file_signature, normalize_timestamp
+from config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("id", "ts", "action", "username")
+GROUPS = ("action", "username", "hour", "day")
+SECONDS = {"hour": 3600, "day": 86400}
+CACHE_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("ต้องติดตั้ง numpy เพื่อใช้ audit_columns (pip install numpy)")
+    return numpy
+
+
+def _epoch(timestamp) -> int:
+    """ISO timestamp เป็นวินาที ตามปฏิทินเดียวกับคอลัมน์ ts (ค่าที่มี timezone ถูกแปลงเป็นเวลาท้องถิ่นก่อน)"""
+    return int((datetime.fromisoformat(normalize_timestamp(timestamp)) - EPOCH).total_seconds())
+
+
+class AuditTable:
+    """audit log แบบคอลัมน์: id/ts เป็น int64, action/username เป็นรหัสใน dictionary"""
+
+    def __init__(self, ids, ts, actions, usernames, action_names: List[str], username_names: List[str]):
+        """
+        Args:
+            ids, ts: array int64 ของ id และเวลา (วินาที)
+            actions, usernames: array int32 ของรหัสใน action_names / username_names
+            action_names, username_names: dictionary ของค่าที่ไม่ซ้ำ
+        """
+        self.ids = ids
+        self.ts = ts
+        self.actions = actions
+        self.usernames = usernames
+        self.action_names = action_names
+        self.username_names = username_names
+
+    # ===== Construction =====
+
+    @classmethod
+    def from_logs(cls, logs: List[Dict]) -> "AuditTable":
+        """แปลงรายการ dict จาก audit_logs.json เป็นคอลัมน์"""
+        np = _numpy()
+        action_codes, username_codes = {}, {}
+        actions = np.fromiter(
+            (action_codes.setdefault(e.get('action') or "", len(action_codes)) for e in logs),
+            dtype=np.int32, count=len(logs))
+        usernames = np.fromiter(
+            (username_codes.setdefault(e.get('username') or "", len(username_codes)) for e in logs),
+            dtype=np.int32, count=len(logs))
+        ids = np.fromiter((e['id'] for e in logs), dtype=np.int64, count=len(logs))
+        ts = np.array([(e.get('timestamp') or "1970-01-01T00:00:00")[:19] for e in logs],
+                      dtype='datetime64[s]').astype(np.int64)
+        return cls(ids, ts, actions, usernames, list(action_codes), list(username_codes))
+
+    @classmethod
+    def load(cls, audit_file=None, cache_dir=None, rebuild=False) -> "AuditTable":
+        """โหลดจากแคชคอลัมน์ (memory-map) ถ้ายังตรงกับ audit_logs.json ไม่เช่นนั้นสร้างใหม่แล้วเขียนแคช"""
+        np = _numpy()
+        audit_file = Path(audit_file) if audit_file else DATA_DIR / "database" / "audit_logs.json"
+        cache_dir = Path(cache_dir) if cache_dir else audit_file.parent / "audit_columns"
+        signature = list(file_signature(audit_file) or ())
+
+        meta = {} if rebuild else read_json(cache_dir / "meta.json", default={})
+        if meta.get('version') == CACHE_VERSION and meta.get('source_signature') == signature:
+            columns = {name: np.load(cache_dir / f"{name}.npy", mmap_mode='r') for name in COLUMNS}
+            logger.info(f"✅ โหลด audit columns จากแคช: {len(columns['id'])} รายการ")
+            return cls(columns['id'], columns['ts'], columns['action'], columns['username'],
+                       meta['action_names'], meta['username_names'])
+
+        table = cls.from_logs(read_json(audit_file))
+        table.save(cache_dir, signature)
+        logger.info(f"✅ สร้าง audit columns: {len(table)} รายการ")
+        return table
+
+    def save(self, cache_dir, source_signature=None):
+        """เขียนคอลัมน์เป็นไฟล์ .npy (โหลดด้วย mmap ได้) และ dictionary ใน meta.json"""
+        np = _numpy()
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for name, column in zip(COLUMNS, (self.ids, self.ts, self.actions, self.usernames)):
+            np.save(cache_dir / f"{name}.npy", np.ascontiguousarray(column))
+        # meta เขียนหลังสุด แคชจะถูกใช้เมื่อ meta ตรงกับไฟล์ต้นทางเท่านั้น
+        write_json_atomic(cache_dir / "meta.json", {
+            "version": CACHE_VERSION,
+            "source_signature": list(source_signature or ()),
+            "rows": len(self),
+            "action_names": self.action_names,
+            "username_names": self.username_names
+        })
+
+    # ===== Primitives =====
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self) -> int:
+        """หน่วยความจำของคอลัมน์ (ไม่รวม dictionary)"""
+        return sum(int(c.nbytes) for c in (self.ids, self.ts, self.actions, self.usernames))
+
+    def mask(self, action=None, username=None, since: str = None, until: str = None,
+             after_id: int = None):
+        """bool array ของแถวที่ตรงเงื่อนไข (action/username รับค่าเดียวหรือหลายค่า)"""
+        np = _numpy()
+        selected = np.ones(len(self), dtype=bool)
+        if action:
+            selected &= self._isin(self.actions, self.action_names, action)
+        if username:
+            selected &= self._isin(self.usernames, self.username_names, username)
+        if since:
+            selected &= self.ts >= _epoch(since)
+        if until:
+            selected &= self.ts <= _epoch(until)
+        if after_id is not None:
+            selected &= self.ids > after_id
+        return selected
+
+    def filter(self, selected) -> "AuditTable":
+        """ตารางย่อยตาม mask (dictionary ใช้ร่วมกัน)"""
+        return AuditTable(self.ids[selected], self.ts[selected], self.actions[selected],
+                          self.usernames[selected], self.action_names, self.username_names)
+
+    def count(self, selected=None) -> int:
+        return len(self) if selected is None else int(selected.sum())
+
+    def count_by(self, group: str, selected=None) -> Dict[str, int]:
+        """นับตาม action, username, hour หรือ day (เรียงจากมากไปน้อยสำหรับ action/username)"""
+        np = _numpy()
+        if group not in GROUPS:
+            raise ValueError(f"group ต้องเป็น {', '.join(GROUPS)}")
+        table = self if selected is None else self.filter(selected)
+
+        if group in SECONDS:
+            buckets, counts = np.unique(table.ts // SECONDS[group], return_counts=True)
+            width = 13 if group == 'hour' else 10
+            labels = (buckets * SECONDS[group]).astype('datetime64[s]').astype(str).tolist()
+            return {label[:width]: int(n) for label, n in zip(labels, counts)}
+
+        codes, names = ((table.actions, self.action_names) if group == 'action'
+                        else (table.usernames, self.username_names))
+        counts = np.bincount(codes, minlength=len(names))
+        order = np.argsort(-counts, kind='stable')
+        return {names[i]: int(counts[i]) for i in order if counts[i]}
+
+    def count_pairs(self, selected=None) -> Dict[tuple, int]:
+        """นับตามคู่ (username, action)"""
+        np = _numpy()
+        table = self if selected is None else self.filter(selected)
+        width = max(1, len(self.action_names))
+        keys, counts = np.unique(table.usernames.astype(np.int64) * width + table.actions, return_counts=True)
+        return {(self.username_names[k // width], self.action_names[k % width]): int(n)
+                for k, n in zip(keys.tolist(), counts)}
+
+    def rows(self, selected=None, limit=100) -> List[Dict]:
+        """แถวล่าสุด (ตาม mask) กลับเป็น dict สำหรับตรวจดูรายละเอียด"""
+        table = self if selected is None else self.filter(selected)
+        start = max(0, len(table) - limit)
+        timestamps = table.ts[start:].astype('datetime64[s]').astype(str).tolist()
+        return [
+            {"id": int(i), "timestamp": t, "action": self.action_names[a], "username": self.username_names[u]}
+            for i, t, a, u in zip(table.ids[start:], timestamps, table.actions[start:], table.usernames[start:])
+        ]
+
+    def _isin(self, codes, names, values):
+        np = _numpy()
+        values = [values] if isinstance(values, str) else values
+        wanted = [i for i, name in enumerate(names) if name in set(values)]
+        return np.isin(codes, np.array(wanted, dtype=codes.dtype))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="วิเคราะห์ audit log แบบคอลัมน์")
+    parser.add_argument("command", choices=["build", "summary"],
+                        help="build: สร้างแคชคอลัมน์ใหม่, summary: นับตามเงื่อนไข")
+    parser.add_argument("--audit-file", help="path ของ audit_logs.json (ค่าเริ่มต้น DATA_DIR/database)")
+    parser.add_argument("--cache-dir", help="โฟลเดอร์แคชคอลัมน์ (ค่าเริ่มต้น database/audit_columns)")
+    parser.add_argument("--action", action="append", help="กรอง action (ระบุซ้ำได้)")
+    parser.add_argument("--username", action="append", help="กรอง username (ระบุซ้ำได้)")
+    parser.add_argument("--since", help="ตั้งแต่ (ISO 8601)")
+    parser.add_argument("--until", help="ถึง (ISO 8601)")
+    parser.add_argument("--by", choices=GROUPS, default="action", help="จัดกลุ่มตาม")
+    parser.add_argument("--top", type=int, default=20, help="จำนวนกลุ่มที่แสดง")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    table = AuditTable.load(args.audit_file, args.cache_dir, rebuild=args.command == "build")
+    selected = table.mask(action=args.action, username=args.username, since=args.since, until=args.until)
+    groups = table.count_by(args.by, selected)
+    if args.by not in SECONDS:
+        groups = dict(list(groups.items())[:args.top])
+
+    print(json.dumps({
+        "rows": len(table),
+        "matched": table.count(selected),
+        "column_bytes": table.nbytes(),
+        "by": args.by,
+        "groups": groups
+    }, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Audit Rollups - ตัวนับสะสมของ audit log ตาม action, ผู้ใช้ และช่วงเวลา (ชั่วโมง/วัน)
+"""
+
+import sys
+import time
+import logging
+import argparse
+import threading
+from pathlib import Path
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from json_store import read_json, write_json_atomic, file_signature, normalize_timestamp
+from config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# เขียน checkpoint ลงไฟล์ไม่บ่อยกว่านี้ (วินาที) ส่วนที่ยังไม่เขียนจะถูกนับใหม่จาก audit log
+FLUSH_INTERVAL = 10
+# เก็บตัวนับรายชั่วโมงย้อนหลัง (วัน) ตัวนับรายวันและรายผู้ใช้เก็บตลอด
+HOURLY_RETENTION_DAYS = 90
+
+BUCKETS = {"hour": 13, "day": 10}  # ความยาว prefix ของ timestamp ISO
+
+
+class AuditRollups:
+    """ตัวนับที่อัปเดตทีละรายการจาก audit log (id เพิ่มขึ้นเสมอ)
+
+    ไฟล์เป็น checkpoint ที่รวมทุกรายการจนถึง last_id รายการที่ใหม่กว่าจะถูกนับเพิ่ม
+    จาก audit log ด้วย catch_up() จึงถูกต้องแม้หลาย process เขียน log เดียวกัน
+    ถ้าไฟล์ถูกเขียนจากที่อื่น (เช่น `python audit_rollups.py rebuild`) จะโหลดไฟล์ใหม่แทนการเขียนทับ
+    """
+
+    def __init__(self, filepath):
+        """
+        Args:
+            filepath: path ของ audit_rollups.json
+        """
+        self.filepath = Path(filepath)
+        self._lock = threading.RLock()
+        self._flushed_at = time.monotonic()
+        self._dirty = False
+        self._load()
+
+    # ===== Updates =====
+
+    def catch_up(self, logs: List[Dict]) -> int:
+        """นับรายการใน logs ที่ใหม่กว่า last_id คืนจำนวนที่นับเพิ่ม"""
+        with self._lock:
+            self._reload_if_changed()
+            if not logs or logs[-1]['id'] <= self.last_id:
+                return 0
+            start = bisect_right(logs, self.last_id, key=lambda e: e['id'])
+            for entry in logs[start:]:
+                self._apply(entry)
+            self.last_id = logs[-1]['id']
+            self._dirty = True
+            return len(logs) - start
+
+    def flush(self, force=False):
+        """เขียน checkpoint (ถ้ามีการเปลี่ยนและครบ FLUSH_INTERVAL หรือ force)"""
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._flushed_at < FLUSH_INTERVAL):
+                return False
+            if self._reload_if_changed():
+                # ตัวนับในหน่วยความจำเก่ากว่าไฟล์ รายการหลัง last_id ของไฟล์จะถูกนับใหม่ใน catch_up ครั้งถัดไป
+                return False
+            self._prune_hourly()
+            write_json_atomic(self.filepath, {
+                "last_id": self.last_id,
+                "updated_at": datetime.now().isoformat(),
+                "hourly": self.hourly,
+                "daily": self.daily,
+                "users": self.users
+            })
+            self._signature = file_signature(self.filepath)
+            self._dirty = False
+            self._flushed_at = time.monotonic()
+            return True
+
+    def rebuild(self, logs: List[Dict]) -> int:
+        """ล้างตัวนับแล้วนับใหม่จากประวัติทั้งหมด"""
+        with self._lock:
+            self._reset()
+            # นับใหม่ทั้งหมด ไม่โหลดค่าจากไฟล์เดิมกลับมาใน catch_up
+            self._signature = file_signature(self.filepath)
+            counted = self.catch_up(logs)
+            self.flush(force=True)
+            return counted
+
+    # ===== Queries =====
+
+    def series(self, bucket='hour', actions=None, since: str = None, until: str = None) -> Dict[str, List]:
+        """จำนวนต่อช่วงเวลาแยกตาม action: {action: [[ช่วงเวลา, จำนวน], ...]}"""
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket ต้องเป็น {', '.join(BUCKETS)}")
+        width = BUCKETS[bucket]
+        low = since[:width] if since else None
+        high = until[:width] if until else None
+        wanted = set(actions) if actions else None
+
+        with self._lock:
+            table = self.hourly if bucket == 'hour' else self.daily
+            result = {}
+            for key in sorted(table):
+                if (low and key < low) or (high and key > high):
+                    continue
+                for action, count in table[key].items():
+                    if wanted is None or action in wanted:
+                        result.setdefault(action, []).append([key, count])
+            return result
+
+    def totals(self) -> Dict[str, int]:
+        """จำนวนรวมต่อ action"""
+        with self._lock:
+            totals = {}
+            for counts in self.daily.values():
+                for action, count in counts.items():
+                    totals[action] = totals.get(action, 0) + count
+            return totals
+
+    def login_failures(self, limit=20, min_attempts=1) -> List[Dict]:
+        """ผู้ใช้ที่ login ไม่สำเร็จมากที่สุด พร้อมสัดส่วนความล้มเหลว"""
+        with self._lock:
+            rows = []
+            for username, counts in self.users.items():
+                failed = counts.get("LOGIN_FAILED", 0)
+                success = counts.get("LOGIN_SUCCESS", 0)
+                if not failed or failed + success < min_attempts:
+                    continue
+                rows.append({
+                    "username": username,
+                    "failed": failed,
+                    "success": success,
+                    "failure_ratio": round(failed / (failed + success), 4)
+                })
+        rows.sort(key=lambda r: (-r['failed'], -r['failure_ratio'], r['username']))
+        return rows[:limit]
+
+    # ===== Internals =====
+
+    def _apply(self, entry):
+        timestamp = entry.get('timestamp') or ""
+        action = entry.get('action') or "UNKNOWN"
+        for table, key in ((self.hourly, timestamp[:13]), (self.daily, timestamp[:10]),
+                           (self.users, entry.get('username'))):
+            if key:
+                counts = table.setdefault(key, {})
+                counts[action] = counts.get(action, 0) + 1
+
+    def _prune_hourly(self):
+        cutoff = (datetime.now() - timedelta(days=HOURLY_RETENTION_DAYS)).isoformat()[:13]
+        for key in [k for k in self.hourly if k < cutoff]:
+            del self.hourly[key]
+
+    def _reset(self):
+        self.last_id = 0
+        self.hourly, self.daily, self.users = {}, {}, {}
+
+    def _reload_if_changed(self) -> bool:
+        """โหลดไฟล์ใหม่ถ้าถูกเขียนจากที่อื่นหลังจากที่ instance นี้อ่าน/เขียนครั้งล่าสุด"""
+        if file_signature(self.filepath) == self._signature:
+            return False
+        logger.info("🔄 audit_rollups.json ถูกเปลี่ยนจากภายนอก โหลดใหม่")
+        self._load()
+        self._dirty = False
+        return True
+
+    def _load(self):
+        self._signature = file_signature(self.filepath)
+        data = read_json(self.filepath, default={})
+        if not isinstance(data, dict):
+            data = {}
+        self.last_id = data.get('last_id', 0)
+        self.hourly = data.get('hourly', {})
+        self.daily = data.get('daily', {})
+        self.users = data.get('users', {})
+
+
+def register_analytics_routes(app, db_manager, require_auth, require_role):
+    """ลงทะเบียน routes สำหรับรายงานกิจกรรมจาก audit rollups (Admin only)"""
+    from flask import request, jsonify
+
+    @app.route('/admin/analytics/activity', methods=['GET'])
+    @require_auth
+    @require_role('admin')
+    def activity_analytics():
+        """จำนวน action ต่อชั่วโมง/วัน เช่น ?bucket=hour&actions=LOGIN_SUCCESS,LOGIN_FAILED&since=2026-02-01"""
+        try:
+            args = request.args
+            since, until = args.get('since'), args.get('until')
+            actions = [a for a in args.get('actions', '').split(',') if a]
+            rollups = db_manager.audit_rollups()
+            series = rollups.series(
+                bucket=args.get('bucket', 'hour'),
+                actions=actions,
+                since=normalize_timestamp(since) if since else None,
+                until=normalize_timestamp(until) if until else None
+            )
+
+            return jsonify({
+                "success": True,
+                "bucket": args.get('bucket', 'hour'),
+                "last_id": rollups.last_id,
+                "totals": {action: sum(c for _, c in points) for action, points in series.items()},
+                "series": series
+            }), 200
+
+        except ValueError as e:
+            return jsonify({"error": f"พารามิเตอร์ไม่ถูกต้อง: {e}"}), 400
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/admin/analytics/login-failures', methods=['GET'])
+    @require_auth
+    @require_role('admin')
+    def login_failure_analytics():
+        """ผู้ใช้ที่ login ไม่สำเร็จมากที่สุด พร้อม failure ratio"""
+        try:
+            limit = min(max(1, int(request.args.get('limit', 20))), 500)
+            min_attempts = int(request.args.get('min_attempts', 1))
+            rows = db_manager.audit_rollups().login_failures(limit=limit, min_attempts=min_attempts)
+
+            return jsonify({
+                "success": True,
+                "count": len(rows),
+                "users": rows
+            }), 200
+
+        except ValueError:
+            return jsonify({"error": "limit และ min_attempts ต้องเป็นตัวเลข"}), 400
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return jsonify({"error": str(e)}), 500
+
+
+def rebuild_rollups(data_dir=None) -> Dict:
+    """นับ rollups ใหม่ทั้งหมดจาก database/audit_logs.json"""
+    db_dir = (Path(data_dir) if data_dir else DATA_DIR) / "database"
+    logs = read_json(db_dir / "audit_logs.json")
+    rollups = AuditRollups(db_dir / "audit_rollups.json")
+    counted = rollups.rebuild(logs)
+    summary = {"entries": counted, "last_id": rollups.last_id, "days": len(rollups.daily),
+               "users": len(rollups.users)}
+    logger.info(f"✅ สร้าง audit rollups ใหม่: {summary}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="จัดการ audit rollups (database/audit_rollups.json)")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: นับใหม่จาก audit_logs.json ทั้งหมด")
+    parser.add_argument("--data-dir", help="โฟลเดอร์ข้อมูล (ค่าเริ่มต้น DATA_DIR)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    summary = rebuild_rollups(args.data_dir)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,23 @@
 
 import logging
 import json
+import hmac
+import time
+import base64
 import hashlib
 import secrets
+import threading
 from pathlib import Path
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify
+
+import metrics
+from profiling import profiler
+from config import DATA_DIR, AUTH_TOKEN_MODE, AUTH_TOKEN_SECRET, AUTH_REVOCATION_REFRESH, AUTH_TOKEN_TTL
+from json_store import read_json, write_json_atomic, synchronized, read_snapshot, file_signature
+from lazy import LazyInstance
+from passwords import password_hasher
+from user_store import get_user_repository, USERS_FILE
 
 logger = logging.getLogger(__name__)
 
@@ -21,24 +32,131 @@ ROLES = {
     'viewer': ['read']
 }
 
-# เส้นทางไฟล์สำหรับผู้ใช้
-USERS_FILE = Path(__file__).parent / "data" / "users.json"
-TOKENS_FILE = Path(__file__).parent / "data" / "tokens.json"
+# เส้นทางไฟล์สำหรับ token
+TOKENS_FILE = DATA_DIR / "tokens.json"
+REVOKED_FILE = DATA_DIR / "revoked_tokens.json"
+
+# คำนำหน้า token แบบลงลายเซ็น (แยกจาก token สุ่มแบบเดิม)
+SIGNED_TOKEN_PREFIX = "v1"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _is_password(value) -> bool:
+    """รหัสผ่านที่แฮชได้ (ข้อความที่ไม่ว่าง)"""
+    return isinstance(value, str) and bool(value)
+
+
+class RevocationList:
+    """รายการ token/ผู้ใช้ที่ถูกเพิกถอน (ไฟล์เล็ก แชร์ได้หลาย process)"""
+    
+    def __init__(self, filepath, refresh_interval=5.0, max_ttl=AUTH_TOKEN_TTL):
+        """
+        Args:
+            filepath: ไฟล์ JSON {"tokens": {jti: exp}, "users": {username: revoked_at}}
+            refresh_interval: ตรวจไฟล์ใหม่อย่างมากทุกกี่วินาที
+            max_ttl: อายุสูงสุดของ token (การเพิกถอนผู้ใช้ที่เก่ากว่านี้ไม่มี token ให้ตัดแล้ว)
+        """
+        self.filepath = Path(filepath)
+        self.refresh_interval = refresh_interval
+        self.max_ttl = max_ttl
+        self._lock = threading.RLock()
+        self._data = {"tokens": {}, "users": {}}
+        self._signature = None
+        self._checked_at = 0.0
+    
+    def is_revoked(self, jti, username, issued_at) -> bool:
+        """token ถูกเพิกถอน หรือออกก่อนที่ผู้ใช้ถูกเพิกถอน"""
+        data = self._current()
+        if jti in data["tokens"]:
+            return True
+        revoked_at = data["users"].get(username)
+        return revoked_at is not None and issued_at <= revoked_at
+    
+    @synchronized
+    def revoke_token(self, jti, expires_at):
+        data = self._load()
+        data["tokens"][jti] = expires_at
+        self._save(data)
+    
+    @synchronized
+    def revoke_user(self, username, revoked_at=None):
+        data = self._load()
+        data["users"][username] = revoked_at or time.time()
+        self._save(data)
+    
+    def _current(self):
+        """ข้อมูลในหน่วยความจำ (stat ไฟล์อย่างมากทุก refresh_interval)"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.refresh_interval:
+            self._checked_at = now
+            signature = file_signature(self.filepath)
+            if signature != self._signature:
+                self._data = self._load()
+                self._signature = signature
+        return self._data
+    
+    def _load(self):
+        data = read_json(self.filepath, default={})
+        if not isinstance(data, dict):
+            data = {}
+        return {"tokens": data.get("tokens", {}), "users": data.get("users", {})}
+    
+    def _save(self, data):
+        # ตัด token ที่หมดอายุแล้ว และผู้ใช้ที่ถูกเพิกถอนก่อน token ใบที่เก่าที่สุดที่ยังใช้ได้ รายการจะได้ไม่โตไปเรื่อยๆ
+        now = time.time()
+        data["tokens"] = {jti: exp for jti, exp in data["tokens"].items() if exp > now}
+        data["users"] = {name: at for name, at in data["users"].items() if at > now - self.max_ttl}
+        write_json_atomic(self.filepath, data)
+        self._data = data
+        self._signature = file_signature(self.filepath)
+        self._checked_at = time.monotonic()
 
 
 class AuthManager:
     """จัดการการตรวจสอบสิทธิ์"""
     
-    def __init__(self):
-        self.users_file = USERS_FILE
-        self.tokens_file = TOKENS_FILE
+    def __init__(self, data_dir=None, token_mode=AUTH_TOKEN_MODE, token_secret=AUTH_TOKEN_SECRET):
+        """
+        Args:
+            data_dir: โฟลเดอร์ข้อมูล (ค่าเริ่มต้น config.DATA_DIR)
+            token_mode: "file" (เก็บ token ใน tokens.json) หรือ "signed" (HMAC ไม่ต้องอ่านไฟล์)
+            token_secret: กุญแจ HMAC สำหรับโหมด signed
+        """
+        # ตารางผู้ใช้ร่วมกับ DatabaseManager (user_store)
+        self.users = get_user_repository(Path(data_dir) / "users.json" if data_dir else USERS_FILE)
+        self.users_file = self.users.users_file
+        self.tokens_file = Path(data_dir) / "tokens.json" if data_dir else TOKENS_FILE
+        self.revocations = RevocationList(
+            Path(data_dir) / "revoked_tokens.json" if data_dir else REVOKED_FILE,
+            refresh_interval=AUTH_REVOCATION_REFRESH
+        )
+        self.token_mode = token_mode
+        if token_mode == 'signed' and not token_secret:
+            # กุญแจสุ่มใช้ได้เฉพาะ process เดียว token จะใช้ไม่ได้หลัง restart
+            logger.warning("⚠️ ไม่ได้ตั้ง AUTH_TOKEN_SECRET ใช้กุญแจสุ่มชั่วคราวแทน")
+            token_secret = secrets.token_hex(32)
+        self._token_secret = (token_secret or '').encode()
+        # lock สำหรับผู้เขียน (read-modify-write) และการถ่าย snapshot
+        self._lock = threading.RLock()
+        # แคชดัชนี token ตรวจความสดด้วยลายเซ็นไฟล์ (mtime, size)
+        self._token_index = {}
+        self._token_signature = None
+        # ปิดบัญชี/เปลี่ยน role ผ่านทางใดก็ตาม (AuthManager, DatabaseManager, bulk) เพิกถอน token เดิม
+        self.users.on_access_change(self.revoke_user_tokens)
         self._ensure_files()
     
     def _ensure_files(self):
         """สร้างไฟล์ถ้าไม่มี"""
         self.users_file.parent.mkdir(parents=True, exist_ok=True)
         
-        if not self.users_file.exists():
+        if not self.users.exists():
             self._create_default_admin()
         
         if not self.tokens_file.exists():
@@ -47,52 +165,35 @@ class AuthManager:
     
     def _create_default_admin(self):
         """สร้าง Admin เริ่มต้น"""
-        admin_user = {
-            "username": "admin",
-            "password": self._hash_password("admin123"),
-            "role": "admin",
-            "created": datetime.now().isoformat(),
-            "active": True
-        }
-        
-        with open(self.users_file, 'w') as f:
-            json.dump([admin_user], f, ensure_ascii=False, indent=2)
+        self.users.add("admin", self._hash_password("admin123"), role="admin")
         
         logger.info("✅ สร้าง Admin เริ่มต้น: username=admin, password=admin123")
     
     def _hash_password(self, password):
-        """แฮช รหัสผ่าน"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """แฮช รหัสผ่าน (KDF + salt ต่อผู้ใช้)"""
+        return password_hasher.hash(password)
     
     def _verify_password(self, password, hashed):
-        """ตรวจสอบรหัสผ่าน"""
-        return self._hash_password(password) == hashed
+        """ตรวจสอบรหัสผ่าน (constant-time)"""
+        return password_hasher.verify(password, hashed)
     
     def register_user(self, username, password, role='user'):
         """สมัครผู้ใช้ใหม่"""
         try:
-            # อ่านผู้ใช้ปัจจุบัน
-            with open(self.users_file, 'r') as f:
-                users = json.load(f)
-            
-            # ตรวจสอบว่ามีแล้ว
-            if any(u['username'] == username for u in users):
+            # ตรวจสอบว่ามีแล้ว (ก่อนคำนวณ KDF)
+            if self.users.get(username):
                 logger.warning(f"❌ ผู้ใช้มีอยู่แล้ว: {username}")
                 return False
             
             # เพิ่มผู้ใช้ใหม่
-            new_user = {
-                "username": username,
-                "password": self._hash_password(password),
-                "role": role if role in ROLES else 'user',
-                "created": datetime.now().isoformat(),
-                "active": True
-            }
-            
-            users.append(new_user)
-            
-            with open(self.users_file, 'w') as f:
-                json.dump(users, f, ensure_ascii=False, indent=2)
+            new_user = self.users.add(
+                username,
+                self._hash_password(password),
+                role=role if role in ROLES else 'user'
+            )
+            if new_user is None:
+                logger.warning(f"❌ ผู้ใช้มีอยู่แล้ว: {username}")
+                return False
             
             logger.info(f"✅ สมัครผู้ใช้สำเร็จ: {username} ({new_user['role']})")
             return True
@@ -101,45 +202,114 @@ class AuthManager:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return False
     
+    def upsert_users(self, items):
+        """สร้าง/อัปเดตผู้ใช้หลายคน เขียน users.json ครั้งเดียว
+        
+        Args:
+            items: รายการ dict ที่มี username และ password/role/active (ถ้ามี)
+        
+        Returns:
+            รายการผลต่อรายการ {"username", "status", "password_hash" หรือ "error"}
+        """
+        results = []
+        
+        # แฮชรหัสผ่านทั้งหมดพร้อมกันใน KDF pool (นอก lock ของตารางผู้ใช้)
+        # รหัสผ่านที่ไม่ใช่ข้อความไม่ถูกส่งเข้า pool (ไม่ให้ทั้ง chunk ล้มเพราะรายการเดียว)
+        to_hash = [item['password'] for item in items if _is_password(item.get('password'))]
+        hashes = iter(password_hasher.hash_many(to_hash))
+        
+        with self.users.batch() as batch:
+            for item in items:
+                username = item.get('username')
+                password = item.get('password')
+                password_hash = next(hashes) if _is_password(password) else None
+                
+                if not username:
+                    results.append({"username": username, "status": "error", "error": "ต้องระบุ username"})
+                    continue
+                if not isinstance(username, str):
+                    results.append({"username": None, "status": "error", "error": "username ต้องเป็นข้อความ"})
+                    continue
+                if password and password_hash is None:
+                    results.append({"username": username, "status": "error", "error": "password ต้องเป็นข้อความ"})
+                    continue
+                
+                user = batch.get(username)
+                if user is None:
+                    if not password_hash:
+                        results.append({"username": username, "status": "error",
+                                        "error": "ผู้ใช้ใหม่ต้องระบุ password"})
+                        continue
+                    user = batch.insert(
+                        username,
+                        password_hash,
+                        role=item.get('role') if item.get('role') in ROLES else 'user',
+                        active=item.get('active', True)
+                    )
+                    status = "created"
+                else:
+                    changes = {}
+                    if password_hash:
+                        changes['password'] = password_hash
+                    if item.get('role') in ROLES:
+                        changes['role'] = item['role']
+                    if 'active' in item:
+                        changes['active'] = bool(item['active'])
+                    batch.update(user, **changes)
+                    status = "updated"
+                
+                results.append({"username": username, "status": status, "role": user['role']})
+        
+        logger.info(f"✅ นำเข้าผู้ใช้ {sum(r['status'] != 'error' for r in results)}/{len(items)} รายการ")
+        return results
+    
     def authenticate(self, username, password):
         """ตรวจสอบชื่อผู้ใช้และรหัสผ่าน"""
         try:
-            with open(self.users_file, 'r') as f:
-                users = json.load(f)
+            user = self.users.get(username)
             
-            for user in users:
-                if user['username'] == username:
-                    if user['active'] and self._verify_password(password, user['password']):
-                        logger.info(f"✅ เข้าสู่ระบบสำเร็จ: {username}")
-                        return user
-                    else:
-                        logger.warning(f"❌ รหัสผ่านไม่ถูกต้อง: {username}")
-                        return None
+            if not user:
+                # คำนวณ KDF กับค่าหลอกเพื่อไม่ให้เวลาตอบบอกได้ว่ามีผู้ใช้นี้หรือไม่
+                self._verify_password(password, password_hasher.dummy_hash())
+                logger.warning(f"❌ ไม่พบผู้ใช้: {username}")
+                return None
+            
+            if self._verify_password(password, user['password']) and user['active']:
+                if password_hasher.needs_rehash(user['password']):
+                    user = self._rehash_password(username, password) or user
+                logger.info(f"✅ เข้าสู่ระบบสำเร็จ: {username}")
+                return user
             
-            logger.warning(f"❌ ไม่พบผู้ใช้: {username}")
+            logger.warning(f"❌ รหัสผ่านไม่ถูกต้อง: {username}")
             return None
         
         except Exception as e:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return None
     
-    def create_token(self, username, expires_in=86400):
-        """สร้าง Token (24 ชั่วโมง)"""
+    @synchronized
+    def create_token(self, username, expires_in=AUTH_TOKEN_TTL):
+        """สร้าง Token (ค่าเริ่มต้น 24 ชั่วโมง ไม่เกิน AUTH_TOKEN_TTL)"""
+        expires_in = min(expires_in, AUTH_TOKEN_TTL)
         try:
+            if self.token_mode == 'signed':
+                return self._create_signed_token(username, expires_in)
+            
             token = secrets.token_urlsafe(32)
             
-            with open(self.tokens_file, 'r') as f:
-                tokens = json.load(f)
+            tokens = self._read_json(self.tokens_file)
             
-            tokens.append({
+            record = {
                 "token": token,
                 "username": username,
                 "created": datetime.now().isoformat(),
                 "expires": (datetime.now() + timedelta(seconds=expires_in)).isoformat()
-            })
+            }
+            tokens.append(record)
             
-            with open(self.tokens_file, 'w') as f:
-                json.dump(tokens, f, ensure_ascii=False, indent=2)
+            self._write_json(self.tokens_file, tokens)
+            self._token_index = {t['token']: t for t in tokens}
+            self._token_signature = file_signature(self.tokens_file)
             
             logger.info(f"✅ สร้าง Token: {username}")
             return token
@@ -148,26 +318,25 @@ class AuthManager:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return None
     
+    @metrics.auth_verify_token_duration.time()
     def verify_token(self, token):
         """ตรวจสอบ Token"""
         try:
-            with open(self.tokens_file, 'r') as f:
-                tokens = json.load(f)
-            
-            for t in tokens:
-                if t['token'] == token:
-                    expires = datetime.fromisoformat(t['expires'])
-                    if expires > datetime.now():
-                        # ค้นหาผู้ใช้
-                        with open(self.users_file, 'r') as f:
-                            users = json.load(f)
-                        
-                        for user in users:
-                            if user['username'] == t['username']:
-                                return user
-                    else:
-                        logger.warning(f"❌ Token หมดอายุ")
-                        return None
+            if token.startswith(SIGNED_TOKEN_PREFIX + "."):
+                return self._verify_signed_token(token)
+            
+            t = self._token_lookup().get(token)
+            
+            if t:
+                expires = datetime.fromisoformat(t['expires'])
+                if expires > datetime.now():
+                    # ค้นหาผู้ใช้
+                    user = self.users.get(t['username'])
+                    if user and user.get('active', True):
+                        return user
+                else:
+                    logger.warning(f"❌ Token หมดอายุ")
+                    return None
             
             logger.warning(f"❌ Token ไม่ถูกต้อง")
             return None
@@ -176,49 +345,246 @@ class AuthManager:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return None
     
+    def revoke_token(self, token):
+        """เพิกถอน token (logout)"""
+        try:
+            if token.startswith(SIGNED_TOKEN_PREFIX + "."):
+                claims = self._decode_signed_token(token)
+                if not claims:
+                    return False
+                self.revocations.revoke_token(claims['jti'], claims['exp'])
+                logger.info(f"✅ เพิกถอน Token: {claims['sub']}")
+                return True
+            return self._remove_file_token(token)
+        
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return False
+    
+    def revoke_user_tokens(self, username):
+        """เพิกถอนทุก token ของผู้ใช้ที่ออกก่อนเวลานี้ (เช่น ปิดบัญชี)"""
+        try:
+            self.revocations.revoke_user(username)
+            with self._lock:
+                tokens = self._read_json(self.tokens_file)
+                remaining = [t for t in tokens if t['username'] != username]
+                if len(remaining) != len(tokens):
+                    self._write_json(self.tokens_file, remaining)
+                    self._token_index = {t['token']: t for t in remaining}
+                    self._token_signature = file_signature(self.tokens_file)
+            logger.info(f"✅ เพิกถอน Token ทั้งหมดของ: {username}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return False
+    
+    @synchronized
+    def _remove_file_token(self, token):
+        tokens = self._read_json(self.tokens_file)
+        remaining = [t for t in tokens if t['token'] != token]
+        if len(remaining) == len(tokens):
+            return False
+        self._write_json(self.tokens_file, remaining)
+        self._token_index = {t['token']: t for t in remaining}
+        self._token_signature = file_signature(self.tokens_file)
+        logger.info("✅ เพิกถอน Token")
+        return True
+    
+    # ===== Signed Tokens =====
+    
+    def _create_signed_token(self, username, expires_in):
+        """token แบบ v1.<payload>.<hmac> ที่ฝัง username, role และวันหมดอายุ"""
+        user = self.users.get(username) or {}
+        now = time.time()
+        claims = {
+            "sub": username,
+            "role": user.get('role', 'user'),
+            "iat": now,
+            "exp": now + expires_in,
+            "jti": secrets.token_hex(8),
+        }
+        payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+        signing_input = f"{SIGNED_TOKEN_PREFIX}.{payload}"
+        signature = _b64encode(hmac.new(self._token_secret, signing_input.encode(), hashlib.sha256).digest())
+        logger.info(f"✅ สร้าง Token (signed): {username}")
+        return f"{signing_input}.{signature}"
+    
+    def _decode_signed_token(self, token):
+        """ตรวจลายเซ็นแล้วคืน claims (None ถ้าไม่ถูกต้อง)"""
+        try:
+            prefix, payload, signature = token.split('.')
+        except ValueError:
+            return None
+        expected = hmac.new(self._token_secret, f"{prefix}.{payload}".encode(), hashlib.sha256).digest()
+        try:
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                return None
+            return json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+    
+    def _verify_signed_token(self, token):
+        """ตรวจ token แบบ signed (ไม่อ่าน tokens.json, ผู้ใช้ดูจากดัชนีในหน่วยความจำ)"""
+        claims = self._decode_signed_token(token)
+        if not claims:
+            logger.warning(f"❌ Token ไม่ถูกต้อง")
+            return None
+        if claims['exp'] <= time.time():
+            logger.warning(f"❌ Token หมดอายุ")
+            return None
+        if self.revocations.is_revoked(claims['jti'], claims['sub'], claims['iat']):
+            logger.warning(f"❌ Token ถูกเพิกถอน")
+            return None
+        # ดัชนีผู้ใช้อยู่ในหน่วยความจำ (stat ไฟล์ครั้งเดียว) กันบัญชีที่ถูกปิด/ลบจากอีก process
+        user = self.users.get(claims['sub'])
+        if not user or not user.get('active', True):
+            logger.warning(f"❌ ผู้ใช้ถูกปิดใช้งาน: {claims['sub']}")
+            return None
+        return {"username": claims['sub'], "role": claims['role'], "active": True}
+    
+    def _token_lookup(self):
+        """ดัชนี token -> record (โหลดใหม่เมื่อไฟล์ tokens เปลี่ยน)"""
+        signature = file_signature(self.tokens_file)
+        if signature is not None and signature == self._token_signature:
+            metrics.auth_token_cache.inc("hit")
+            return self._token_index
+        
+        metrics.auth_token_cache.inc("miss")
+        tokens = self._read_json(self.tokens_file)
+        self._token_index = {t['token']: t for t in tokens}
+        self._token_signature = signature
+        return self._token_index
+    
+    @synchronized
+    def warm_up(self):
+        """โหลดดัชนีผู้ใช้, token และรายการเพิกถอนล่วงหน้า คืนจำนวนที่โหลด"""
+        summary = {"users": self.users.count()}
+        if self.token_mode == 'file':
+            summary["tokens"] = len(self._token_lookup())
+        self.revocations.is_revoked(None, None, 0)
+        return summary
+    
+    def _rehash_password(self, username, password):
+        """แฮชรหัสผ่านใหม่ด้วย KDF ปัจจุบัน (เช่น sha256 แบบเดิม) คืนผู้ใช้ที่อัปเดตแล้ว"""
+        try:
+            user = self.users.update(username, password=self._hash_password(password))
+            if user:
+                logger.info(f"🔐 อัปเกรด password hash: {username}")
+            return user
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+        return None
+    
     def get_user_permissions(self, username):
         """ดึงสิทธิ์ของผู้ใช้"""
         try:
-            with open(self.users_file, 'r') as f:
-                users = json.load(f)
+            user = self.users.get(username)
             
-            for user in users:
-                if user['username'] == username:
-                    role = user.get('role', 'user')
-                    return ROLES.get(role, ROLES['user'])
+            if user:
+                role = user.get('role', 'user')
+                return ROLES.get(role, ROLES['user'])
             
             return []
         
         except Exception as e:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return []
+    
+    # ===== Helper Functions =====
+    
+    def _read_json(self, filepath: Path):
+        """อ่านไฟล์ JSON"""
+        return read_json(filepath)
+    
+    def _write_json(self, filepath: Path, data):
+        """เขียนไฟล์ JSON (atomic)"""
+        write_json_atomic(filepath, data)
+    
+    # ===== Snapshot =====
+    
+    def quiesce(self):
+        """หยุดผู้เขียนชั่วคราว (ใช้กับ with)"""
+        return self._lock
+    
+    def snapshot(self):
+        """ถ่าย snapshot ของ tokens และรายการเพิกถอน ณ จุดเวลาเดียว (ผู้ใช้อยู่ใน user_store)"""
+        with self._lock:
+            return read_snapshot([self.tokens_file, self.revocations.filepath], self.tokens_file.parent)
+
 
+# สร้าง instance เดียว (สร้างจริงเมื่อถูกใช้ครั้งแรก)
+auth_manager = LazyInstance(AuthManager)
 
-# สร้าง instance เดียว
-auth_manager = AuthManager()
+
+class RequestContext:
+    """ข้อมูลผู้ใช้ของคำขอหนึ่ง สร้างครั้งเดียวใน require_auth แล้วใช้ร่วมกันทั้งคำขอ"""
+    
+    _UNLOADED = object()
+    
+    def __init__(self, user, token):
+        self.user = user
+        self.token = token
+        self.username = user['username']
+        self.role = user.get('role', 'user')
+        self.permissions = ROLES.get(self.role, ROLES['user'])
+        self._profile = self._UNLOADED
+    
+    def has_permission(self, permission) -> bool:
+        return permission in self.permissions
+    
+    @property
+    def profile(self):
+        """โปรไฟล์ของผู้ใช้ (โหลดเมื่อใช้ครั้งแรก)"""
+        if self._profile is self._UNLOADED:
+            from database import db_manager
+            self._profile = db_manager.get_profile(self.username)
+        return self._profile
+    
+    def invalidate_profile(self):
+        """ให้โหลดโปรไฟล์ใหม่ครั้งถัดไป (หลังแก้ไข)"""
+        self._profile = self._UNLOADED
 
 
-# Decorators สำหรับ Flask
+def current_context():
+    """RequestContext ของคำขอปัจจุบัน (None ถ้ายังไม่ผ่าน require_auth)"""
+    from flask import g
+    return g.get('auth_context')
+
+
+# Decorators สำหรับ Flask (import flask เมื่อมีคำขอ ให้ CLI/งาน scheduler import auth ได้เร็ว)
+
+def bearer_token():
+    """อ่าน token จาก Authorization header (เอา "Bearer " ออก)"""
+    from flask import request
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[7:]
+    return token
+
+
+@profiler.profiled("require_auth")
+def _user_from_request():
+    """อ่าน Bearer token จาก header แล้วคืนผู้ใช้ (None ถ้าไม่ถูกต้อง)"""
+    return auth_manager.verify_token(bearer_token())
+
 
 def require_auth(f):
     """Decorator เพื่อตรวจสอบ Token"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({"error": "ไม่มี Authorization token"}), 401
-        
-        # เอา "Bearer " ออก
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        user = auth_manager.verify_token(token)
-        if not user:
-            return jsonify({"error": "Token ไม่ถูกต้อง"}), 401
-        
-        # เก็บผู้ใช้ใน request
-        request.current_user = user
+        if current_context() is None:
+            from flask import request, jsonify, g
+            if not request.headers.get('Authorization'):
+                return jsonify({"error": "ไม่มี Authorization token"}), 401
+            
+            user = _user_from_request()
+            if not user:
+                return jsonify({"error": "Token ไม่ถูกต้อง"}), 401
+            
+            # เก็บ context ไว้ตลอดคำขอ (request.current_user คงไว้ให้โค้ดเดิม)
+            g.auth_context = RequestContext(user, bearer_token())
+            request.current_user = user
         return f(*args, **kwargs)
     
     return decorated_function
@@ -229,11 +595,12 @@ def require_role(*roles):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if not hasattr(request, 'current_user'):
+            from flask import jsonify
+            context = current_context()
+            if context is None:
                 return jsonify({"error": "ต้อง Login ก่อน"}), 401
             
-            user_role = request.current_user.get('role', 'user')
-            if user_role not in roles:
+            if context.role not in roles:
                 return jsonify({"error": "ไม่มีสิทธิ์ในการเข้าถึง"}), 403
             
             return f(*args, **kwargs)
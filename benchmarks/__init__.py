@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks - วัดประสิทธิภาพ JSON stores, auth และ upload pipeline
+"""
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic Data Generator - สร้างข้อมูลจำลองสำหรับ benchmark (ไม่ต้องใช้เครือข่าย)
+"""
+
+import csv
+import json
+import random
+import string
+import hashlib
+from pathlib import Path
+from datetime import datetime, timedelta
+
+ACTIONS = [
+    "LOGIN_SUCCESS", "LOGIN_FAILED", "PROFILE_UPDATED", "USER_CREATED",
+    "VERIFICATION_CODE_SENT", "PROFILE_VERIFIED", "DATA_EXPORTED",
+]
+DEPARTMENTS = ["IT", "HR", "Finance", "Sales", "Operations", "Engineering"]
+WORDS = ["ถั่ว", "ข้อมูล", "ระบบ", "report", "upload", "alpha", "beta", "gamma", "delta", "ไฟล์"]
+
+
+def username(i):
+    return f"user{i:07d}"
+
+
+def make_users(count):
+    """ผู้ใช้รูปแบบเดียวกับ user_store (data/users.json)"""
+    now = datetime(2026, 1, 1).isoformat()
+    password = hashlib.sha256(b"password").hexdigest()
+    return [
+        {
+            "id": i + 1,
+            "username": username(i),
+            "password": password,
+            "role": "user" if i % 10 else "admin",
+            "created_at": now,
+            "updated_at": now,
+            "active": True
+        }
+        for i in range(count)
+    ]
+
+
+def make_auth_users(count):
+    """ผู้ใช้รูปแบบเดิมของ AuthManager (ก่อนรวมตารางผู้ใช้)"""
+    now = datetime(2026, 1, 1).isoformat()
+    password = hashlib.sha256(b"password").hexdigest()
+    return [
+        {"username": username(i), "password": password, "role": "user", "created": now, "active": True}
+        for i in range(count)
+    ]
+
+
+def make_profiles(count, seed=42):
+    """โปรไฟล์รูปแบบเดียวกับ DatabaseManager.add_profile"""
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1).isoformat()
+    return [
+        {
+            "username": username(i),
+            "full_name": f"User {i}",
+            "email": f"{username(i)}@example.com",
+            "phone": "",
+            "department": rng.choice(DEPARTMENTS),
+            "avatar": "",
+            "bio": "",
+            "verified": False,
+            "verified_at": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        for i in range(count)
+    ]
+
+
+def make_audit_logs(count, user_count=None, seed=42):
+    """audit logs เรียงตามเวลา"""
+    rng = random.Random(seed)
+    user_count = user_count or max(1, count // 10)
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            "id": i + 1,
+            "timestamp": (start + timedelta(seconds=i * 7)).isoformat(),
+            "action": rng.choice(ACTIONS),
+            "username": username(rng.randrange(user_count)),
+            "details": {},
+            "ip_address": "",
+            "user_agent": ""
+        }
+        for i in range(count)
+    ]
+
+
+def make_tokens(count, user_count=None, seed=42):
+    """tokens ที่ยังไม่หมดอายุ"""
+    rng = random.Random(seed)
+    user_count = user_count or max(1, count)
+    created = datetime.now().isoformat()
+    expires = (datetime.now() + timedelta(days=1)).isoformat()
+    return [
+        {
+            "token": "".join(rng.choices(string.ascii_letters + string.digits, k=43)),
+            "username": username(rng.randrange(user_count)),
+            "created": created,
+            "expires": expires
+        }
+        for _ in range(count)
+    ]
+
+
+def write_json(path, data):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def write_corpus(directory, csv_files=20, json_files=20, text_files=20, rows=1000, seed=42):
+    """สร้างไฟล์ CSV/JSON/Text สำหรับ DataProcessor.batch_process คืนรายการ path"""
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+
+    for i in range(csv_files):
+        path = directory / f"data_{i:04d}.csv"
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "name", "department", "amount"])
+            for r in range(rows):
+                writer.writerow([r, f"name{r}", rng.choice(DEPARTMENTS), round(rng.random() * 1000, 2)])
+        paths.append(path)
+
+    for i in range(json_files):
+        path = directory / f"data_{i:04d}.json"
+        write_json(path, {"items": [{"id": r, "value": rng.random()} for r in range(rows)], "source": "bench"})
+        paths.append(path)
+
+    for i in range(text_files):
+        path = directory / f"notes_{i:04d}.txt"
+        with open(path, 'w', encoding='utf-8') as f:
+            for _ in range(rows):
+                f.write(" ".join(rng.choices(WORDS, k=12)) + "\n")
+        paths.append(path)
+
+    return paths
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Load Test - จำลองผู้ใช้พร้อมกันหลายคนกับ api.app แล้วตรวจ lost update
+
+ตัวอย่าง:
+    python -m benchmarks.loadtest --concurrency 16 --duration 20
+    python -m benchmarks.loadtest --mix login=1,profile_get=4,profile_put=4,register=1
+    python -m benchmarks.loadtest --target http://localhost:5000 --data-dir ./data
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.run import summarize
+
+ADMIN = {"username": "admin", "password": "admin123"}
+PASSWORD = "loadtest-password"
+DEFAULT_MIX = "login=2,profile_get=4,profile_put=4,verify=1,upload=1,register=1"
+
+
+# ===== Clients =====
+
+class InProcessClient:
+    """เรียก api.app ผ่าน Flask test client (ไม่ผ่านเครือข่าย)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, token=None, json_body=None, files=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        kwargs = {"headers": headers}
+        if json_body is not None:
+            kwargs["json"] = json_body
+        if files:
+            kwargs["data"] = {name: (io.BytesIO(content), filename) for name, (filename, content) in files.items()}
+            kwargs["content_type"] = "multipart/form-data"
+        response = self.client.open(path, method=method, **kwargs)
+        return response.status_code, response.get_json(silent=True) or {}
+
+
+class HttpClient:
+    """เรียก API ผ่าน HTTP (เช่น localhost)"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, token=None, json_body=None, files=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = self.session.request(
+            method, self.base_url + path, headers=headers, json=json_body,
+            files={name: (filename, content) for name, (filename, content) in (files or {}).items()} or None,
+            timeout=30
+        )
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        return response.status_code, body
+
+
+# ===== Scenarios =====
+
+class Worker:
+    """ผู้ใช้จำลองหนึ่งคน (เป็นเจ้าของ username ของตัวเอง)"""
+
+    def __init__(self, index, client, admin_token, rng):
+        self.index = index
+        self.username = f"loaduser{index:04d}"
+        self.client = client
+        self.admin_token = admin_token
+        self.rng = rng
+        self.token = None
+        self.sequence = 0
+        # ค่า bio ล่าสุดที่เซิร์ฟเวอร์ตอบรับ (ใช้ตรวจ lost update)
+        self.last_bio = None
+        self.registered = []
+
+    def login(self):
+        status, body = self.client.request('POST', '/login',
+                                           json_body={"username": self.username, "password": PASSWORD})
+        if status == 200:
+            self.token = body.get("token")
+        return status
+
+    def profile_get(self):
+        return self.client.request('GET', '/profile', token=self.token)[0]
+
+    def profile_put(self):
+        self.sequence += 1
+        bio = f"lt-{self.index}-{self.sequence}"
+        status, _ = self.client.request('PUT', '/profile', token=self.token, json_body={"bio": bio})
+        if status == 200:
+            self.last_bio = bio
+        return status
+
+    def verify(self):
+        status, body = self.client.request('POST', '/verify/send-code', token=self.token)
+        if status != 200:
+            return status
+        return self.client.request('POST', '/verify/confirm-code', token=self.token,
+                                   json_body={"code": body.get("code")})[0]
+
+    def upload(self):
+        content = os.urandom(self.rng.choice((1, 16, 64)) * 1024)
+        return self.client.request('POST', '/upload', token=self.token,
+                                   files={"file": (f"load_{self.index}_{self.sequence}.txt", content)})[0]
+
+    def register(self):
+        self.sequence += 1
+        new_user = f"lt{self.index:04d}x{self.sequence:06d}"
+        status, _ = self.client.request('POST', '/register', token=self.admin_token,
+                                        json_body={"username": new_user, "password": PASSWORD})
+        if status == 201:
+            self.registered.append(new_user)
+        return status
+
+
+SCENARIOS = ("login", "profile_get", "profile_put", "verify", "upload", "register")
+
+
+def parse_mix(text):
+    """แปลง 'login=2,profile_get=4' เป็น (ชื่อ, น้ำหนัก)"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"ไม่รู้จัก scenario: {name}")
+        mix[name] = float(weight or 1)
+    return list(mix), list(mix.values())
+
+
+# ===== Runner =====
+
+def setup_users(client, workers_count, inprocess_db=None):
+    """สร้างผู้ใช้ทดสอบ (ผ่าน /register) และโปรไฟล์ (เฉพาะโหมด in-process)"""
+    status, body = client.request('POST', '/login', json_body=ADMIN)
+    if status != 200:
+        raise RuntimeError(f"login admin ไม่สำเร็จ ({status})")
+    admin_token = body["token"]
+
+    for i in range(workers_count):
+        username = f"loaduser{i:04d}"
+        client.request('POST', '/register', token=admin_token,
+                       json_body={"username": username, "password": PASSWORD})
+        if inprocess_db is not None and not inprocess_db.get_profile(username):
+            inprocess_db.add_profile(username)
+    return admin_token
+
+
+def run_worker(worker, names, weights, deadline, samples, lock):
+    local = []
+    if worker.login() != 200:
+        local.append(("login", 0, 0.0))
+    while time.monotonic() < deadline:
+        scenario = worker.rng.choices(names, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            status = getattr(worker, scenario)()
+        except Exception:
+            status = 0
+        local.append((scenario, status, time.perf_counter() - t0))
+    with lock:
+        samples.extend(local)
+
+
+def check_lost_updates(client, workers, users_file=None):
+    """ตรวจว่าการเขียนที่เซิร์ฟเวอร์ตอบรับแล้วยังอยู่ในไฟล์ครบ"""
+    lost_profiles = []
+    for worker in workers:
+        if worker.last_bio is None:
+            continue
+        status, body = client.request('GET', '/profile', token=worker.token)
+        bio = (body.get("profile") or {}).get("bio") if status == 200 else None
+        if bio != worker.last_bio:
+            lost_profiles.append({"username": worker.username, "expected": worker.last_bio, "found": bio})
+
+    registered = [u for w in workers for u in w.registered]
+    lost_users = None
+    if users_file and Path(users_file).exists():
+        with open(users_file, 'r', encoding='utf-8') as f:
+            existing = {u["username"] for u in json.load(f)}
+        lost_users = [u for u in registered if u not in existing]
+
+    return {
+        "profiles_checked": sum(1 for w in workers if w.last_bio is not None),
+        "profiles_lost": lost_profiles,
+        "users_registered": len(registered),
+        "users_lost": lost_users,
+    }
+
+
+def build_report(samples, elapsed):
+    """สรุป throughput, latency percentile และ error rate ต่อ scenario"""
+    report = {"duration_seconds": round(elapsed, 3), "scenarios": {}}
+    by_name = {}
+    for name, status, latency in samples:
+        by_name.setdefault(name, []).append((status, latency))
+
+    total = errors = 0
+    for name, items in sorted(by_name.items()):
+        latencies = [lat for _, lat in items]
+        failed = sum(1 for status, _ in items if not 200 <= status < 300)
+        stats = _latency_stats(latencies)
+        stats.update({
+            "requests": len(items),
+            "errors": failed,
+            "error_rate": round(failed / len(items), 4),
+            "throughput_per_sec": round(len(items) / elapsed, 3),
+            "status_codes": _count_statuses(items),
+        })
+        report["scenarios"][name] = stats
+        total += len(items)
+        errors += failed
+
+    all_latencies = [lat for _, _, lat in samples]
+    report["overall"] = _latency_stats(all_latencies) if all_latencies else {}
+    report["overall"].update({
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0,
+        "throughput_per_sec": round(total / elapsed, 3),
+    })
+    return report
+
+
+def _latency_stats(latencies):
+    """percentile ของ latency (ms) รวม p99 สำหรับ load test"""
+    stats = summarize(latencies)
+    ordered = sorted(latencies)
+    stats["p99_ms"] = round(ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000, 4)
+    # ops_per_sec ของ summarize คิดจากเวลารวมของ latency ซึ่งไม่ใช่ throughput ภายใต้ concurrency
+    for key in ("ops", "seconds", "ops_per_sec"):
+        stats.pop(key)
+    return stats
+
+
+def _count_statuses(items):
+    counts = {}
+    for status, _ in items:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test สำหรับ API")
+    parser.add_argument("--target", default="inprocess",
+                        help="inprocess (ค่าเริ่มต้น) หรือ URL เช่น http://localhost:5000")
+    parser.add_argument("--concurrency", type=int, default=8, help="จำนวนผู้ใช้พร้อมกัน")
+    parser.add_argument("--duration", type=float, default=10.0, help="ระยะเวลาทดสอบ (วินาที)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="สัดส่วน scenario เช่น login=2,profile_put=4")
+    parser.add_argument("--data-dir", help="โฟลเดอร์ข้อมูลของเซิร์ฟเวอร์ (โหมด HTTP) สำหรับตรวจ users.json")
+    parser.add_argument("--output", help="ไฟล์ JSON ผลลัพธ์ (ค่าเริ่มต้นพิมพ์ออกจอ)")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="เปิด rate limit ในโหมด in-process (ค่าเริ่มต้นปิด เพราะทุก worker ใช้ IP เดียวกัน)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    names, weights = parse_mix(args.mix)
+    workdir = None
+    logging.disable(logging.WARNING)
+
+    if args.target == "inprocess":
+        # ใช้ข้อมูลชั่วคราว ไม่แตะข้อมูลจริง
+        workdir = Path(tempfile.mkdtemp(prefix="loadtest_"))
+        os.environ["DATA_DIR"] = str(workdir / "data")
+        os.environ["RATE_LIMIT_ENABLED"] = "true" if args.rate_limit else "false"
+        import api
+        api.app.config['MAX_CONTENT_LENGTH'] = api.MAX_FILE_SIZE
+        make_client = lambda: InProcessClient(api.app)
+        db = api.db_manager
+        users_file = api.auth_manager.users_file
+    else:
+        make_client = lambda: HttpClient(args.target)
+        db = None
+        users_file = Path(args.data_dir) / "users.json" if args.data_dir else None
+
+    try:
+        admin_token = setup_users(make_client(), args.concurrency, inprocess_db=db)
+        workers = [
+            Worker(i, make_client(), admin_token, random.Random(args.seed + i))
+            for i in range(args.concurrency)
+        ]
+
+        samples, lock = [], threading.Lock()
+        started = time.monotonic()
+        deadline = started + args.duration
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for worker in workers:
+                pool.submit(run_worker, worker, names, weights, deadline, samples, lock)
+        elapsed = time.monotonic() - started
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "target": args.target,
+                "concurrency": args.concurrency,
+                "mix": dict(zip(names, weights)),
+            },
+            **build_report(samples, elapsed),
+            "lost_updates": check_lost_updates(make_client(), workers, users_file),
+        }
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    else:
+        print(output)
+
+    lost = report["lost_updates"]
+    if lost["profiles_lost"] or lost["users_lost"]:
+        print("❌ พบ lost update", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark Runner - วัด throughput/latency แล้วเทียบกับ baseline
+
+ตัวอย่าง:
+    python -m benchmarks.run --quick
+    python -m benchmarks.run --sizes 1000,100000,1000000 --output bench.json
+    python -m benchmarks.run --quick --save-baseline
+    python -m benchmarks.run --suite startup
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import subprocess
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+from datetime import datetime
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_SIZES = (1000, 100000, 1000000)
+QUICK_SIZES = (1000,)
+# โมดูลที่วัดเวลา import (ควรเร็วเพราะ stores/Flask/watchdog โหลดเมื่อใช้ครั้งแรก)
+STARTUP_MODULES = ("config", "auth", "database", "api", "main")
+
+
+def measure(operation, budget=2.0, min_ops=3, max_ops=5000):
+    """เรียก operation(i) ซ้ำจนหมดเวลา budget คืนค่าสถิติ"""
+    latencies = []
+    started = time.perf_counter()
+    i = 0
+    while True:
+        t0 = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - t0)
+        i += 1
+        elapsed = time.perf_counter() - started
+        if i >= max_ops or (elapsed >= budget and i >= min_ops):
+            break
+    return summarize(latencies)
+
+
+def summarize(latencies):
+    """สรุป latency (วินาที) เป็น ops/s และ percentile (ms)"""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 4)
+
+    return {
+        "ops": len(ordered),
+        "seconds": round(total, 6),
+        "ops_per_sec": round(len(ordered) / total, 3) if total else None,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+# ===== Suites =====
+
+def bench_database(sizes, budget, workdir):
+    """DatabaseManager add/get/update ที่ขนาดตารางต่างๆ"""
+    from benchmarks import datagen
+    from database import DatabaseManager
+
+    results = {}
+    for size in sizes:
+        data_dir = Path(workdir) / f"db_{size}"
+        datagen.write_json(data_dir / "users.json", datagen.make_users(size))
+        datagen.write_json(data_dir / "database" / "profiles.json", datagen.make_profiles(size))
+        datagen.write_json(data_dir / "database" / "audit_logs.json", datagen.make_audit_logs(size))
+        datagen.write_json(data_dir / "database" / "sessions.json", [])
+        db = DatabaseManager(data_dir=data_dir)
+        rng = random.Random(size)
+
+        results[f"database.get_user[{size}]"] = measure(
+            lambda i: db.get_user(datagen.username(rng.randrange(size))), budget)
+        results[f"database.update_user[{size}]"] = measure(
+            lambda i: db.update_user(datagen.username(rng.randrange(size)), role="viewer"), budget)
+        results[f"database.add_user[{size}]"] = measure(
+            lambda i: db.add_user(f"bench{i:07d}", "hash"), budget)
+
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def bench_auth(sizes, budget, workdir):
+    """AuthManager.verify_token / authenticate เทียบกับขนาดตาราง token"""
+    from benchmarks import datagen
+    from auth import AuthManager
+
+    results = {}
+    for size in sizes:
+        data_dir = Path(workdir) / f"auth_{size}"
+        user_count = min(size, 1000)
+        tokens = datagen.make_tokens(size, user_count=user_count)
+        datagen.write_json(data_dir / "users.json", datagen.make_auth_users(user_count))
+        datagen.write_json(data_dir / "tokens.json", tokens)
+        auth = AuthManager(data_dir=data_dir)
+        rng = random.Random(size)
+
+        def verify_cold(i):
+            # บังคับให้ parse tokens.json ใหม่ทุกครั้ง
+            auth._token_signature = None
+            auth.verify_token(rng.choice(tokens)["token"])
+
+        results[f"auth.verify_token_warm[{size}]"] = measure(
+            lambda i: auth.verify_token(rng.choice(tokens)["token"]), budget)
+        results[f"auth.verify_token_cold[{size}]"] = measure(verify_cold, budget)
+        results[f"auth.verify_token_invalid[{size}]"] = measure(
+            lambda i: auth.verify_token("invalid-token"), budget)
+        # login แรกของแต่ละผู้ใช้คำนวณ KDF (และ rehash sha256 เดิม) ครั้งถัดไปใช้แคช
+        results[f"auth.authenticate[{size}]"] = measure(
+            lambda i: auth.authenticate(datagen.username(rng.randrange(min(user_count, 20))), "password"), budget)
+
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def bench_api(budget, workdir, upload_kb=256, list_files=1000):
+    """/upload และ /files ผ่าน Flask test client"""
+    import api
+
+    client = api.app.test_client()
+    response = client.post('/login', json={"username": "admin", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {response.get_json()['token']}"}
+    payload = os.urandom(upload_kb * 1024)
+
+    def upload(i):
+        r = client.post('/upload', headers=headers,
+                        data={"file": (io.BytesIO(payload), f"bench_{i}.csv")},
+                        content_type="multipart/form-data")
+        assert r.status_code == 200, r.status_code
+
+    results = {f"api.upload[{upload_kb}KB]": measure(upload, budget, max_ops=500)}
+    results[f"api.upload[{upload_kb}KB]"]["mb_per_sec"] = round(
+        results[f"api.upload[{upload_kb}KB]"]["ops_per_sec"] * upload_kb / 1024, 3)
+
+    # เติมไฟล์ให้ครบ list_files ไฟล์ก่อนวัด /files
+    from upload_store import upload_store
+    existing = upload_store.stats()["files"]
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
+    for i in range(existing, list_files):
+        path = upload_store.path_for(f"{stamp}filler_{i:06d}.txt")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+
+    def list_all(i):
+        r = client.get('/files', headers=headers)
+        assert r.status_code == 200, r.status_code
+
+    results[f"api.files[{max(existing, list_files)}]"] = measure(list_all, budget)
+    return results
+
+
+def bench_processor(budget, workdir, rows=1000):
+    """DataProcessor.batch_process กับ corpus CSV/JSON/Text"""
+    from benchmarks import datagen
+    from data_processor import DataProcessor
+
+    input_dir = Path(workdir) / "corpus"
+    paths = datagen.write_corpus(input_dir, rows=rows)
+    processor = DataProcessor(input_dir, Path(workdir) / "results")
+
+    result = measure(lambda i: processor.batch_process(paths), budget, max_ops=200)
+    result["files_per_sec"] = round(result["ops_per_sec"] * len(paths), 3)
+    return {f"processor.batch_process[{len(paths)}x{rows}]": result}
+
+
+def import_time(module, env):
+    """เวลา import สะสมของโมดูล (วินาที) จาก python -X importtime ใน process ใหม่"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env, cwd=str(BENCH_DIR.parent))
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} ล้มเหลว: {result.stderr[-500:]}")
+    # รูปแบบบรรทัด: "import time: self [us] | cumulative | imported package"
+    for line in reversed(result.stderr.splitlines()):
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1e6
+    raise RuntimeError(f"ไม่พบ {module} ในผล -X importtime")
+
+
+def bench_startup(budget, workdir, min_runs=3, max_runs=20):
+    """เวลา import ของโมดูลหลัก และเวลา import api + create_app() (process ใหม่ทุกครั้ง)"""
+    env = dict(os.environ, DATA_DIR=str(Path(workdir) / "startup"), PYTHONDONTWRITEBYTECODE="")
+    create_app = "import time; t = time.perf_counter(); import api; api.create_app(); print(time.perf_counter() - t)"
+
+    def repeat(sample):
+        samples, started = [], time.perf_counter()
+        while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - started < budget):
+            samples.append(sample())
+        return summarize(samples)
+
+    results = {}
+    for module in STARTUP_MODULES:
+        results[f"startup.import[{module}]"] = repeat(lambda: import_time(module, env))
+    results["startup.create_app"] = repeat(lambda: float(subprocess.run(
+        [sys.executable, "-c", create_app], capture_output=True, text=True, env=env,
+        cwd=str(BENCH_DIR.parent), check=True).stdout.strip().splitlines()[-1]))
+    return results
+
+
+SUITES = ("database", "auth", "api", "processor", "startup")
+
+
+# ===== Baseline =====
+
+def compare(results, baseline, threshold):
+    """เทียบ ops/s กับ baseline คืนรายการที่ช้าลงเกิน threshold"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous.get("ops_per_sec") or not current.get("ops_per_sec"):
+            continue
+        ratio = current["ops_per_sec"] / previous["ops_per_sec"]
+        current["baseline_ratio"] = round(ratio, 3)
+        if ratio < 1 - threshold:
+            regressions.append({"benchmark": name, "ratio": round(ratio, 3),
+                                "baseline_ops_per_sec": previous["ops_per_sec"],
+                                "ops_per_sec": current["ops_per_sec"]})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark JSON stores, auth และ upload pipeline")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="เลือก suite (ระบุซ้ำได้)")
+    parser.add_argument("--sizes", help="ขนาดตาราง คั่นด้วย , (ค่าเริ่มต้น 1000,100000,1000000)")
+    parser.add_argument("--quick", action="store_true", help="ใช้ขนาด 1000 และ budget สั้น")
+    parser.add_argument("--budget", type=float, default=2.0, help="เวลาต่อ benchmark (วินาที)")
+    parser.add_argument("--output", help="ไฟล์ JSON ผลลัพธ์ (ค่าเริ่มต้นพิมพ์ออกจอ)")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="ไฟล์ baseline สำหรับเทียบ")
+    parser.add_argument("--save-baseline", action="store_true", help="บันทึกผลครั้งนี้เป็น baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="สัดส่วนที่ถือว่าช้าลง (0.2 = 20%%)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_SIZES if args.quick else DEFAULT_SIZES
+    if args.sizes:
+        sizes = tuple(int(s) for s in args.sizes.split(",") if s.strip())
+    budget = min(args.budget, 0.5) if args.quick else args.budget
+    suites = args.suite or list(SUITES)
+    random.seed(args.seed)
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_"))
+    # ต้องตั้ง DATA_DIR ก่อน import โมดูลของระบบ เพื่อไม่ให้แตะข้อมูลจริง
+    os.environ["DATA_DIR"] = str(workdir / "data")
+    sys.path.insert(0, str(BENCH_DIR.parent))
+    logging.disable(logging.WARNING)
+
+    results = {}
+    try:
+        if "database" in suites:
+            results.update(bench_database(sizes, budget, workdir))
+        if "auth" in suites:
+            results.update(bench_auth(sizes, budget, workdir))
+        if "api" in suites:
+            results.update(bench_api(budget, workdir))
+        if "processor" in suites:
+            results.update(bench_processor(budget, workdir))
+        if "startup" in suites:
+            results.update(bench_startup(budget, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": list(sizes),
+            "budget": budget,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    baseline_path = Path(args.baseline)
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    else:
+        print(output)
+
+    if args.save_baseline:
+        baseline_path.write_text(output, encoding='utf-8')
+        print(f"✅ บันทึก baseline: {baseline_path}", file=sys.stderr)
+
+    if regressions:
+        for r in regressions:
+            print(f"❌ ช้าลง: {r['benchmark']} ({r['ratio']:.0%} ของ baseline)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
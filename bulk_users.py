@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk Users - สร้าง/อัปเดตผู้ใช้และโปรไฟล์ทีละหลายรายการ และนำเข้าจาก CSV / JSON Lines
+"""
+
+import io
+import csv
+import json
+import logging
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# จำนวนรายการสูงสุดต่อคำขอ /admin/users/bulk
+BULK_MAX_ITEMS = 1000
+# จำนวนแถวต่อ batch ของการนำเข้าแบบ stream (หนึ่ง batch = เขียนแต่ละไฟล์ครั้งเดียว)
+IMPORT_BATCH_SIZE = 500
+
+# ฟิลด์ที่อ่านจาก CSV/JSON (คอลัมน์อื่นถูกข้าม)
+IMPORT_FIELDS = (
+    'username', 'password', 'role', 'active',
+    'full_name', 'email', 'phone', 'department', 'avatar', 'bio'
+)
+# ฟิลด์ที่ต้องเป็นข้อความ (ค่าชนิดอื่นทำให้รายการนั้น error ก่อนถึงการแฮชรหัสผ่าน)
+STRING_FIELDS = ('username', 'password', 'role')
+
+
+def normalize_item(raw: Dict) -> Dict:
+    """เลือกเฉพาะฟิลด์ที่รู้จัก ตัดช่องว่าง และแปลง active เป็น bool
+
+    Raises:
+        ValueError: username/password/role ไม่ใช่ข้อความ
+    """
+    item = {}
+    for key in IMPORT_FIELDS:
+        value = raw.get(key)
+        if value is None or value == "":
+            continue
+        if key in STRING_FIELDS and not isinstance(value, str):
+            raise ValueError(f"{key} ต้องเป็นข้อความ")
+        if isinstance(value, str):
+            value = value.strip()
+        if key == 'active' and not isinstance(value, bool):
+            value = str(value).lower() in ('1', 'true', 'yes', 'y')
+        item[key] = value
+    return item
+
+
+def iter_csv(stream) -> Iterator[Dict]:
+    """อ่าน CSV ทีละแถว (แถวแรกเป็นหัวคอลัมน์)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(text):
+        yield row
+
+
+def iter_json_lines(stream) -> Iterator[Dict]:
+    """อ่าน JSON Lines ทีละบรรทัด (บรรทัดว่างถูกข้าม)"""
+    for line_no, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8-sig'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield {"_error": f"บรรทัด {line_no}: JSON ไม่ถูกต้อง"}
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def upsert_batch(auth_manager, db_manager, raw_items: List[Dict], actor: str, offset: int = 0) -> List[Dict]:
+    """นำเข้าหนึ่ง batch: users.json (user_store) และ database/* เขียนอย่างละครั้ง
+
+    คืนผลหนึ่งรายการต่อ input ตามลำดับเดิม พร้อม index (offset + ตำแหน่งใน batch)
+    users.json กับโปรไฟล์/audit เขียนแยกกัน ถ้าส่วนหลังล้มเหลว รายการที่บันทึกผู้ใช้แล้วได้สถานะ "partial"
+    """
+    results: List[Dict] = [None] * len(raw_items)
+    items, positions = [], []
+    for position, raw in enumerate(raw_items):
+        if not isinstance(raw, dict):
+            results[position] = {"username": None, "status": "error", "error": "รายการต้องเป็น object"}
+        elif raw.get('_error'):
+            results[position] = {"username": None, "status": "error", "error": raw['_error']}
+        else:
+            try:
+                items.append(normalize_item(raw))
+            except ValueError as e:
+                username = raw.get('username')
+                results[position] = {"username": username if isinstance(username, str) else None,
+                                     "status": "error", "error": str(e)}
+                continue
+            positions.append(position)
+
+    try:
+        auth_results = auth_manager.upsert_users(items) if items else []
+    except Exception as e:
+        logger.error(f"❌ บันทึกผู้ใช้ไม่สำเร็จ: {e}")
+        auth_results = [{"username": item.get('username'), "status": "error", "error": f"บันทึกผู้ใช้ไม่สำเร็จ: {e}"}
+                        for item in items]
+
+    accepted = []
+    for position, item, auth_result in zip(positions, items, auth_results):
+        if auth_result['status'] == 'error':
+            results[position] = auth_result
+            continue
+        # ผู้ใช้ถูกเขียนใน user_store แล้ว ฐานข้อมูลเก็บเฉพาะโปรไฟล์และ audit
+        profile_item = {k: v for k, v in item.items() if k != 'password'}
+        profile_item.update(status=auth_result['status'], role=auth_result['role'])
+        accepted.append((position, profile_item))
+        results[position] = {"username": auth_result['username'], "status": auth_result['status']}
+
+    if accepted:
+        try:
+            db_manager.bulk_upsert_profiles([item for _, item in accepted], actor=actor)
+        except Exception as e:
+            logger.error(f"❌ บันทึกโปรไฟล์/audit ของ batch ไม่สำเร็จ (ผู้ใช้ถูกบันทึกแล้ว): {e}")
+            for position, item in accepted:
+                results[position] = {
+                    "username": item['username'],
+                    "status": "partial",
+                    "user_status": item['status'],
+                    "error": f"บันทึกผู้ใช้แล้ว แต่บันทึกโปรไฟล์/audit ไม่สำเร็จ: {e}"
+                }
+
+    for position, result in enumerate(results):
+        result["index"] = offset + position
+    return results
+
+
+def summarize(results: List[Dict]) -> Dict:
+    summary = {"created": 0, "updated": 0, "partial": 0, "failed": 0}
+    for r in results:
+        summary["failed" if r['status'] == 'error' else r['status']] += 1
+    return summary
+
+
+def register_bulk_user_routes(app, auth_manager, db_manager, require_auth, require_role):
+    """ลงทะเบียน routes สำหรับจัดการผู้ใช้จำนวนมาก (Admin only)"""
+    from flask import request, jsonify
+
+    @app.route('/admin/users/bulk', methods=['POST'])
+    @require_auth
+    @require_role('admin')
+    def bulk_upsert_users():
+        """สร้าง/อัปเดตผู้ใช้และโปรไฟล์หลายรายการในคำขอเดียว"""
+        try:
+            data = request.get_json() or {}
+            items = data.get('users')
+            if not isinstance(items, list) or not items:
+                return jsonify({"error": "ต้องระบุ users เป็นรายการ"}), 400
+            if len(items) > BULK_MAX_ITEMS:
+                return jsonify({"error": f"ไม่เกิน {BULK_MAX_ITEMS} รายการต่อคำขอ (ใช้ /admin/users/import)"}), 400
+
+            actor = request.current_user['username']
+            results = upsert_batch(auth_manager, db_manager, items, actor)
+
+            return jsonify({
+                "success": True,
+                "summary": summarize(results),
+                "results": results
+            }), 200
+
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/admin/users/import', methods=['POST'])
+    @require_auth
+    @require_role('admin')
+    def import_users():
+        """นำเข้าผู้ใช้จาก CSV หรือ JSON Lines แบบ stream (ทีละ batch)"""
+        try:
+            fmt = request.args.get('format')
+            if not fmt:
+                content_type = request.mimetype or ''
+                fmt = 'csv' if content_type in ('text/csv', 'application/csv') else 'jsonl'
+            if fmt not in ('csv', 'jsonl'):
+                return jsonify({"error": "format ต้องเป็น csv หรือ jsonl"}), 400
+
+            rows = iter_csv(request.stream) if fmt == 'csv' else iter_json_lines(request.stream)
+            actor = request.current_user['username']
+            results = []
+            batches = 0
+            for batch in chunked(rows, IMPORT_BATCH_SIZE):
+                results.extend(upsert_batch(auth_manager, db_manager, batch, actor, offset=len(results)))
+                batches += 1
+
+            summary = summarize(results)
+            db_manager.add_audit_log(
+                action="USERS_IMPORTED",
+                username=actor,
+                details={"format": fmt, "batches": batches, **summary}
+            )
+            logger.info(f"✅ นำเข้าผู้ใช้ ({fmt}): {summary}")
+
+            return jsonify({
+                "success": True,
+                "format": fmt,
+                "batches": batches,
+                "summary": summary,
+                "results": results
+            }), 200
+
+        except (UnicodeDecodeError, csv.Error) as e:
+            return jsonify({"error": f"อ่านไฟล์ไม่ได้: {e}"}), 400
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return jsonify({"error": str(e)}), 500
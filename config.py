@@ -18,13 +18,16 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 # เส้นทางไฟล์
 BASE_DIR = Path(__file__).resolve().parent
 LOG_DIR = BASE_DIR / "logs"
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
 BACKUP_DIR = BASE_DIR / "backups"
 
-# สร้างโฟลเดอร์หากไม่มี
-LOG_DIR.mkdir(exist_ok=True)
-DATA_DIR.mkdir(exist_ok=True)
-BACKUP_DIR.mkdir(exist_ok=True)
+
+def ensure_directories():
+    """สร้างโฟลเดอร์หลักหากไม่มี (เรียกตอนเริ่ม process ไม่ใช่ตอน import)"""
+    LOG_DIR.mkdir(exist_ok=True)
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    BACKUP_DIR.mkdir(exist_ok=True)
+
 
 # ตั้งค่างาน
 SCHEDULE_TIMES = {
@@ -34,6 +37,123 @@ SCHEDULE_TIMES = {
     "cleanup": os.getenv("SCHEDULE_CLEANUP_TIME", "18:00"),
 }
 
+# นโยบายการเก็บไฟล์ (ใช้โดยงาน cleanup)
+RETENTION_POLICIES = {
+    "logs": {
+        "path": LOG_DIR,
+        "max_age_days": int(os.getenv("RETENTION_LOG_DAYS", "7")),
+    },
+    "results": {
+        "path": DATA_DIR / "results",
+        "max_age_days": int(os.getenv("RETENTION_RESULT_DAYS", "30")),
+        "keep_last": int(os.getenv("RETENTION_RESULT_KEEP", "500")),
+    },
+    "exports": {
+        "path": DATA_DIR,
+        "pattern": "export_*.json",
+        "recursive": False,
+        "max_age_days": int(os.getenv("RETENTION_EXPORT_DAYS", "7")),
+    },
+    "user_exports": {
+        "path": DATA_DIR,
+        "pattern": "user_*_*.json",
+        "recursive": False,
+        "max_age_days": int(os.getenv("RETENTION_EXPORT_DAYS", "7")),
+    },
+    "backups": {
+        "path": BACKUP_DIR,
+        "pattern": "backup_*.zip",
+        "keep_last": int(os.getenv("RETENTION_BACKUP_KEEP", "14")),
+        "max_total_mb": float(os.getenv("RETENTION_BACKUP_MAX_MB", "1024")),
+    },
+}
+RETENTION_MAX_DELETIONS = int(os.getenv("RETENTION_MAX_DELETIONS", "100000"))
+# ไฟล์อัปโหลดล้างด้วย UploadStore.cleanup (ข้าม shard วันที่ที่ใหม่กว่าวันตัดรอบได้ทั้งโฟลเดอร์)
+RETENTION_UPLOAD_DAYS = int(os.getenv("RETENTION_UPLOAD_DAYS", "30"))
+
+# การเก็บสถานะระบบ (วินาทีต่อครั้ง / จำนวน sample ใน ring buffer)
+HEALTH_SAMPLE_INTERVAL = float(os.getenv("HEALTH_SAMPLE_INTERVAL", "10"))
+HEALTH_BUFFER_SIZE = int(os.getenv("HEALTH_BUFFER_SIZE", "360"))
+
+# Warm-up ดัชนี/แคชตอนเริ่ม API (/ready) และการตรวจเชิงลึก (/health?deep=1, แคชผลกี่วินาที)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "10"))
+HEALTH_DEEP_TTL = float(os.getenv("HEALTH_DEEP_TTL", "30"))
+# true = ระบบนี้มี scheduler (ไม่มี heartbeat ถือว่าไม่ผ่าน) main.py และ supervisor ตั้งให้เองเมื่อรัน scheduler
+HEALTH_EXPECT_SCHEDULER = os.getenv("HEALTH_EXPECT_SCHEDULER", "false").lower() == "true"
+# scheduler เขียน heartbeat ลงไฟล์ (ถือว่าหยุดทำงานถ้าไม่อัปเดตเกิน 3 รอบ)
+SCHEDULER_HEARTBEAT_FILE = DATA_DIR / "scheduler_heartbeat.json"
+SCHEDULER_HEARTBEAT_INTERVAL = float(os.getenv("SCHEDULER_HEARTBEAT_INTERVAL", "30"))
+
+# การแฮชรหัสผ่าน (pbkdf2_sha256 หรือ scrypt) ปรับ cost ให้เหมาะกับ latency ของ login
+AUTH_KDF = os.getenv("AUTH_KDF", "pbkdf2_sha256")
+AUTH_KDF_ITERATIONS = int(os.getenv("AUTH_KDF_ITERATIONS", "600000"))
+AUTH_SCRYPT_N = int(os.getenv("AUTH_SCRYPT_N", "16384"))
+AUTH_SCRYPT_R = int(os.getenv("AUTH_SCRYPT_R", "8"))
+AUTH_SCRYPT_P = int(os.getenv("AUTH_SCRYPT_P", "1"))
+AUTH_KDF_WORKERS = int(os.getenv("AUTH_KDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUTH_KDF_CACHE_SIZE = int(os.getenv("AUTH_KDF_CACHE_SIZE", "1024"))
+AUTH_KDF_CACHE_TTL = float(os.getenv("AUTH_KDF_CACHE_TTL", "300"))
+
+# Token: "file" (tokens.json) หรือ "signed" (HMAC ไม่ต้องใช้ไฟล์ร่วมกันระหว่าง process/host)
+AUTH_TOKEN_MODE = os.getenv("AUTH_TOKEN_MODE", "file")
+AUTH_TOKEN_SECRET = os.getenv("AUTH_TOKEN_SECRET", "")
+AUTH_REVOCATION_REFRESH = float(os.getenv("AUTH_REVOCATION_REFRESH", "5"))
+# อายุสูงสุดของ token (วินาที) การเพิกถอนรายผู้ใช้ที่เก่ากว่านี้ถูกลบทิ้งได้
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", "86400"))
+
+# Rate limit ("จำนวน/วินาที") backend: memory (ต่อ process) หรือ sqlite (ใช้ร่วมกันหลาย worker)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = Path(os.getenv("RATE_LIMIT_SQLITE_PATH", DATA_DIR / "rate_limits.sqlite3"))
+RATE_LIMITS = {
+    "login_ip": os.getenv("RATE_LIMIT_LOGIN_IP", "30/60"),
+    "login_user": os.getenv("RATE_LIMIT_LOGIN_USER", "10/300"),
+    "verify_ip": os.getenv("RATE_LIMIT_VERIFY_IP", "30/60"),
+    "verify_user": os.getenv("RATE_LIMIT_VERIFY_USER", "5/300"),
+}
+# จำนวน reverse proxy หน้าแอป (0 = รับคำขอโดยตรง ใช้ remote_addr) ใช้หา IP จริงจาก X-Forwarded-For
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))
+
+# Profiling (เปิดปิดได้ขณะทำงานผ่าน PUT /admin/profiling)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.0"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "true").lower() == "true"
+PROFILE_DIR = LOG_DIR / "profiles"
+
+# API Server
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "5000"))
+
+# บีบอัด response (gzip หรือ brotli ถ้าติดตั้ง) เฉพาะที่ใหญ่กว่า COMPRESS_MIN_SIZE bytes
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# ดาวน์โหลดไฟล์: ให้ reverse proxy ส่งไฟล์แทน Python ("" = ส่งเอง, "x-accel" = nginx, "x-sendfile" = Apache/lighttpd)
+DOWNLOAD_OFFLOAD = os.getenv("DOWNLOAD_OFFLOAD", "").lower()
+# location แบบ internal ของ nginx ที่ชี้ไปยังโฟลเดอร์อัปโหลด (ใช้กับ x-accel)
+DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "/_protected/uploads/")
+# ขนาด chunk เมื่อส่งไฟล์เองผ่าน werkzeug (bytes)
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Supervisor (python main.py --supervise) จำนวน process ต่อบทบาท
+# api, scheduler และ watcher มีได้สูงสุด 1 (0 = ไม่เริ่มบทบาทนั้น) scheduler รันใน API worker เมื่อมี API
+SUPERVISOR_WORKERS = {
+    "api": int(os.getenv("SUPERVISOR_API_WORKERS", "1")),
+    "scheduler": int(os.getenv("SUPERVISOR_SCHEDULER_WORKERS", "1")),
+    "watcher": int(os.getenv("SUPERVISOR_WATCHER_WORKERS", "1")),
+    "processor": int(os.getenv("SUPERVISOR_PROCESSOR_WORKERS", "1")),
+}
+# restart worker ที่ไม่ส่ง heartbeat เกินกี่วินาที / API ที่ /health ล้มเหลวติดกันกี่ครั้ง
+SUPERVISOR_HEARTBEAT_TIMEOUT = float(os.getenv("SUPERVISOR_HEARTBEAT_TIMEOUT", "30"))
+SUPERVISOR_HEALTH_INTERVAL = float(os.getenv("SUPERVISOR_HEALTH_INTERVAL", "10"))
+SUPERVISOR_HEALTH_FAILURES = int(os.getenv("SUPERVISOR_HEALTH_FAILURES", "3"))
+# processor รอให้ไฟล์นิ่งกี่วินาทีก่อนประมวลผล (รวมเหตุการณ์เป็น batch)
+PROCESSOR_BATCH_DELAY = float(os.getenv("PROCESSOR_BATCH_DELAY", "2"))
+
 # การแจ้งเตือน
 NOTIFY_ON_ERROR = os.getenv("NOTIFY_ON_ERROR", "true").lower() == "true"
 NOTIFY_EMAIL = os.getenv("NOTIFY_EMAIL", "")
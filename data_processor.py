@@ -9,6 +9,8 @@ import csv
 from pathlib import Path
 from datetime import datetime
 
+from profiling import profiler
+
 logger = logging.getLogger(__name__)
 
 
@@ -99,6 +101,7 @@ class DataProcessor:
             logger.warning(f"⚠️ ประเภทไฟล์ไม่รับรอง: {extension}")
             return None
     
+    @profiler.profiled("DataProcessor.batch_process")
     def batch_process(self, file_list):
         """ประมวลผลไฟล์หลายไฟล์"""
         results = []
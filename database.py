@@ -5,60 +5,88 @@ Database Manager - จัดการเก็บข้อมูลโปรไ
 
 import json
 import logging
+import threading
+from bisect import bisect_left, bisect_right
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from json_store import read_json, write_json_atomic, synchronized, read_snapshot, file_signature, normalize_timestamp
+from lazy import LazyInstance
+from profiling import profiler
+from user_store import get_user_repository, LEGACY_USERS_FILE
+from audit_rollups import AuditRollups
+from config import DATA_DIR
+
 logger = logging.getLogger(__name__)
 
+# ฟิลด์โปรไฟล์ที่แก้ไขได้ผ่าน bulk import
+PROFILE_FIELDS = ('full_name', 'email', 'phone', 'department', 'avatar', 'bio')
+
+# จำนวน audit log สูงสุดต่อหน้าของ query_audit_logs
+AUDIT_PAGE_MAX = 1000
+
+# จำนวน snapshot สถิติย้อนหลังที่เก็บ (รายชั่วโมง 90 วัน)
+STATS_HISTORY_LIMIT = 24 * 90
 
+
+@profiler.profile_methods("DatabaseManager")
 class DatabaseManager:
     """จัดการฐานข้อมูล JSON"""
     
-    def __init__(self):
-        self.data_dir = Path(__file__).parent / "data"
+    def __init__(self, data_dir=None):
+        """
+        Args:
+            data_dir: โฟลเดอร์ข้อมูล (ค่าเริ่มต้น config.DATA_DIR)
+        """
+        self.data_dir = Path(data_dir) if data_dir else DATA_DIR
         self.db_dir = self.data_dir / "database"
         self.db_dir.mkdir(parents=True, exist_ok=True)
         
-        self.users_db = self.db_dir / "users.json"
+        # ตารางผู้ใช้ร่วมกับ AuthManager (data/users.json)
+        self.users = get_user_repository(self.data_dir / "users.json")
         self.profiles_db = self.db_dir / "profiles.json"
         self.audit_db = self.db_dir / "audit_logs.json"
         self.sessions_db = self.db_dir / "sessions.json"
+        self.stats_file = self.db_dir / "statistics.json"
+        
+        # lock สำหรับผู้เขียน (read-modify-write) และการถ่าย snapshot
+        self._lock = threading.RLock()
+        # แคชโปรไฟล์พร้อมดัชนี username -> โปรไฟล์ (โหลดใหม่เมื่อไฟล์เปลี่ยน)
+        self._profiles = ([], {})
+        self._profiles_signature = None
+        # แคช audit log พร้อมดัชนีตำแหน่งต่อ username/action (audit log ต่อท้ายอย่างเดียว)
+        self._audit = ([], {})
+        self._audit_signature = None
+        # ตัวนับสะสมของ audit log (checkpoint อยู่ข้างไฟล์ log)
+        self.rollups = AuditRollups(self.db_dir / "audit_rollups.json")
+        # ตัวนับสถิติ: ชื่อ -> (ลายเซ็นไฟล์ที่นับ, ค่า) ใช้ได้ตราบที่ไฟล์ไม่ถูกเปลี่ยนจากภายนอก
+        self._stats = {}
         
         self._init_databases()
+        self._load_statistics()
     
     def _init_databases(self):
         """สร้างฐานข้อมูลถ้าไม่มี"""
-        for db_file in [self.users_db, self.profiles_db, self.audit_db, self.sessions_db]:
+        for db_file in [self.profiles_db, self.audit_db, self.sessions_db]:
             if not db_file.exists():
                 with open(db_file, 'w') as f:
                     json.dump([], f)
+        
+        if (self.data_dir / LEGACY_USERS_FILE).exists():
+            logger.warning("⚠️ พบตารางผู้ใช้เดิม database/users.json ให้รัน: python user_store.py migrate")
     
     # ===== Users Database =====
     
+    # add_user/update_user ไม่ถือ lock ของ DatabaseManager ระหว่างเขียน users.json
+    # (ลำดับ lock ทั้งระบบคือ users -> auth -> database -> verification ตาม capture_snapshot)
     def add_user(self, username, password_hash, role='user'):
         """เพิ่มผู้ใช้ใหม่"""
         try:
-            users = self._read_json(self.users_db)
-            
-            # ตรวจสอบว่ามีแล้ว
-            if any(u['username'] == username for u in users):
+            if self.users.add(username, password_hash, role=role) is None:
                 logger.warning(f"⚠️ ผู้ใช้มีอยู่แล้ว: {username}")
                 return False
             
-            new_user = {
-                "id": len(users) + 1,
-                "username": username,
-                "password": password_hash,
-                "role": role,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-                "active": True
-            }
-            
-            users.append(new_user)
-            self._write_json(self.users_db, users)
-            
             # เพิ่ม profile
             self.add_profile(username)
             
@@ -78,33 +106,23 @@ class DatabaseManager:
     
     def get_user(self, username: str) -> Optional[Dict]:
         """ดึงข้อมูลผู้ใช้"""
-        users = self._read_json(self.users_db)
-        for user in users:
-            if user['username'] == username:
-                return user
-        return None
+        return self.users.get(username)
     
     def get_all_users(self) -> List[Dict]:
         """ดึงข้อมูลผู้ใช้ทั้งหมด"""
-        return self._read_json(self.users_db)
+        return self.users.all()
     
     def update_user(self, username: str, **kwargs):
         """อัปเดตข้อมูลผู้ใช้"""
         try:
-            users = self._read_json(self.users_db)
-            
-            for user in users:
-                if user['username'] == username:
-                    user.update(kwargs)
-                    user['updated_at'] = datetime.now().isoformat()
-                    break
-            
-            self._write_json(self.users_db, users)
+            if self.users.update(username, **kwargs) is None:
+                logger.warning(f"⚠️ ไม่พบผู้ใช้: {username}")
+                return False
             
             self.add_audit_log(
                 action="USER_UPDATED",
                 username=username,
-                details=kwargs
+                details={k: v for k, v in kwargs.items() if k != 'password'}
             )
             
             logger.info(f"✅ อัปเดตผู้ใช้: {username}")
@@ -116,27 +134,19 @@ class DatabaseManager:
     
     # ===== Profiles Database =====
     
+    @synchronized
     def add_profile(self, username: str, full_name: str = "", email: str = ""):
         """เพิ่มโปรไฟล์ผู้ใช้"""
         try:
-            profiles = self._read_json(self.profiles_db)
+            before = file_signature(self.profiles_db)
+            profiles, _ = self._profile_records()
             
-            new_profile = {
-                "username": username,
-                "full_name": full_name,
-                "email": email,
-                "phone": "",
-                "department": "",
-                "avatar": "",
-                "bio": "",
-                "verified": False,
-                "verified_at": None,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            }
+            new_profile = self._new_profile(username, datetime.now().isoformat())
+            new_profile.update(full_name=full_name, email=email)
             
             profiles.append(new_profile)
-            self._write_json(self.profiles_db, profiles)
+            self._save_profiles(profiles)
+            self._update_stat("total_profiles", self.profiles_db, before, 1, profiles)
             
             logger.info(f"✅ สร้างโปรไฟล์: {username}")
             return True
@@ -145,29 +155,38 @@ class DatabaseManager:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return False
     
+    def _new_profile(self, username: str, now: str) -> Dict:
+        """โปรไฟล์ว่างของผู้ใช้"""
+        return {
+            "username": username,
+            "full_name": "",
+            "email": "",
+            "phone": "",
+            "department": "",
+            "avatar": "",
+            "bio": "",
+            "verified": False,
+            "verified_at": None,
+            "created_at": now,
+            "updated_at": now
+        }
+    
     def get_profile(self, username: str) -> Optional[Dict]:
-        """ดึงโปรไฟล์ผู้ใช้"""
-        profiles = self._read_json(self.profiles_db)
-        for profile in profiles:
-            if profile['username'] == username:
-                return profile
-        return None
+        """ดึงโปรไฟล์ผู้ใช้ (สำเนา แก้ไขผ่าน update_profile)"""
+        profile = self._profile_records()[1].get(username)
+        return dict(profile) if profile else None
     
+    @synchronized
     def update_profile(self, username: str, **kwargs):
         """อัปเดตโปรไฟล์"""
         try:
-            profiles = self._read_json(self.profiles_db)
-            
-            found = False
-            for profile in profiles:
-                if profile['username'] == username:
-                    profile.update(kwargs)
-                    profile['updated_at'] = datetime.now().isoformat()
-                    found = True
-                    break
+            profiles, index = self._profile_records()
+            profile = index.get(username)
             
-            if found:
-                self._write_json(self.profiles_db, profiles)
+            if profile is not None:
+                profile.update(kwargs)
+                profile['updated_at'] = datetime.now().isoformat()
+                self._save_profiles(profiles)
                 
                 self.add_audit_log(
                     action="PROFILE_UPDATED",
@@ -185,15 +204,95 @@ class DatabaseManager:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return False
     
+    def _profile_records(self):
+        """(profiles, ดัชนี username -> โปรไฟล์) โหลดใหม่เมื่อไฟล์เปลี่ยน"""
+        signature = file_signature(self.profiles_db)
+        if signature is None or signature != self._profiles_signature:
+            profiles = self._read_json(self.profiles_db)
+            self._profiles = (profiles, {p['username']: p for p in profiles})
+            self._profiles_signature = signature
+        return self._profiles
+    
+    def _save_profiles(self, profiles):
+        try:
+            self._write_json(self.profiles_db, profiles)
+        except Exception:
+            # โปรไฟล์ในแคชอาจถูกแก้ไปแล้ว ให้โหลดจากไฟล์ใหม่ครั้งถัดไป
+            self._profiles_signature = None
+            raise
+        if profiles is not self._profiles[0]:
+            self._profiles = (profiles, {p['username']: p for p in profiles})
+        else:
+            index = self._profiles[1]
+            for profile in profiles[len(index):]:
+                index[profile['username']] = profile
+        self._profiles_signature = file_signature(self.profiles_db)
+    
+    @synchronized
+    def warm_up(self):
+        """โหลดดัชนีโปรไฟล์และ audit log, ตาม audit rollups ให้ทัน และตัวนับสถิติล่วงหน้า"""
+        self._profile_records()
+        self.audit_rollups()
+        return self.get_statistics()
+    
+    # ===== Bulk Operations =====
+    
+    @synchronized
+    def bulk_upsert_profiles(self, items: List[Dict], actor: str = "") -> int:
+        """สร้าง/อัปเดตโปรไฟล์ของผู้ใช้ที่ upsert แล้วใน user_store เขียนแต่ละไฟล์ครั้งเดียว
+        
+        Args:
+            items: รายการ dict ที่มี username, status ("created"/"updated"), role และฟิลด์โปรไฟล์ (ถ้ามี)
+            actor: ผู้สั่งนำเข้า (บันทึกใน audit log)
+        
+        Returns:
+            จำนวนโปรไฟล์ที่เขียน
+        """
+        now = datetime.now().isoformat()
+        before = file_signature(self.profiles_db)
+        profiles, profile_index = self._profile_records()
+        created = len(profiles)
+        logs, _ = self._audit_records()
+        appended_from = len(logs)
+        
+        for item in items:
+            username = item['username']
+            fields = {k: item[k] for k in PROFILE_FIELDS if k in item}
+            profile = profile_index.get(username)
+            if profile is None:
+                profile = self._new_profile(username, now)
+                profiles.append(profile)
+                profile_index[username] = profile
+            profile.update(fields)
+            profile['updated_at'] = now
+            
+            logs.append({
+                "id": self._next_audit_id(logs),
+                "timestamp": now,
+                "action": "USER_CREATED" if item.get('status') == "created" else "USER_UPDATED",
+                "username": username,
+                "details": {"role": item.get('role'), "profile_fields": sorted(fields), "by": actor},
+                "ip_address": "",
+                "user_agent": ""
+            })
+        
+        self._save_profiles(profiles)
+        self._update_stat("total_profiles", self.profiles_db, before, len(profiles) - created, profiles)
+        self._save_audit_logs(logs, appended_from)
+        
+        logger.info(f"✅ bulk upsert โปรไฟล์: {len(items)} รายการ")
+        return len(items)
+    
     # ===== Audit Logs =====
     
+    @synchronized
     def add_audit_log(self, action: str, username: str = "", details: Dict = None):
         """บันทึก audit log"""
         try:
-            logs = self._read_json(self.audit_db)
+            logs, _ = self._audit_records()
             
             audit_entry = {
-                "id": len(logs) + 1,
+                "id": self._next_audit_id(logs),
                 "timestamp": datetime.now().isoformat(),
                 "action": action,
                 "username": username,
@@ -203,7 +302,7 @@ class DatabaseManager:
             }
             
             logs.append(audit_entry)
-            self._write_json(self.audit_db, logs)
+            self._save_audit_logs(logs, len(logs) - 1)
             
             return True
         
@@ -212,19 +311,124 @@ class DatabaseManager:
             return False
     
     def get_audit_logs(self, username: str = None, limit: int = 100) -> List[Dict]:
-        """ดึง audit logs"""
-        logs = self._read_json(self.audit_db)
+        """ดึง audit logs ล่าสุด"""
+        return self.query_audit_logs(username=username, limit=limit)['logs']
+    
+    def query_audit_logs(self, username: str = None, action: str = None, since: str = None,
+                         until: str = None, after_id: int = None, before_id: int = None,
+                         limit: int = 100) -> Dict:
+        """ค้นหา audit logs แบบ keyset (เรียงตาม id จากเก่าไปใหม่)
+        
+        Args:
+            username, action: กรองตามผู้ใช้/การกระทำ (ใช้ดัชนี)
+            since, until: ช่วงเวลา ISO 8601 (รวมขอบทั้งสองด้าน, มี timezone ได้) ValueError ถ้าแปลงไม่ได้
+            after_id: หน้าถัดไปที่ใหม่กว่า id นี้
+            before_id: หน้าก่อนหน้าที่เก่ากว่า id นี้ (ค่าเริ่มต้นคือหน้าล่าสุด)
+            limit: จำนวนต่อหน้า (ไม่เกิน AUDIT_PAGE_MAX)
+        
+        Returns:
+            {"logs", "total", "next_before_id", "next_after_id"} โดย total คือจำนวนที่ตรงตัวกรอง
+            (ไม่นับ cursor) และ cursor เป็น None เมื่อไม่มีหน้าในทิศนั้นแล้ว
+        """
+        limit = min(max(1, limit), AUDIT_PAGE_MAX)
+        since = normalize_timestamp(since) if since else None
+        until = normalize_timestamp(until) if until else None
+        logs, index = self._audit_records()
+        if username or action:
+            positions = index.get((username or None, action or None), [])
+        else:
+            positions = range(len(logs))
         
-        if username:
-            logs = [log for log in logs if log['username'] == username]
+        # ตำแหน่งเรียงตาม id และ timestamp (ต่อท้ายอย่างเดียว) จึงหาขอบเขตด้วย bisect ได้
+        # bisect เรียก key เพียง O(log n) ครั้ง จึง normalize timestamp ที่เก็บไว้ตอนเทียบได้
+        by_time = lambda p: normalize_timestamp(logs[p]['timestamp'])
+        by_id = lambda p: logs[p]['id']
+        first, last = 0, len(positions)
+        if since:
+            first = bisect_left(positions, since, key=by_time)
+        if until:
+            last = max(first, bisect_right(positions, until, first, last, key=by_time))
         
-        return logs[-limit:]
+        lo, hi = first, last
+        if after_id is not None:
+            lo = bisect_right(positions, after_id, lo, hi, key=by_id)
+        if before_id is not None:
+            hi = max(lo, bisect_left(positions, before_id, lo, hi, key=by_id))
+        
+        if after_id is not None and before_id is None:
+            start, end = lo, min(hi, lo + limit)
+        else:
+            start, end = max(lo, hi - limit), hi
+        page = [logs[p] for p in positions[start:end]]
+        
+        return {
+            "logs": page,
+            "total": last - first,
+            "next_before_id": page[0]['id'] if page and start > first else None,
+            "next_after_id": page[-1]['id'] if page and end < last else None
+        }
+    
+    def _audit_records(self):
+        """(audit logs, ดัชนี) โหลดใหม่เมื่อไฟล์เปลี่ยน"""
+        signature = file_signature(self.audit_db)
+        if signature is None or signature != self._audit_signature:
+            self._index_audit_logs(self._read_json(self.audit_db))
+            self._audit_signature = signature
+        return self._audit
+    
+    def _save_audit_logs(self, logs, appended_from=0):
+        """เขียน audit logs แล้วเพิ่มเฉพาะรายการใหม่ (ตั้งแต่ appended_from) เข้าดัชนี"""
+        try:
+            self._write_json(self.audit_db, logs)
+        except Exception:
+            # รายการใหม่อยู่ในแคชแล้วแต่ไม่อยู่ในไฟล์ ให้โหลดจากไฟล์ใหม่ครั้งถัดไป
+            self._audit_signature = None
+            raise
+        if logs is self._audit[0] and appended_from:
+            index = self._audit[1]
+            for position in range(appended_from, len(logs)):
+                self._index_audit_entry(logs, index, position)
+        else:
+            self._index_audit_logs(logs)
+        self._audit_signature = file_signature(self.audit_db)
+        
+        try:
+            self.rollups.catch_up(logs)
+            self.rollups.flush()
+        except Exception as e:
+            # rollups ตามทันได้จาก audit log ภายหลัง ไม่ควรทำให้การบันทึก log ล้มเหลว
+            logger.warning(f"⚠️ อัปเดต audit rollups ไม่สำเร็จ: {e}")
+    
+    def audit_rollups(self) -> AuditRollups:
+        """ตัวนับสะสมที่นับรายการล่าสุดใน audit log แล้ว (รวมที่ process อื่นเขียน)"""
+        logs, _ = self._audit_records()
+        self.rollups.catch_up(logs)
+        return self.rollups
+    
+    def _index_audit_logs(self, logs):
+        """ดัชนีตำแหน่งต่อ (username, None), (None, action) และ (username, action)"""
+        index = {}
+        for position in range(len(logs)):
+            self._index_audit_entry(logs, index, position)
+        self._audit = (logs, index)
+    
+    def _index_audit_entry(self, logs, index, position):
+        username, action = logs[position].get('username') or None, logs[position].get('action')
+        for key in ((username, None), (None, action), (username, action)):
+            if key != (None, None):
+                index.setdefault(key, []).append(position)
+    
+    def _next_audit_id(self, logs):
+        """id ถัดไป (เพิ่มขึ้นเสมอ แม้ไฟล์ถูกตัดทอน)"""
+        return logs[-1]['id'] + 1 if logs else 1
     
     # ===== Sessions Management =====
     
+    @synchronized
     def add_session(self, username: str, token: str, expires_at: str):
         """บันทึก session"""
         try:
+            before = file_signature(self.sessions_db)
             sessions = self._read_json(self.sessions_db)
             
             session = {
@@ -240,6 +444,7 @@ class DatabaseManager:
             
             sessions.append(session)
             self._write_json(self.sessions_db, sessions)
+            self._update_stat("active_sessions", self.sessions_db, before, 1, sessions)
             
             logger.info(f"✅ สร้าง session: {username}")
             return True
@@ -248,6 +453,38 @@ class DatabaseManager:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return False
     
+    @synchronized
+    def end_session(self, token: str) -> bool:
+        """ปิด session ของ token (เช่น ตอน logout)"""
+        return self._deactivate_sessions(lambda s: s['token'] == token) > 0
+    
+    @synchronized
+    def expire_sessions(self) -> int:
+        """ปิด session ที่เลยเวลาหมดอายุ คืนจำนวนที่ปิด"""
+        now = datetime.now().isoformat()
+        expired = self._deactivate_sessions(lambda s: (s.get('expires_at') or now) < now)
+        if expired:
+            logger.info(f"🧹 ปิด session ที่หมดอายุ {expired} รายการ")
+        return expired
+    
+    def _deactivate_sessions(self, match) -> int:
+        try:
+            before = file_signature(self.sessions_db)
+            sessions = self._read_json(self.sessions_db)
+            closed = 0
+            for session in sessions:
+                if session['active'] and match(session):
+                    session['active'] = False
+                    closed += 1
+            if closed:
+                self._write_json(self.sessions_db, sessions)
+                self._update_stat("active_sessions", self.sessions_db, before, -closed, sessions)
+            return closed
+        
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return 0
+    
     def get_user_sessions(self, username: str) -> List[Dict]:
         """ดึง sessions ของผู้ใช้"""
         sessions = self._read_json(self.sessions_db)
@@ -262,9 +499,9 @@ class DatabaseManager:
             
             all_data = {
                 "export_time": datetime.now().isoformat(),
-                "users": self._read_json(self.users_db),
-                "profiles": self._read_json(self.profiles_db),
-                "audit_logs": self._read_json(self.audit_db),
+                "users": self.users.all(),
+                "profiles": self._profile_records()[0],
+                "audit_logs": self._audit_records()[0],
                 "sessions": self._read_json(self.sessions_db)
             }
             
@@ -305,26 +542,90 @@ class DatabaseManager:
     
     def _read_json(self, filepath: Path):
         """อ่านไฟล์ JSON"""
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
+        return read_json(filepath)
     
     def _write_json(self, filepath: Path, data):
-        """เขียนไฟล์ JSON"""
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """เขียนไฟล์ JSON (atomic)"""
+        write_json_atomic(filepath, data)
+    
+    # ===== Snapshot =====
+    
+    def quiesce(self):
+        """หยุดผู้เขียนชั่วคราว (ใช้กับ with)"""
+        return self._lock
+    
+    def snapshot(self) -> Dict[str, bytes]:
+        """ถ่าย snapshot ของ profiles, audit และ sessions ณ จุดเวลาเดียว (ผู้ใช้อยู่ใน user_store)"""
+        with self._lock:
+            return read_snapshot(
+                [self.profiles_db, self.audit_db, self.sessions_db],
+                self.data_dir
+            )
+    
+    # ===== Statistics =====
     
     def get_statistics(self) -> Dict:
-        """ดึงสถิติ"""
+        """ดึงสถิติ (จากตัวนับ ไม่ต้องอ่านไฟล์ฐานข้อมูลทั้งไฟล์)"""
         return {
-            "total_users": len(self.get_all_users()),
-            "total_profiles": len(self._read_json(self.profiles_db)),
-            "total_audit_logs": len(self._read_json(self.audit_db)),
-            "active_sessions": len([s for s in self._read_json(self.sessions_db) if s['active']])
+            "total_users": self.users.count(),
+            "active_users": self.users.count_active(),
+            "total_profiles": self._stat("total_profiles", self.profiles_db),
+            "total_audit_logs": len(self._audit_records()[0]),
+            "active_sessions": self._stat("active_sessions", self.sessions_db)
         }
+    
+    def record_statistics_snapshot(self) -> Dict:
+        """บันทึกสถิติ ณ ตอนนี้ลงประวัติ (สำหรับกราฟแนวโน้ม) พร้อมตัวนับปัจจุบัน"""
+        entry = {"timestamp": datetime.now().isoformat(), **self.get_statistics()}
+        with self._lock:
+            data = self._read_json(self.stats_file) if self.stats_file.exists() else {}
+            history = (data.get('history', []) if isinstance(data, dict) else []) + [entry]
+            self._write_json(self.stats_file, {
+                "counters": {name: list(value) for name, value in self._stats.items()},
+                "history": history[-STATS_HISTORY_LIMIT:]
+            })
+        return entry
+    
+    def get_statistics_history(self, since: str = None, limit: int = 168) -> List[Dict]:
+        """snapshot สถิติย้อนหลัง (เก่าไปใหม่) since เป็น ISO 8601 (ValueError ถ้าแปลงไม่ได้)"""
+        since = normalize_timestamp(since) if since else None
+        data = self._read_json(self.stats_file) if self.stats_file.exists() else {}
+        history = data.get('history', []) if isinstance(data, dict) else []
+        if since:
+            history = [h for h in history if normalize_timestamp(h['timestamp']) >= since]
+        return history[-limit:]
+    
+    def _stat(self, name, filepath) -> int:
+        """ค่าตัวนับ (นับใหม่จากไฟล์เฉพาะเมื่อไฟล์ถูกเปลี่ยนโดย process อื่น)"""
+        signature = file_signature(filepath)
+        cached = self._stats.get(name)
+        if signature is None or cached is None or cached[0] != signature:
+            cached = (signature, self._count(name, self._read_json(filepath)))
+            self._stats[name] = cached
+        return cached[1]
+    
+    def _update_stat(self, name, filepath, before, delta, records):
+        """หลังเขียนไฟล์: ปรับตัวนับด้วย delta ถ้าตัวนับตรงกับไฟล์ก่อนเขียน ไม่เช่นนั้นนับจาก records"""
+        cached = self._stats.get(name)
+        if before is not None and cached is not None and cached[0] == before:
+            value = cached[1] + delta
+        else:
+            value = self._count(name, records)
+        self._stats[name] = (file_signature(filepath), value)
+    
+    def _count(self, name, records) -> int:
+        if name == "active_sessions":
+            return sum(1 for s in records if s.get('active'))
+        return len(records)
+    
+    def _load_statistics(self):
+        """ตัวนับที่บันทึกไว้ใน statistics.json (ใช้ได้ถ้าไฟล์ต้นทางยังไม่เปลี่ยน)"""
+        data = self._read_json(self.stats_file) if self.stats_file.exists() else {}
+        if isinstance(data, dict):
+            for name, (signature, value) in data.get('counters', {}).items():
+                if signature:
+                    self._stats[name] = (tuple(signature), value)
 
 
-# สร้าง instance เดียว
-db_manager = DatabaseManager()
+# สร้าง instance เดียว (สร้างจริงเมื่อถูกใช้ครั้งแรก)
+db_manager = LazyInstance(DatabaseManager)
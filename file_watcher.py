@@ -16,11 +16,20 @@ logger = logging.getLogger(__name__)
 class FileChangeHandler(FileSystemEventHandler):
     """จัดการเหตุการณ์การเปลี่ยนแปลงไฟล์"""
     
+    def __init__(self, on_event=None):
+        """
+        Args:
+            on_event: callback(kind, path) เมื่อไฟล์ถูกสร้าง/แก้ไข (เช่น ส่งต่อให้ processor)
+        """
+        super().__init__()
+        self.on_event = on_event
+    
     def on_created(self, event):
         """เมื่อสร้างไฟล์ใหม่"""
         if not event.is_directory:
             filename = Path(event.src_path).name
             logger.info(f"📥 ตรวจพบไฟล์ใหม่: {filename}")
+            self._notify('created', event.src_path)
     
     def on_deleted(self, event):
         """เมื่อลบไฟล์"""
@@ -34,23 +43,33 @@ class FileChangeHandler(FileSystemEventHandler):
             filename = Path(event.src_path).name
             file_size = os.path.getsize(event.src_path)
             logger.info(f"✏️ ไฟล์ถูกแก้ไข: {filename} ({file_size} bytes)")
+            self._notify('modified', event.src_path)
+    
+    def _notify(self, kind, path):
+        if self.on_event:
+            try:
+                self.on_event(kind, str(path))
+            except Exception as e:
+                logger.error(f"❌ ส่งเหตุการณ์ไฟล์ไม่สำเร็จ: {e}")
 
 
 class FileWatcher:
     """ตรวจสอบโฟลเดอร์อัตโนมัติ"""
     
-    def __init__(self, watch_paths):
+    def __init__(self, watch_paths, on_event=None):
         """
         Args:
             watch_paths: รายชื่อโฟลเดอร์ที่ต้องการตรวจสอบ
+            on_event: callback(kind, path) สำหรับไฟล์ที่ถูกสร้าง/แก้ไข
         """
         self.watch_paths = watch_paths
+        self.on_event = on_event
         self.observer = Observer()
     
     def start(self):
         """เริ่มการตรวจสอบ"""
         try:
-            event_handler = FileChangeHandler()
+            event_handler = FileChangeHandler(self.on_event)
             
             for path in self.watch_paths:
                 if Path(path).exists():
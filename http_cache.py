@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP Cache - บีบอัด response (gzip/brotli) และ ETag + 304 สำหรับ endpoint ที่ถูก poll บ่อย
+"""
+
+import gzip
+import hashlib
+import logging
+from functools import wraps
+from pathlib import Path
+
+import metrics
+from json_store import file_signature
+from config import COMPRESS_ENABLED, COMPRESS_MIN_SIZE, COMPRESS_LEVEL, BROTLI_QUALITY
+
+logger = logging.getLogger(__name__)
+
+# ชนิดข้อมูลที่บีบอัดได้คุ้ม (ไฟล์ดาวน์โหลดส่งผ่าน send_file ไม่ถูกบีบอัด)
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv")
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+# ===== ETag =====
+
+def make_etag(*parts) -> str:
+    """ETag จากค่าเวอร์ชัน (ลายเซ็นไฟล์, พารามิเตอร์, ผู้ใช้) ไม่ต้อง hash body"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def conditional(versions):
+    """ตอบ 304 ถ้า If-None-Match ตรงกับ ETag ของเวอร์ชันปัจจุบัน ไม่เช่นนั้นเรียก handler แล้วแนบ ETag
+
+    Args:
+        versions: callable คืนรายการ Path (ใช้ลายเซ็นไฟล์ (mtime_ns, size)) หรือค่าเวอร์ชันอื่น
+    ใช้ใต้ require_auth เพื่อให้ ETag แยกตามผู้ใช้ และ 304 ไม่ข้ามการตรวจสิทธิ์
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            from flask import request, make_response, current_app
+
+            # คำนวณเวอร์ชันก่อนสร้าง body: ถ้า store เปลี่ยนระหว่างนั้น ETag จะเก่ากว่า body
+            # (poll ครั้งถัดไปได้ 200 อีกครั้ง) ไม่มีทางได้ 304 กับข้อมูลที่ล้าสมัย
+            user = getattr(request, 'current_user', None) or {}
+            etag = make_etag(
+                request.path,
+                sorted(request.args.items(multi=True)),
+                user.get('username'),
+                [file_signature(v) if isinstance(v, Path) else v for v in versions()]
+            )
+
+            # ETag ของ response ที่บีบอัดมีคำต่อท้าย (-gzip/-br) ถือว่าเป็นข้อมูลเดียวกัน
+            for candidate in (etag,) + tuple(f"{etag}-{encoding}" for encoding in ENCODINGS):
+                if request.if_none_match.contains_weak(candidate):
+                    metrics.http_not_modified.inc(request.url_rule.rule if request.url_rule else request.path)
+                    response = current_app.response_class(status=304)
+                    response.set_etag(candidate)
+                    return _cache_headers(response)
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                _cache_headers(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def _cache_headers(response):
+    # browser/dashboard เก็บไว้ได้แต่ต้องถามซ้ำทุกครั้ง (ข้อมูลเฉพาะผู้ใช้)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
+
+
+# ===== Compression =====
+
+def negotiate_encoding(accept_encodings):
+    """เลือก br หรือ gzip ตาม Accept-Encoding (q-value) คืน None ถ้าไม่รองรับ"""
+    return accept_encodings.best_match(ENCODINGS) if accept_encodings else None
+
+
+def compress_response(request, response):
+    """บีบอัด response JSON/ข้อความที่ใหญ่กว่า COMPRESS_MIN_SIZE ตาม encoding ที่ client รองรับ"""
+    if (not COMPRESS_ENABLED or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        # mtime=0 ให้ผลลัพธ์เหมือนกันทุกครั้งสำหรับ body เดียวกัน
+        compressed = gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # strong ETag ต้องต่างกันระหว่าง representation ที่บีบอัดและไม่บีบอัด
+        response.set_etag(f"{etag}-{encoding}")
+
+    metrics.http_compression_bytes.inc(encoding, "original", amount=len(body))
+    metrics.http_compression_bytes.inc(encoding, "compressed", amount=len(compressed))
+    return response
+
+
+def init_app(app):
+    """ติดตั้ง hook บีบอัด response ให้ Flask app"""
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        try:
+            return compress_response(request, response)
+        except Exception as e:
+            logger.error(f"❌ บีบอัด response ไม่สำเร็จ: {e}")
+            return response
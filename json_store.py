@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+JSON Store Helpers - เขียนไฟล์แบบ atomic, lock ของผู้เขียน และ snapshot
+"""
+
+import os
+import json
+import time
+import tempfile
+from contextlib import ExitStack
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import metrics
+
+
+def read_json(filepath: Path, default=None):
+    """อ่านไฟล์ JSON (คืนค่า default ถ้าอ่านไม่ได้)"""
+    start = time.perf_counter()
+    name = Path(filepath).name
+    try:
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        metrics.json_store_reads.inc(name)
+        metrics.json_store_read_bytes.inc(name, amount=len(raw))
+        return json.loads(raw)
+    except (OSError, ValueError):
+        return [] if default is None else default
+    finally:
+        metrics.json_store_duration.observe(time.perf_counter() - start, "read")
+
+
+def file_signature(filepath: Path) -> Optional[tuple]:
+    """ลายเซ็นของไฟล์ (mtime_ns, size) ใช้ตรวจว่าแคชยังตรงกับไฟล์หรือไม่"""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def normalize_timestamp(value) -> str:
+    """เวลา ISO 8601 (str หรือ datetime) เป็นเวลาท้องถิ่นแบบไม่มี timezone ความละเอียดไมโครวินาที
+
+    timestamp ใน store มาจาก datetime.now().isoformat() (ไม่มี timezone, ไม่มีเศษวินาทีเมื่อเป็น 0)
+    ค่าที่ผ่านฟังก์ชันนี้แล้วเทียบกันแบบสตริงได้ตรงกับลำดับเวลา (ValueError ถ้าแปลงไม่ได้)
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if value[-1:] in ('Z', 'z'):
+            value = value[:-1] + '+00:00'
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat(timespec='microseconds')
+
+
+def write_json_atomic(filepath: Path, data):
+    """เขียนไฟล์ JSON ลงไฟล์ชั่วคราวแล้ว rename ทับ
+
+    ผู้อ่าน (รวมถึงงานสำรองข้อมูลที่ copy ไฟล์) จะเห็นไฟล์เก่าหรือไฟล์ใหม่ทั้งไฟล์
+    ไม่มีทางเห็นไฟล์ที่ถูกเขียนค้างครึ่งเดียว
+    """
+    start = time.perf_counter()
+    filepath = Path(filepath)
+    payload = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    fd, tmp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        metrics.json_store_duration.observe(time.perf_counter() - start, "write")
+    
+    metrics.json_store_writes.inc(filepath.name)
+    metrics.json_store_written_bytes.inc(filepath.name, amount=len(payload))
+
+
+def synchronized(method):
+    """Decorator: ให้เมธอดที่แก้ไขข้อมูลทำงานภายใต้ self._lock"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def read_snapshot(files: Iterable[Path], root: Path) -> Dict[str, bytes]:
+    """อ่านไฟล์เป็น bytes ดิบ (ไม่ parse) โดยใช้ path สัมพัทธ์กับ root เป็น key"""
+    snapshot = {}
+    for filepath in files:
+        filepath = Path(filepath)
+        name = filepath.relative_to(root).as_posix()
+        try:
+            snapshot[name] = filepath.read_bytes()
+        except FileNotFoundError:
+            snapshot[name] = b"[]"
+    return snapshot
+
+
+def capture_snapshot(*managers) -> Dict[str, bytes]:
+    """ถ่าย snapshot ที่สอดคล้องกันของหลาย manager พร้อมกัน
+
+    หยุดผู้เขียนของทุก manager (ตามลำดับที่ส่งเข้ามา) เฉพาะช่วงที่อ่าน bytes
+    ของไฟล์ จากนั้นปล่อย lock ทันที งานบีบอัด/เขียนไฟล์สำรองจึงทำนอก lock
+
+    ส่ง manager ตามลำดับ lock ของระบบ (users -> auth -> database -> verification)
+    เมธอดที่ถือ lock ของ manager หนึ่งต้องไม่เรียกผู้เขียนของ manager ที่อยู่ก่อนหน้าในลำดับนี้
+    """
+    with ExitStack() as stack:
+        for manager in managers:
+            stack.enter_context(manager.quiesce())
+
+        snapshot = {}
+        for manager in managers:
+            snapshot.update(manager.snapshot())
+
+    return snapshot
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Lazy Instances - singleton ที่สร้างเมื่อถูกใช้ครั้งแรก (import โมดูลโดยไม่แตะไฟล์)
+"""
+
+import threading
+
+
+class LazyInstance:
+    """ตัวแทนของ instance ที่สร้างด้วย factory เมื่อเข้าถึง attribute ครั้งแรก
+
+    ใช้แทน `manager = Manager()` ระดับโมดูล: `from auth import auth_manager` ยังใช้ได้เหมือนเดิม
+    แต่ mkdir / อ่านไฟล์ / สร้าง admin เกิดขึ้นตอนคำขอแรก ไม่ใช่ตอน import
+    """
+
+    def __init__(self, factory):
+        """
+        Args:
+            factory: callable ที่คืน instance จริง
+        """
+        object.__setattr__(self, '_lazy_factory', factory)
+        object.__setattr__(self, '_lazy_instance', None)
+        object.__setattr__(self, '_lazy_lock', threading.Lock())
+
+    def resolve(self):
+        """instance จริง (สร้างถ้ายังไม่มี)"""
+        instance = self._lazy_instance
+        if instance is None:
+            with self._lazy_lock:
+                instance = self._lazy_instance
+                if instance is None:
+                    instance = self._lazy_factory()
+                    object.__setattr__(self, '_lazy_instance', instance)
+        return instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._lazy_instance is not None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __repr__(self):
+        if self._lazy_instance is None:
+            return f"<LazyInstance {getattr(self._lazy_factory, '__name__', self._lazy_factory)} (ยังไม่สร้าง)>"
+        return repr(self._lazy_instance)
@@ -4,40 +4,68 @@
 ระบบทำงานอัตโนมัติหลัก - เวอร์ชัน 2.0 (ระบบสมบูรณ์)
 """
 
-import schedule
-import time
+import os
+import sys
 import logging
+import argparse
+import schedule
 import threading
 from datetime import datetime
 from pathlib import Path
 
-from config import APP_NAME, LOG_DIR, DATA_DIR, BACKUP_DIR, SCHEDULE_TIMES
-from api import app as flask_app
-from file_watcher import FileWatcher, scan_directory
-from data_processor import DataProcessor
-from utils import create_backup, cleanup_old_files, generate_report, check_system_health
-
-# ตั้งค่า logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_DIR / 'automation.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+from config import (
+    APP_NAME, LOG_DIR, DATA_DIR, BACKUP_DIR, SCHEDULE_TIMES,
+    RETENTION_POLICIES, RETENTION_MAX_DELETIONS, RETENTION_UPLOAD_DAYS, API_HOST, API_PORT,
+    SCHEDULER_HEARTBEAT_FILE, SCHEDULER_HEARTBEAT_INTERVAL, ensure_directories
 )
+from auth import auth_manager
+from database import db_manager
+from verification import verification_manager
+from json_store import capture_snapshot, write_json_atomic
+from utils import create_backup, generate_report, check_system_health
+from retention import run_retention
+from upload_store import upload_store
+from system_monitor import system_sampler
+from metrics import timed_job
+
+# Flask (api), watchdog (file_watcher) และ data_processor ถูก import เมื่อใช้งานจริงเท่านั้น
+# เพื่อให้การรันงานเดียว (python main.py --task ...) และการ restart เริ่มได้เร็ว
+
 logger = logging.getLogger(__name__)
 
 
+def setup_logging(role=None):
+    """ตั้งค่า logging (ไฟล์ logs/automation.log + หน้าจอ) role ใช้แยกบรรทัดของแต่ละ process"""
+    ensure_directories()
+    prefix = f'[{role}] - ' if role else ''
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - {prefix}%(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_DIR / 'automation.log', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+
 class AutomationSystem:
     """ระบบอัตโนมัติสมบูรณ์"""
     
     def __init__(self):
         self.name = APP_NAME
         self.running = True
-        self.processor = DataProcessor(DATA_DIR / 'uploads', DATA_DIR / 'results')
+        self._wake = threading.Event()
+        self._processor = None
         logger.info(f"🚀 เริ่มต้น {self.name} v2.0 (ระบบสมบูรณ์)")
     
+    @property
+    def processor(self):
+        """DataProcessor (สร้างเมื่อใช้ครั้งแรก)"""
+        if self._processor is None:
+            from data_processor import DataProcessor
+            self._processor = DataProcessor(DATA_DIR / 'uploads', DATA_DIR / 'results')
+        return self._processor
+    
     # ===== งานอัตโนมัติ =====
     
     def task_daily_report(self):
@@ -54,7 +82,9 @@ class AutomationSystem:
         """งานสำรองข้อมูล"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         try:
-            create_backup(str(DATA_DIR), str(BACKUP_DIR))
+            # หยุดผู้เขียนเพียงช่วงอ่านไฟล์ แล้วบีบอัดนอก lock
+            snapshot = capture_snapshot(auth_manager.users, auth_manager, db_manager, verification_manager)
+            create_backup(str(DATA_DIR), str(BACKUP_DIR), snapshot=snapshot)
             logger.info(f"✓ สำรองข้อมูล - {timestamp}")
         except Exception as e:
             logger.error(f"ข้อผิดพลาด: {e}")
@@ -72,27 +102,57 @@ class AutomationSystem:
         """งานล้างไฟล์ชั่วคราว"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         try:
-            cleanup_old_files(str(LOG_DIR), days=7)
-            cleanup_old_files(str(DATA_DIR / 'uploads'), days=30)
+            run_retention(RETENTION_POLICIES, max_deletions=RETENTION_MAX_DELETIONS)
+            upload_store.cleanup(RETENTION_UPLOAD_DAYS)
             logger.info(f"✓ ล้างไฟล์ชั่วคราว - {timestamp}")
         except Exception as e:
             logger.error(f"ข้อผิดพลาด: {e}")
     
+    def task_purge_verifications(self):
+        """งานลบรหัสยืนยันที่หมดอายุ"""
+        try:
+            removed = verification_manager.purge_expired_codes()
+            if removed:
+                logger.info(f"✓ ลบรหัสยืนยันที่หมดอายุ {removed} รายการ")
+        except Exception as e:
+            logger.error(f"ข้อผิดพลาด: {e}")
+    
+    def task_expire_shares(self):
+        """งานปิดคำขอแชร์โปรไฟล์ที่หมดอายุ"""
+        try:
+            verification_manager.expire_share_requests()
+        except Exception as e:
+            logger.error(f"ข้อผิดพลาด: {e}")
+    
+    def task_expire_sessions(self):
+        """งานปิด session ที่หมดอายุ"""
+        try:
+            db_manager.expire_sessions()
+        except Exception as e:
+            logger.error(f"ข้อผิดพลาด: {e}")
+    
+    def task_statistics_snapshot(self):
+        """งานบันทึกสถิติรายชั่วโมงสำหรับกราฟแนวโน้ม"""
+        try:
+            db_manager.record_statistics_snapshot()
+        except Exception as e:
+            logger.error(f"ข้อผิดพลาด: {e}")
+    
     def task_process_files(self):
         """งานประมวลผลไฟล์"""
         try:
-            upload_dir = DATA_DIR / 'uploads'
-            if upload_dir.exists():
-                files = list(upload_dir.glob('*'))
-                if files:
-                    results = self.processor.batch_process(files)
-                    logger.info(f"✓ ประมวลผลไฟล์ {len(results)} ไฟล์")
+            from upload_store import upload_store
+            files = [Path(entry.path) for entry in upload_store.iter_files()]
+            if files:
+                results = self.processor.batch_process(files)
+                logger.info(f"✓ ประมวลผลไฟล์ {len(results)} ไฟล์")
         except Exception as e:
             logger.error(f"ข้อผิดพลาด: {e}")
     
     def task_scan_uploads(self):
         """งานสแกนไฟล์ที่อัปโหลด"""
         try:
+            from file_watcher import scan_directory
             upload_dir = DATA_DIR / 'uploads'
             files = scan_directory(str(upload_dir))
             if files:
@@ -105,21 +165,28 @@ class AutomationSystem:
     def schedule_tasks(self):
         """กำหนดการทำงานตามเวลา"""
         # งานรายวัน
-        schedule.every().day.at(SCHEDULE_TIMES['report']).do(self.task_daily_report)
-        schedule.every().day.at(SCHEDULE_TIMES['backup']).do(self.task_data_backup)
-        schedule.every().day.at(SCHEDULE_TIMES['check']).do(self.task_system_check)
-        schedule.every().day.at(SCHEDULE_TIMES['cleanup']).do(self.task_cleanup)
+        schedule.every().day.at(SCHEDULE_TIMES['report']).do(timed_job('daily_report', self.task_daily_report))
+        schedule.every().day.at(SCHEDULE_TIMES['backup']).do(timed_job('data_backup', self.task_data_backup))
+        schedule.every().day.at(SCHEDULE_TIMES['check']).do(timed_job('system_check', self.task_system_check))
+        schedule.every().day.at(SCHEDULE_TIMES['cleanup']).do(timed_job('cleanup', self.task_cleanup))
         
         # งานรายชั่วโมง
-        schedule.every().hour.do(self.task_system_check)
-        schedule.every().hour.do(self.task_process_files)
-        schedule.every().hour.do(self.task_scan_uploads)
+        schedule.every().hour.do(timed_job('system_check', self.task_system_check))
+        schedule.every().hour.do(timed_job('process_files', self.task_process_files))
+        schedule.every().hour.do(timed_job('scan_uploads', self.task_scan_uploads))
+        schedule.every().hour.do(timed_job('statistics_snapshot', self.task_statistics_snapshot))
+        
+        # งานทุก 15 นาที
+        schedule.every(15).minutes.do(timed_job('purge_verifications', self.task_purge_verifications))
+        schedule.every(15).minutes.do(timed_job('expire_shares', self.task_expire_shares))
+        schedule.every(15).minutes.do(timed_job('expire_sessions', self.task_expire_sessions))
         
         logger.info("📅 ตั้งค่างานอัตโนมัติเสร็จสิ้น")
     
     def start_file_watcher(self):
         """เริ่ม File Watcher ในดัชนีหลัง"""
         try:
+            from file_watcher import FileWatcher
             watcher = FileWatcher([str(DATA_DIR / 'uploads')])
             watcher.start()
         except Exception as e:
@@ -128,43 +195,100 @@ class AutomationSystem:
     def start_api_server(self):
         """เริ่ม API Server ในดัชนีหลัง"""
         try:
-            logger.info("🌐 เริ่ม API Server ที่ http://localhost:5000")
-            flask_app.run(debug=False, host='0.0.0.0', port=5000, use_reloader=False)
+            from api import get_app
+            logger.info(f"🌐 เริ่ม API Server ที่ http://localhost:{API_PORT}")
+            get_app().run(debug=False, host=API_HOST, port=API_PORT, use_reloader=False)
         except Exception as e:
             logger.error(f"ข้อผิดพลาดในการเริ่ม API: {e}")
     
-    def run(self):
-        """เรียกใช้ระบบจนกว่าจะถูกหยุด"""
+    def write_heartbeat(self):
+        """บันทึกว่า scheduler ยังทำงาน (ตรวจโดย /health?deep=1 จาก process อื่นได้)"""
+        next_run = schedule.next_run()
+        write_json_atomic(SCHEDULER_HEARTBEAT_FILE, {
+            "pid": os.getpid(),
+            "timestamp": datetime.now().isoformat(),
+            "next_run": next_run.isoformat() if next_run else None
+        })
+    
+    def _heartbeat_loop(self):
+        while self.running:
+            try:
+                self.write_heartbeat()
+            except Exception as e:
+                logger.warning(f"⚠️ เขียน heartbeat ของ scheduler ไม่สำเร็จ: {e}")
+            self._wake.wait(SCHEDULER_HEARTBEAT_INTERVAL)
+    
+    def run(self, api=True, watcher=True):
+        """เรียกใช้ระบบจนกว่าจะถูกหยุด (supervisor ปิด api/watcher เพราะรันเป็น process แยก)"""
         self.schedule_tasks()
         
+        # deep health ใน process นี้ต้องเห็น heartbeat ของ scheduler
+        from readiness import deep_health
+        deep_health.expect_scheduler = True
+        
+        # เริ่มเก็บสถานะระบบในดัชนีหลัง
+        system_sampler.start()
+        threading.Thread(target=self._heartbeat_loop, name="scheduler-heartbeat", daemon=True).start()
+        
         # เริ่ม File Watcher ในดัชนีหลัง
-        watcher_thread = threading.Thread(target=self.start_file_watcher, daemon=True)
-        watcher_thread.start()
+        if watcher:
+            watcher_thread = threading.Thread(target=self.start_file_watcher, daemon=True)
+            watcher_thread.start()
         
         # เริ่ม API Server ในดัชนีหลัง
-        api_thread = threading.Thread(target=self.start_api_server, daemon=True)
-        api_thread.start()
+        if api:
+            api_thread = threading.Thread(target=self.start_api_server, daemon=True)
+            api_thread.start()
         
         logger.info("🚀 ระบบอัตโนมัติเริ่มทำงาน...")
         logger.info("📊 ส่วนประกอบ:")
         logger.info("   ✓ Scheduler - งานอัตโนมัติตามเวลา")
-        logger.info("   ✓ File Watcher - ตรวจสอบโฟลเดอร์")
+        if watcher:
+            logger.info("   ✓ File Watcher - ตรวจสอบโฟลเดอร์")
         logger.info("   ✓ Data Processor - ประมวลผลข้อมูล")
-        logger.info("   ✓ API Server - อัปโหลดและจัดการไฟล์")
+        if api:
+            logger.info("   ✓ API Server - อัปโหลดและจัดการไฟล์")
         
         try:
             while self.running:
                 schedule.run_pending()
-                time.sleep(60)
+                self._wake.wait(60)
         except KeyboardInterrupt:
             logger.info("⛔ หยุดระบบอัตโนมัติ")
+    
+    def stop(self):
+        """หยุด loop ของ scheduler (เรียกจาก thread หรือ signal handler อื่นได้)"""
+        self.running = False
+        self._wake.set()
 
 
-def main():
+def available_tasks():
+    """ชื่องานที่รันเดี่ยวได้ (task_<ชื่อ>)"""
+    return sorted(name[len('task_'):] for name in dir(AutomationSystem) if name.startswith('task_'))
+
+
+def main(argv=None):
     """ฟังก์ชันหลัก"""
+    parser = argparse.ArgumentParser(description=f"{APP_NAME} - ระบบอัตโนมัติ")
+    parser.add_argument("--task", choices=available_tasks(),
+                        help="รันงานเดียวแล้วจบ (ไม่เริ่ม scheduler, API และ File Watcher)")
+    parser.add_argument("--supervise", action="store_true",
+                        help="รัน API, scheduler, watcher และ processor เป็น process แยกพร้อม restart อัตโนมัติ")
+    args = parser.parse_args(argv)
+    
+    if args.supervise:
+        from supervisor import Supervisor
+        setup_logging(role="supervisor")
+        return Supervisor().run()
+    
+    setup_logging()
     system = AutomationSystem()
+    if args.task:
+        timed_job(args.task, getattr(system, f"task_{args.task}"))()
+        return 0
     system.run()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics - ตัวนับและ histogram ในหน่วยความจำ ส่งออกเป็นรูปแบบ Prometheus text
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+# ขอบเขต bucket เริ่มต้น (วินาที)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """ตัวนับที่เพิ่มขึ้นอย่างเดียว"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        """เพิ่มค่า (labelvalues เรียงตาม labelnames)"""
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def total(self):
+        return sum(self._values.values())
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in sorted(items):
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Gauge:
+    """ค่าที่คำนวณตอนส่งออก (callback)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def collect(self):
+        value = self.callback()
+        if value is not None:
+            yield f"{self.name} {_format_value(value)}"
+
+
+class Histogram:
+    """histogram แบบ bucket สะสม"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [counts ต่อ bucket (+Inf ช่องสุดท้าย), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        """บันทึกค่าหนึ่งค่า"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labelvalues):
+        """context manager/decorator สำหรับจับเวลา"""
+        return _Timer(self, labelvalues)
+
+    def count(self, *labelvalues):
+        series = self._series.get(labelvalues)
+        return sum(series[0]) if series else 0
+
+    def collect(self):
+        with self._lock:
+            items = [(k, list(v[0]), v[1]) for k, v in self._series.items()]
+        for labelvalues, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class _Timer:
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+    def __call__(self, f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with self:
+                return f(*args, **kwargs)
+        return wrapper
+
+
+class Registry:
+    """รวม metric ทั้งหมดเพื่อส่งออก"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, callback):
+        return self.register(Gauge(name, documentation, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """ส่งออกเป็น Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# สร้าง instance เดียว
+registry = Registry()
+
+# ===== HTTP =====
+http_requests = registry.counter(
+    "http_requests_total", "จำนวนคำขอ HTTP", ("endpoint", "method", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "เวลาตอบคำขอ HTTP", ("endpoint", "method"))
+http_not_modified = registry.counter(
+    "http_not_modified_total", "จำนวนคำขอที่ตอบ 304 จาก ETag", ("endpoint",))
+http_compression_bytes = registry.counter(
+    "http_compression_bytes_total", "bytes ของ response ก่อน/หลังบีบอัด", ("encoding", "stage"))
+
+# ===== JSON Store =====
+json_store_reads = registry.counter(
+    "json_store_reads_total", "จำนวนการอ่านไฟล์ JSON", ("file",))
+json_store_writes = registry.counter(
+    "json_store_writes_total", "จำนวนการเขียนไฟล์ JSON", ("file",))
+json_store_read_bytes = registry.counter(
+    "json_store_read_bytes_total", "จำนวน bytes ที่อ่านจากไฟล์ JSON", ("file",))
+json_store_written_bytes = registry.counter(
+    "json_store_written_bytes_total", "จำนวน bytes ที่เขียนลงไฟล์ JSON", ("file",))
+json_store_duration = registry.histogram(
+    "json_store_operation_seconds", "เวลาอ่าน/เขียนไฟล์ JSON", ("operation",))
+
+# ===== Auth =====
+auth_verify_token_duration = registry.histogram(
+    "auth_verify_token_seconds", "เวลาตรวจสอบ token")
+auth_token_cache = registry.counter(
+    "auth_token_cache_total", "ผลการค้นหา token ในแคช", ("result",))
+registry.gauge(
+    "auth_token_cache_hit_ratio", "สัดส่วน cache hit ของ token",
+    lambda: auth_token_cache.value("hit") / auth_token_cache.total() if auth_token_cache.total() else None)
+auth_password_verify_duration = registry.histogram(
+    "auth_password_verify_seconds", "เวลาคำนวณ KDF ตรวจรหัสผ่าน",
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+auth_password_cache = registry.counter(
+    "auth_password_cache_total", "ผลการค้นหาผลตรวจรหัสผ่านในแคช", ("result",))
+
+rate_limited_requests = registry.counter(
+    "rate_limited_requests_total", "จำนวนคำขอที่ถูกปฏิเสธด้วย 429", ("rule",))
+
+# ===== Uploads =====
+upload_bytes = registry.counter(
+    "upload_bytes_total", "จำนวน bytes ที่อัปโหลด")
+upload_duration = registry.histogram(
+    "upload_duration_seconds", "เวลาบันทึกไฟล์อัปโหลด")
+file_downloads = registry.counter(
+    "file_downloads_total", "จำนวนการดาวน์โหลดไฟล์ตามวิธีส่งและสถานะ", ("mode", "status"))
+upload_throughput = registry.histogram(
+    "upload_bytes_per_second", "ความเร็วอัปโหลดต่อไฟล์ (bytes/วินาที)",
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6))
+
+# ===== Scheduler / Retention =====
+scheduler_job_duration = registry.histogram(
+    "scheduler_job_seconds", "เวลาทำงานของงานตามเวลา", ("job",),
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0))
+retention_deleted_files = registry.counter(
+    "retention_deleted_files_total", "จำนวนไฟล์ที่ลบตามนโยบายการเก็บ", ("policy",))
+retention_freed_bytes = registry.counter(
+    "retention_freed_bytes_total", "พื้นที่ที่คืนจากการลบตามนโยบาย", ("policy",))
+
+
+def timed_job(name, job):
+    """ห่องานตามเวลาเพื่อจับเวลาลง scheduler_job_seconds"""
+    @wraps(job)
+    def wrapper(*args, **kwargs):
+        with scheduler_job_duration.time(name):
+            return job(*args, **kwargs)
+    return wrapper
+
+
+def init_app(app):
+    """ติดตั้ง hooks วัดเวลาคำขอ และ endpoint /metrics ให้ Flask app"""
+    from flask import request, g, Response
+
+    @app.before_request
+    def _metrics_start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            rule = request.url_rule.rule if request.url_rule else "unmatched"
+            http_request_duration.observe(time.perf_counter() - start, rule, request.method)
+            http_requests.inc(rule, request.method, str(response.status_code))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """ส่งออก metrics (Prometheus text format)"""
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
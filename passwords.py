@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Password Hashing - แฮชรหัสผ่านด้วย KDF (PBKDF2 / scrypt) พร้อม salt ต่อผู้ใช้
+"""
+
+import hmac
+import time
+import hashlib
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from config import (
+    AUTH_KDF, AUTH_KDF_ITERATIONS, AUTH_SCRYPT_N, AUTH_SCRYPT_R, AUTH_SCRYPT_P,
+    AUTH_KDF_WORKERS, AUTH_KDF_CACHE_SIZE, AUTH_KDF_CACHE_TTL
+)
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ('pbkdf2_sha256', 'scrypt')
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+class PasswordHasher:
+    """แฮช/ตรวจรหัสผ่าน ทำงาน KDF ใน thread pool ที่จำกัดขนาด"""
+
+    def __init__(self, algorithm='pbkdf2_sha256', iterations=600000, scrypt_n=2 ** 14, scrypt_r=8,
+                 scrypt_p=1, workers=4, cache_size=1024, cache_ttl=300):
+        """
+        Args:
+            algorithm: pbkdf2_sha256 หรือ scrypt
+            iterations: จำนวนรอบของ PBKDF2
+            scrypt_n, scrypt_r, scrypt_p: ค่า cost ของ scrypt
+            workers: จำนวน thread สูงสุดที่คำนวณ KDF พร้อมกัน
+            cache_size: จำนวนผลตรวจที่สำเร็จที่จำไว้ (0 = ปิด)
+            cache_ttl: อายุของผลตรวจในแคช (วินาที)
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"ไม่รองรับ KDF: {algorithm}")
+        self.algorithm = algorithm
+        self.iterations = iterations
+        self.scrypt_params = (scrypt_n, scrypt_r, scrypt_p)
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # แคชเก็บเฉพาะ HMAC ของ (hash, password) ด้วยกุญแจสุ่มต่อ process ไม่เก็บรหัสผ่าน
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_key = secrets.token_bytes(32)
+
+    # ===== Public API =====
+
+    def hash(self, password: str) -> str:
+        """แฮชรหัสผ่านด้วยค่าปัจจุบัน (คำนวณใน pool)"""
+        return self.hash_many([password])[0]
+
+    def hash_many(self, passwords) -> list:
+        """แฮชหลายรหัสผ่านพร้อมกันใน pool (ใช้กับการนำเข้าผู้ใช้จำนวนมาก)"""
+        executor = self._executor()
+        futures = []
+        for password in passwords:
+            salt = secrets.token_hex(SALT_BYTES)
+            if self.algorithm == 'scrypt':
+                futures.append((salt, executor.submit(_scrypt, password, salt, *self.scrypt_params)))
+            else:
+                futures.append((salt, executor.submit(_pbkdf2, password, salt, self.iterations)))
+        return [self._encode(salt, future.result()) for salt, future in futures]
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """ตรวจรหัสผ่านกับค่าที่เก็บไว้ (รองรับ sha256 แบบเดิม)"""
+        if not encoded:
+            return False
+        cache_key = self._cache_lookup_key(password, encoded)
+        if self._cache_hit(cache_key):
+            metrics.auth_password_cache.inc("hit")
+            return True
+        metrics.auth_password_cache.inc("miss")
+
+        with metrics.auth_password_verify_duration.time():
+            ok = self._verify_uncached(password, encoded)
+        if ok:
+            self._cache_store(cache_key)
+        return ok
+
+    def dummy_hash(self) -> str:
+        """ค่า hash ที่ไม่ตรงกับรหัสผ่านใดเลย แต่ใช้ค่า cost ปัจจุบัน (ให้ผู้ใช้ที่ไม่มีอยู่ใช้เวลาเท่ากัน)"""
+        return self._encode("0" * (SALT_BYTES * 2), "0" * (HASH_BYTES * 2))
+
+    def needs_rehash(self, encoded: str) -> bool:
+        """ค่าที่เก็บไว้เป็นรูปแบบเก่าหรือใช้ค่า cost ไม่ตรงกับปัจจุบัน"""
+        parts = (encoded or '').split('$')
+        if parts[0] != self.algorithm:
+            return True
+        if self.algorithm == 'scrypt':
+            return tuple(int(x) for x in parts[1:4]) != self.scrypt_params
+        return int(parts[1]) != self.iterations
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    # ===== Internals =====
+
+    def _encode(self, salt, digest):
+        if self.algorithm == 'scrypt':
+            n, r, p = self.scrypt_params
+            return f"scrypt${n}${r}${p}${salt}${digest}"
+        return f"pbkdf2_sha256${self.iterations}${salt}${digest}"
+
+    def _verify_uncached(self, password, encoded):
+        parts = encoded.split('$')
+        try:
+            if parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+                digest = self._run(_pbkdf2, password, parts[2], int(parts[1]))
+                return hmac.compare_digest(digest, parts[3])
+            if parts[0] == 'scrypt' and len(parts) == 6:
+                n, r, p = (int(x) for x in parts[1:4])
+                digest = self._run(_scrypt, password, parts[4], n, r, p)
+                return hmac.compare_digest(digest, parts[5])
+            if len(parts) == 1:
+                # sha256 ไม่มี salt จากเวอร์ชันก่อน (จะถูก rehash หลัง login สำเร็จ)
+                digest = hashlib.sha256(password.encode()).hexdigest()
+                return hmac.compare_digest(digest, encoded)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"⚠️ รูปแบบ password hash ไม่ถูกต้อง: {e}")
+        return False
+
+    def _run(self, func, *args):
+        """คำนวณ KDF ใน pool (hashlib ปล่อย GIL ระหว่างคำนวณ)"""
+        return self._executor().submit(func, *args).result()
+
+    def _executor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kdf")
+        return self._pool
+
+    def _cache_lookup_key(self, password, encoded):
+        if not self.cache_size:
+            return None
+        message = encoded.encode() + b'\0' + password.encode()
+        return hmac.new(self._cache_key, message, hashlib.sha256).digest()
+
+    def _cache_hit(self, key):
+        if key is None:
+            return False
+        with self._cache_lock:
+            stored = self._cache.get(key)
+            if stored is None:
+                return False
+            if time.monotonic() - stored > self.cache_ttl:
+                del self._cache[key]
+                return False
+            self._cache.move_to_end(key)
+            return True
+
+    def _cache_store(self, key):
+        if key is None:
+            return
+        with self._cache_lock:
+            self._cache[key] = time.monotonic()
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations, HASH_BYTES).hex()
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                          maxmem=128 * n * r * p + 1024 * 1024, dklen=HASH_BYTES).hex()
+
+
+# สร้าง instance เดียว
+password_hasher = PasswordHasher(
+    algorithm=AUTH_KDF,
+    iterations=AUTH_KDF_ITERATIONS,
+    scrypt_n=AUTH_SCRYPT_N,
+    scrypt_r=AUTH_SCRYPT_R,
+    scrypt_p=AUTH_SCRYPT_P,
+    workers=AUTH_KDF_WORKERS,
+    cache_size=AUTH_KDF_CACHE_SIZE,
+    cache_ttl=AUTH_KDF_CACHE_TTL,
+)
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling - เก็บ cProfile/tracemalloc ของคำขอและงานที่ช้า เปิดปิดได้ขณะทำงาน
+"""
+
+import io
+import os
+import json
+import time
+import random
+import pstats
+import cProfile
+import logging
+import secrets
+import threading
+import tracemalloc
+from functools import wraps
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import PROFILING_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_MAX_FILES, PROFILE_DIR, PROFILE_TRACEMALLOC
+
+logger = logging.getLogger(__name__)
+
+# header สำหรับขอ profile คำขอนั้น (มีผลเฉพาะ admin)
+PROFILE_HEADER = "X-Profile"
+
+
+class ProfileSession:
+    """การเก็บ profile หนึ่งครั้ง"""
+
+    def __init__(self, manager, label, memory):
+        self.manager = manager
+        self.label = label
+        self.memory = memory and not tracemalloc.is_tracing()
+        self.profile = cProfile.Profile()
+        self.started = None
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def finish(self) -> Optional[str]:
+        """หยุดเก็บและเขียนไฟล์ คืนชื่อไฟล์ .prof"""
+        self.profile.disable()
+        duration = time.perf_counter() - self.started
+        top_memory = []
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            top_memory = [
+                {"location": str(stat.traceback), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics('lineno')[:15]
+            ]
+        return self.manager._save(self, duration, top_memory)
+
+
+class ProfileManager:
+    """จัดการการ profile แบบ sampling / opt-in และหมุนเวียนไฟล์"""
+
+    def __init__(self, profile_dir, enabled=False, sample_rate=0.0, max_files=50, memory=True):
+        """
+        Args:
+            profile_dir: โฟลเดอร์เก็บไฟล์ profile
+            enabled: เปิดใช้งานหรือไม่
+            sample_rate: สัดส่วนคำขอ/งานที่สุ่ม profile (0.0 - 1.0)
+            max_files: จำนวนไฟล์ profile สูงสุดที่เก็บไว้
+            memory: เก็บ tracemalloc ด้วยหรือไม่
+        """
+        self.profile_dir = Path(profile_dir)
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.memory = memory
+        self._local = threading.local()
+        # profile ได้ครั้งละหนึ่ง session ทั้ง process (tracemalloc เป็น global)
+        self._busy = threading.Lock()
+
+    # ===== Settings =====
+
+    def configure(self, enabled=None, sample_rate=None, memory=None):
+        """ปรับค่าขณะทำงาน"""
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        if memory is not None:
+            self.memory = bool(memory)
+        logger.info(f"🔬 profiling: enabled={self.enabled}, sample_rate={self.sample_rate}, memory={self.memory}")
+
+    def settings(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "memory": self.memory,
+            "max_files": self.max_files,
+        }
+
+    # ===== Sessions =====
+
+    def sampled(self) -> bool:
+        """สุ่มตาม sample_rate"""
+        return self.enabled and self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def active(self) -> Optional[ProfileSession]:
+        return getattr(self._local, 'session', None)
+
+    def begin(self, label) -> Optional[ProfileSession]:
+        """เริ่ม session (None ถ้ามี session อื่นทำงานอยู่)"""
+        if self.active() or not self._busy.acquire(blocking=False):
+            return None
+        try:
+            session = ProfileSession(self, label, self.memory).start()
+        except Exception as e:
+            self._busy.release()
+            logger.warning(f"⚠️ เริ่ม profile ไม่ได้: {e}")
+            return None
+        self._local.session = session
+        return session
+
+    def end(self, session: Optional[ProfileSession]) -> Optional[str]:
+        """จบ session และบันทึกไฟล์"""
+        if session is None:
+            return None
+        try:
+            return session.finish()
+        except Exception as e:
+            logger.warning(f"⚠️ บันทึก profile ไม่ได้: {e}")
+            return None
+        finally:
+            self._local.session = None
+            self._busy.release()
+
+    def profiled(self, label):
+        """Decorator: profile ฟังก์ชันตาม sample_rate (ถ้ายังไม่อยู่ใน session)"""
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or self.active() or not self.sampled():
+                    return f(*args, **kwargs)
+                session = self.begin(label)
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.end(session)
+            return wrapper
+        return decorator
+
+    def profile_methods(self, prefix):
+        """Class decorator: ห่อทุกเมธอด public ด้วย profiled(prefix.method)"""
+        def decorator(cls):
+            for name, attr in list(vars(cls).items()):
+                if not name.startswith('_') and callable(attr):
+                    setattr(cls, name, self.profiled(f"{prefix}.{name}")(attr))
+            return cls
+        return decorator
+
+    # ===== Files =====
+
+    def _save(self, session: ProfileSession, duration, top_memory) -> str:
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() or c in "._-" else "_" for c in session.label)[:60]
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{safe_label}_{secrets.token_hex(3)}"
+
+        prof_path = self.profile_dir / f"{name}.prof"
+        session.profile.dump_stats(str(prof_path))
+
+        meta = {
+            "name": name,
+            "label": session.label,
+            "created_at": datetime.now().isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "memory_top": top_memory,
+        }
+        with open(self.profile_dir / f"{name}.json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        self._rotate()
+        logger.info(f"🔬 บันทึก profile: {name} ({meta['duration_ms']} ms)")
+        return prof_path.name
+
+    def _rotate(self):
+        """เก็บไว้เฉพาะ max_files ไฟล์ล่าสุด"""
+        profiles = sorted(self.profile_dir.glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in profiles[self.max_files:]:
+            for path in (old, old.with_suffix(".json")):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def list_profiles(self) -> List[Dict]:
+        """รายการ profile (ใหม่สุดก่อน)"""
+        result = []
+        if not self.profile_dir.exists():
+            return result
+        for meta_path in sorted(self.profile_dir.glob("*.json"), reverse=True):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            meta.pop("memory_top", None)
+            meta["file"] = f"{meta_path.stem}.prof"
+            result.append(meta)
+        return result
+
+    def profile_path(self, filename) -> Optional[Path]:
+        """path ของไฟล์ profile (None ถ้าไม่พบหรือชื่อไม่ถูกต้อง)"""
+        path = self.profile_dir / os.path.basename(filename)
+        if path.suffix not in (".prof", ".json") or not path.exists():
+            return None
+        return path
+
+    def aggregate(self, label=None, sort="cumulative", limit=30) -> Dict:
+        """รวม stats ของทุก profile (หรือเฉพาะ label) เป็นตาราง"""
+        files = [
+            str(self.profile_dir / p["file"]) for p in self.list_profiles()
+            if label is None or p["label"] == label
+        ]
+        if not files:
+            return {"profiles": 0, "functions": []}
+
+        stats = pstats.Stats(*files, stream=io.StringIO())
+        stats.sort_stats(sort)
+        rows = []
+        for func in stats.fcn_list[:limit]:
+            cc, nc, tt, ct, _ = stats.stats[func]
+            filename, line, name = func
+            rows.append({
+                "function": f"{filename}:{line}({name})",
+                "calls": nc,
+                "primitive_calls": cc,
+                "total_time": round(tt, 6),
+                "cumulative_time": round(ct, 6),
+            })
+        return {"profiles": len(files), "sort": sort, "functions": rows}
+
+
+# สร้าง instance เดียว
+profiler = ProfileManager(
+    PROFILE_DIR,
+    enabled=PROFILING_ENABLED,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    max_files=PROFILE_MAX_FILES,
+    memory=PROFILE_TRACEMALLOC,
+)
+
+
+def register_profiling_routes(app, profiler, auth_manager, require_auth, require_role):
+    """ติดตั้ง hooks profile ต่อคำขอ และลงทะเบียน admin routes"""
+    from flask import request, jsonify, g, send_file
+
+    @app.before_request
+    def _profiling_begin():
+        if not profiler.enabled:
+            return
+        wants_profile = request.headers.get(PROFILE_HEADER) == "1"
+        if wants_profile:
+            # header มีผลเฉพาะ token ของ admin
+            token = request.headers.get('Authorization', '')
+            if token.startswith('Bearer '):
+                token = token[7:]
+            user = auth_manager.verify_token(token) if token else None
+            wants_profile = bool(user) and user.get('role') == 'admin'
+        if wants_profile or profiler.sampled():
+            g._profile_session = profiler.begin(f"{request.method} {request.path}")
+
+    @app.teardown_request
+    def _profiling_end(error=None):
+        session = g.pop('_profile_session', None)
+        if session is not None:
+            profiler.end(session)
+
+    @app.route('/admin/profiling', methods=['GET'])
+    @require_auth
+    @require_role('admin')
+    def get_profiling():
+        """ดูการตั้งค่าและรายการ profile (Admin only)"""
+        profiles = profiler.list_profiles()
+        return jsonify({
+            "success": True,
+            "settings": profiler.settings(),
+            "count": len(profiles),
+            "profiles": profiles
+        }), 200
+
+    @app.route('/admin/profiling', methods=['PUT'])
+    @require_auth
+    @require_role('admin')
+    def update_profiling():
+        """เปิด/ปิด profiling และปรับ sample rate (Admin only)"""
+        try:
+            data = request.get_json() or {}
+            profiler.configure(
+                enabled=data.get('enabled'),
+                sample_rate=data.get('sample_rate'),
+                memory=data.get('memory')
+            )
+            return jsonify({"success": True, "settings": profiler.settings()}), 200
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+
+    @app.route('/admin/profiling/stats', methods=['GET'])
+    @require_auth
+    @require_role('admin')
+    def get_profiling_stats():
+        """stats รวมของ profile ทั้งหมด (Admin only)"""
+        try:
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in ('cumulative', 'tottime', 'calls', 'ncalls'):
+                return jsonify({"error": "sort ต้องเป็น cumulative, tottime, calls หรือ ncalls"}), 400
+            try:
+                limit = int(request.args.get('limit', 30))
+            except ValueError:
+                return jsonify({"error": "limit ต้องเป็นตัวเลข"}), 400
+            result = profiler.aggregate(
+                label=request.args.get('label'),
+                sort=sort,
+                limit=limit
+            )
+            return jsonify({"success": True, **result}), 200
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/admin/profiling/<filename>', methods=['GET'])
+    @require_auth
+    @require_role('admin')
+    def download_profile(filename):
+        """ดาวน์โหลดไฟล์ profile (.prof / .json) (Admin only)"""
+        path = profiler.profile_path(filename)
+        if not path:
+            return jsonify({"error": "ไม่พบไฟล์ profile"}), 404
+        return send_file(path, as_attachment=True)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Rate Limiting - จำกัดจำนวนคำขอด้วย sliding window counter (ตาม IP / username)
+"""
+
+import math
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from functools import wraps
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import metrics
+from config import RATE_LIMIT_ENABLED, RATE_LIMIT_BACKEND, RATE_LIMIT_SQLITE_PATH, RATE_LIMITS, TRUSTED_PROXIES
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rule(text) -> Tuple[int, float]:
+    """แปลง "20/60" เป็น (จำนวนครั้ง, วินาที)"""
+    count, _, window = str(text).partition('/')
+    return int(count), float(window or 60)
+
+
+def _evaluate(start, current, previous, limit, window, now):
+    """ประมาณจำนวนคำขอใน window ล่าสุด คืน (อนุญาต, retry_after, current, previous, start)
+
+    ใช้ตัวนับของ window ปัจจุบันและก่อนหน้า ถ่วงน้ำหนักตามเวลาที่ซ้อนกัน (O(1) ต่อ key)
+    """
+    window_start = math.floor(now / window) * window
+    if start != window_start:
+        previous = current if start == window_start - window else 0
+        current = 0
+        start = window_start
+
+    elapsed = now - window_start
+    estimated = previous * (window - elapsed) / window + current
+    if estimated + 1 <= limit:
+        return True, 0, current + 1, previous, start
+
+    if current + 1 > limit or not previous:
+        retry_after = window - elapsed
+    else:
+        # เวลาที่น้ำหนักของ window ก่อนหน้าลดลงจนเหลือที่ว่าง
+        retry_after = window - (limit - 1 - current) * window / previous - elapsed
+    return False, max(1, math.ceil(retry_after)), current, previous, start
+
+
+class MemoryBackend:
+    """ตัวนับในหน่วยความจำของ process (LRU: key ที่ไม่ได้ใช้นานที่สุดถูกลบเมื่อเกิน max_keys)"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._counters: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, now):
+        with self._lock:
+            start, current, previous = self._counters.get(key, (None, 0, 0))
+            allowed, retry_after, current, previous, start = _evaluate(
+                start, current, previous, limit, window, now)
+            self._counters[key] = (start, current, previous)
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+            return allowed, retry_after
+
+    def reset(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+
+
+class SqliteBackend:
+    """ตัวนับใน SQLite บนเครื่อง ใช้ร่วมกันได้หลาย worker process"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _connect(self):
+        """connection ต่อ thread (สร้างไฟล์และตารางเมื่อใช้ครั้งแรก ไม่ใช่ตอน import)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, start REAL, current INTEGER, previous INTEGER)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key, limit, window, now):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT start, current, previous FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            start, current, previous = row if row else (None, 0, 0)
+            allowed, retry_after, current, previous, start = _evaluate(
+                start, current, previous, limit, window, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, start, current, previous) VALUES (?, ?, ?, ?)",
+                (key, start, current, previous))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def reset(self, key):
+        self._connect().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+class RateLimiter:
+    """ตรวจกฎ rate limit และคืน 429 ก่อนถึง handler"""
+
+    def __init__(self, rules: Dict[str, str], backend=None, enabled=True):
+        """
+        Args:
+            rules: ชื่อกฎ -> "จำนวน/วินาที" เช่น {"login_ip": "20/60"}
+            backend: MemoryBackend หรือ SqliteBackend
+            enabled: เปิดใช้งานหรือไม่
+        """
+        self.rules = {name: parse_rule(value) for name, value in rules.items()}
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+
+    def check(self, rule, key) -> Tuple[bool, int]:
+        """นับคำขอหนึ่งครั้ง คืน (อนุญาต, retry_after วินาที)"""
+        if not self.enabled or rule not in self.rules or not key:
+            return True, 0
+        limit, window = self.rules[rule]
+        try:
+            return self.backend.hit(f"{rule}:{key}", limit, window, time.time())
+        except Exception as e:
+            # backend มีปัญหาไม่ควรทำให้ระบบล่ม
+            logger.warning(f"⚠️ rate limit backend ผิดพลาด: {e}")
+            return True, 0
+
+    def reset(self, rule, key):
+        """ล้างตัวนับ (เช่น หลัง login สำเร็จ)"""
+        if self.enabled and key:
+            try:
+                self.backend.reset(f"{rule}:{key}")
+            except Exception as e:
+                logger.warning(f"⚠️ rate limit backend ผิดพลาด: {e}")
+
+    def limit(self, *checks):
+        """Decorator: checks คือ (ชื่อกฎ, ฟังก์ชันคืน key จากคำขอ)"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                for rule, key_func in checks:
+                    allowed, retry_after = self.check(rule, key_func())
+                    if not allowed:
+                        return too_many_requests(rule, retry_after)
+                return f(*args, **kwargs)
+            return decorated_function
+        return decorator
+
+
+# ===== Keys =====
+
+def client_ip():
+    """IP ของผู้ใช้ ถ้ามี reverse proxy (TRUSTED_PROXIES > 0) อ่านจาก X-Forwarded-For ตามจำนวน proxy ที่เชื่อถือ"""
+    from flask import request
+    if TRUSTED_PROXIES:
+        forwarded = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+        if len(forwarded) >= TRUSTED_PROXIES:
+            # ค่าที่ proxy ของเราเติมไว้ท้ายสุด ค่าก่อนหน้านั้นผู้ใช้ปลอมได้
+            return forwarded[-TRUSTED_PROXIES]
+    return request.remote_addr or "unknown"
+
+
+def json_field(name):
+    """key จากฟิลด์ใน JSON body (เช่น username ของ /login)"""
+    def key():
+        from flask import request
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return None
+        value = data.get(name)
+        return str(value).lower() if value else None
+    return key
+
+
+def current_username():
+    """key จากผู้ใช้ที่ผ่าน require_auth แล้ว"""
+    from auth import current_context
+    context = current_context()
+    return context.username if context else None
+
+
+def too_many_requests(rule, retry_after):
+    from flask import jsonify
+    metrics.rate_limited_requests.inc(rule)
+    logger.warning(f"⚠️ เกิน rate limit: {rule}")
+    response = jsonify({"error": "คำขอมากเกินไป กรุณาลองใหม่ภายหลัง", "retry_after": retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+# สร้าง instance เดียว
+rate_limiter = RateLimiter(
+    RATE_LIMITS,
+    backend=SqliteBackend(RATE_LIMIT_SQLITE_PATH) if RATE_LIMIT_BACKEND == 'sqlite' else MemoryBackend(),
+    enabled=RATE_LIMIT_ENABLED,
+)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Readiness - warm-up ดัชนี/แคชตอนเริ่ม process (/ready) และการตรวจสุขภาพเชิงลึก (/health?deep=1)
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from json_store import file_signature
+from config import (
+    DATA_DIR, WARMUP_RETRY_INTERVAL, HEALTH_DEEP_TTL, HEALTH_EXPECT_SCHEDULER,
+    SCHEDULER_HEARTBEAT_FILE, SCHEDULER_HEARTBEAT_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+
+def default_steps() -> List[Tuple[str, Callable]]:
+    """ขั้นตอน warm-up ของ stores หลัก (import เมื่อเรียกเพื่อไม่ให้ import โมดูลนี้ช้า)"""
+    from auth import auth_manager
+    from database import db_manager
+    from verification import verification_manager
+    return [
+        ("auth", auth_manager.warm_up),
+        ("database", db_manager.warm_up),
+        ("verification", verification_manager.warm_up),
+    ]
+
+
+class Warmup:
+    """รันขั้นตอน warm-up ใน background แล้วรายงานความคืบหน้า (ขั้นที่ล้มเหลวจะลองใหม่)"""
+
+    def __init__(self, steps=None, retry_interval=10.0):
+        """
+        Args:
+            steps: รายการ (ชื่อ, callable) ค่าเริ่มต้น default_steps()
+            retry_interval: รอกี่วินาทีก่อนลองขั้นที่ล้มเหลวใหม่
+        """
+        self._steps = steps
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started_at = None
+        self._finished_at = None
+        self._progress = {}
+
+    def start(self) -> bool:
+        """เริ่ม warm-up ใน thread (ครั้งเดียวต่อ process) คืน False ถ้าเริ่มไปแล้ว"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+            return True
+
+    @property
+    def ready(self) -> bool:
+        return self._finished_at is not None
+
+    def status(self) -> Dict:
+        """ความคืบหน้า: ready, จำนวนขั้นที่เสร็จ และรายละเอียดต่อขั้น"""
+        with self._lock:
+            steps = [dict(name=name, **info) for name, info in self._progress.items()]
+        done = sum(1 for s in steps if s['status'] == 'done')
+        return {
+            "ready": self.ready,
+            "started": self._started_at is not None,
+            "completed": done,
+            "total": len(steps),
+            "seconds": round((self._finished_at or time.time()) - self._started_at, 3) if self._started_at else 0,
+            "steps": steps
+        }
+
+    def _run(self):
+        steps = self._steps if self._steps is not None else default_steps()
+        with self._lock:
+            for name, _ in steps:
+                self._progress.setdefault(name, {"status": "pending", "seconds": None})
+
+        pending = list(steps)
+        while pending:
+            failed = []
+            for name, step in pending:
+                self._set(name, status="running", error=None)
+                start = time.perf_counter()
+                try:
+                    result = step()
+                    self._set(name, status="done", seconds=round(time.perf_counter() - start, 3), result=result)
+                except Exception as e:
+                    logger.error(f"❌ warm-up {name} ล้มเหลว: {e}")
+                    self._set(name, status="failed", seconds=round(time.perf_counter() - start, 3), error=str(e))
+                    failed.append((name, step))
+            pending = failed
+            if pending:
+                time.sleep(self.retry_interval)
+
+        self._finished_at = time.time()
+        logger.info(f"✅ warm-up เสร็จใน {self._finished_at - self._started_at:.2f} วินาที")
+
+    def _set(self, name, **fields):
+        with self._lock:
+            self._progress[name].update(fields)
+
+
+class DeepHealth:
+    """ตรวจว่าเขียน storage ได้, ไฟล์ store อ่านเป็น JSON ได้ และ scheduler ยังส่ง heartbeat
+
+    ผลถูกแคชไว้ ttl วินาที และไฟล์ที่ลายเซ็นไม่เปลี่ยนจากครั้งก่อนจะไม่ถูก parse ซ้ำ
+    """
+
+    def __init__(self, ttl=30.0, expect_scheduler=False):
+        """
+        Args:
+            ttl: อายุของผลตรวจ (วินาที)
+            expect_scheduler: มี scheduler รันกับข้อมูลชุดนี้ (ไม่พบ heartbeat = ไม่ผ่าน)
+        """
+        self.ttl = ttl
+        self.expect_scheduler = expect_scheduler
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = 0.0
+        self._parsed = {}
+
+    def check(self, force=False) -> Dict:
+        """ผลตรวจล่าสุด (ตรวจใหม่เมื่อหมดอายุหรือ force)"""
+        with self._lock:
+            if force or self._result is None or time.monotonic() - self._checked_at >= self.ttl:
+                start = time.perf_counter()
+                checks = {
+                    "storage": self._check_storage(),
+                    "stores": self._check_stores(),
+                    "scheduler": self._check_scheduler()
+                }
+                self._result = {
+                    # ok=None หมายถึงตรวจไม่ได้ (เช่นไม่มี scheduler ในระบบนี้) ไม่นับเป็นความล้มเหลว
+                    "healthy": all(c['ok'] is not False for c in checks.values()),
+                    "checked_at": datetime.now().isoformat(),
+                    "duration": round(time.perf_counter() - start, 4),
+                    "checks": checks
+                }
+                self._checked_at = time.monotonic()
+            return self._result
+
+    def _check_storage(self):
+        directories = [DATA_DIR, DATA_DIR / "database", DATA_DIR / "uploads"]
+        failures = {}
+        for directory in directories:
+            try:
+                with tempfile.NamedTemporaryFile(dir=directory, prefix=".health.", delete=True) as f:
+                    f.write(b"ok")
+                    f.flush()
+            except OSError as e:
+                failures[str(directory)] = str(e)
+        return {"ok": not failures, "errors": failures}
+
+    def _check_stores(self):
+        files, failures = {}, {}
+        for path in _store_files():
+            signature = file_signature(path)
+            if signature is None:
+                continue
+            if self._parsed.get(path) != signature:
+                try:
+                    with open(path, 'rb') as f:
+                        json.load(f)
+                except (OSError, ValueError) as e:
+                    failures[path.name] = str(e)
+                    continue
+                self._parsed[path] = signature
+            files[path.name] = signature[1]
+        return {"ok": not failures, "errors": failures, "files": files}
+
+    def _check_scheduler(self):
+        try:
+            age = time.time() - os.stat(SCHEDULER_HEARTBEAT_FILE).st_mtime
+        except OSError:
+            if self.expect_scheduler:
+                return {"ok": False, "detail": "ไม่พบ heartbeat ของ scheduler"}
+            return {"ok": None, "detail": "ไม่พบ heartbeat (scheduler ไม่ได้รันกับข้อมูลชุดนี้)"}
+        return {"ok": age <= 3 * SCHEDULER_HEARTBEAT_INTERVAL, "heartbeat_age": round(age, 1)}
+
+
+def _store_files():
+    from auth import auth_manager
+    from database import db_manager
+    from verification import verification_manager
+    return [
+        auth_manager.users_file, auth_manager.tokens_file, auth_manager.revocations.filepath,
+        db_manager.profiles_db, db_manager.audit_db, db_manager.sessions_db,
+        verification_manager.verifications_db, verification_manager.shared_profiles_db,
+    ]
+
+
+# สร้าง instance เดียว
+warmup = Warmup(retry_interval=WARMUP_RETRY_INTERVAL)
+deep_health = DeepHealth(ttl=HEALTH_DEEP_TTL, expect_scheduler=HEALTH_EXPECT_SCHEDULER)
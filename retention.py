@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Retention Engine - ล้างไฟล์เก่าตามนโยบายของแต่ละโฟลเดอร์
+"""
+
+import os
+import time
+import fnmatch
+import logging
+from pathlib import Path
+from typing import Dict, List
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# จำนวนไฟล์ที่ลบต่อหนึ่ง batch ก่อนปล่อย CPU ให้ thread อื่น
+DEFAULT_BATCH_SIZE = 500
+
+
+class RetentionPolicy:
+    """นโยบายการเก็บไฟล์ของโฟลเดอร์หนึ่ง"""
+
+    def __init__(self, name, path, max_age_days=None, max_total_bytes=None,
+                 keep_last=None, pattern="*", recursive=True):
+        """
+        Args:
+            name: ชื่อนโยบาย (ใช้ใน log/สรุปผล)
+            path: โฟลเดอร์ที่ต้องการดูแล
+            max_age_days: ลบไฟล์ที่เก่ากว่าจำนวนวันนี้
+            max_total_bytes: ลบไฟล์เก่าสุดจนขนาดรวมไม่เกินค่านี้
+            keep_last: เก็บเฉพาะ N ไฟล์ล่าสุด
+            pattern: รูปแบบชื่อไฟล์ (fnmatch) ที่อยู่ในนโยบาย
+            recursive: รวมโฟลเดอร์ย่อยหรือไม่
+        """
+        self.name = name
+        self.path = Path(path)
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        self.keep_last = keep_last
+        self.pattern = pattern
+        self.recursive = recursive
+
+    @classmethod
+    def from_dict(cls, name, config: Dict):
+        """สร้างนโยบายจาก dict ใน config.RETENTION_POLICIES"""
+        max_total_mb = config.get("max_total_mb")
+        return cls(
+            name=name,
+            path=config["path"],
+            max_age_days=config.get("max_age_days"),
+            max_total_bytes=int(max_total_mb * 1024 * 1024) if max_total_mb else None,
+            keep_last=config.get("keep_last"),
+            pattern=config.get("pattern", "*"),
+            recursive=config.get("recursive", True),
+        )
+
+    def scan(self) -> List[tuple]:
+        """รายการไฟล์ (mtime, size, path) ด้วย os.scandir (stat มากับ entry)"""
+        entries = []
+        if not self.path.exists():
+            return entries
+
+        stack = [str(self.path)]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            if entry.name.startswith('.') or not fnmatch.fnmatch(entry.name, self.pattern):
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                            entries.append((st.st_mtime, st.st_size, entry.path))
+            except OSError as e:
+                logger.warning(f"⚠️ อ่านโฟลเดอร์ไม่ได้: {current} ({e})")
+        return entries
+
+    def select_expired(self, entries: List[tuple], now=None) -> List[tuple]:
+        """เลือกไฟล์ที่ต้องลบตามนโยบาย (ไฟล์ใหม่สุดก่อน)"""
+        now = now or time.time()
+        entries = sorted(entries, reverse=True)
+        expired = []
+        kept_bytes = 0
+        cutoff = now - self.max_age_days * 86400 if self.max_age_days is not None else None
+
+        for index, item in enumerate(entries):
+            mtime, size, _ = item
+            if cutoff is not None and mtime < cutoff:
+                expired.append(item)
+            elif self.keep_last is not None and index >= self.keep_last:
+                expired.append(item)
+            elif self.max_total_bytes is not None and kept_bytes + size > self.max_total_bytes:
+                expired.append(item)
+            else:
+                kept_bytes += size
+
+        return expired
+
+
+class RetentionEngine:
+    """ลบไฟล์ตามนโยบายแบบเป็น batch และสรุปผลครั้งเดียวต่อรอบ"""
+
+    def __init__(self, policies: List[RetentionPolicy], batch_size=DEFAULT_BATCH_SIZE, max_deletions=None):
+        """
+        Args:
+            policies: รายการ RetentionPolicy
+            batch_size: จำนวนไฟล์ที่ลบต่อ batch
+            max_deletions: จำนวนไฟล์สูงสุดที่ลบได้ต่อรอบ (None = ไม่จำกัด)
+        """
+        self.policies = policies
+        self.batch_size = batch_size
+        self.max_deletions = max_deletions
+
+    def run(self) -> Dict:
+        """ล้างไฟล์ตามทุกนโยบาย คืนค่าสรุปผล"""
+        started = time.monotonic()
+        summary = {"scanned": 0, "deleted": 0, "freed_bytes": 0, "errors": 0, "policies": {}}
+        budget = self.max_deletions
+
+        for policy in self.policies:
+            entries = policy.scan()
+            expired = policy.select_expired(entries)
+            if budget is not None:
+                # ลบไฟล์เก่าสุดก่อนเมื่อถูกจำกัดจำนวน
+                expired = sorted(expired)[:budget]
+
+            deleted, freed, errors = self._delete_in_batches(expired)
+            if deleted and policy.recursive:
+                self._prune_empty_dirs(policy.path, expired)
+
+            summary["scanned"] += len(entries)
+            summary["deleted"] += deleted
+            summary["freed_bytes"] += freed
+            summary["errors"] += errors
+            summary["policies"][policy.name] = {"scanned": len(entries), "deleted": deleted, "freed_bytes": freed}
+            metrics.retention_deleted_files.inc(policy.name, amount=deleted)
+            metrics.retention_freed_bytes.inc(policy.name, amount=freed)
+
+            if budget is not None:
+                budget -= deleted
+                if budget <= 0:
+                    break
+
+        summary["duration_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(
+            f"🧹 retention: สแกน {summary['scanned']} ไฟล์, ลบ {summary['deleted']} ไฟล์, "
+            f"คืนพื้นที่ {summary['freed_bytes']} bytes, ผิดพลาด {summary['errors']} "
+            f"({summary['duration_seconds']}s)"
+        )
+        return summary
+
+    def _delete_in_batches(self, expired: List[tuple]):
+        """ลบไฟล์ทีละ batch"""
+        deleted = freed = errors = 0
+        for start in range(0, len(expired), self.batch_size):
+            for _, size, path in expired[start:start + self.batch_size]:
+                try:
+                    os.unlink(path)
+                    deleted += 1
+                    freed += size
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    errors += 1
+                    logger.debug(f"ลบไฟล์ไม่ได้: {path} ({e})")
+            # ปล่อย GIL ระหว่าง batch เพื่อไม่ให้แย่ง API/Scheduler นานเกินไป
+            time.sleep(0)
+        return deleted, freed, errors
+
+    def _prune_empty_dirs(self, root: Path, expired: List[tuple]):
+        """ลบโฟลเดอร์ย่อยที่ว่างหลังลบไฟล์ (ไม่ลบ root)"""
+        root = Path(root)
+        parents = sorted({Path(path).parent for _, _, path in expired}, key=lambda p: len(p.parts), reverse=True)
+        for directory in parents:
+            while directory != root and root in directory.parents:
+                try:
+                    directory.rmdir()
+                except OSError:
+                    break
+                directory = directory.parent
+
+
+def run_retention(policies: Dict, batch_size=DEFAULT_BATCH_SIZE, max_deletions=None) -> Dict:
+    """ล้างไฟล์ตาม dict ของนโยบาย (รูปแบบเดียวกับ config.RETENTION_POLICIES)"""
+    engine = RetentionEngine(
+        [RetentionPolicy.from_dict(name, cfg) for name, cfg in policies.items()],
+        batch_size=batch_size,
+        max_deletions=max_deletions,
+    )
+    return engine.run()
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Supervisor - รัน API, scheduler, watcher และ processor เป็น process แยกกัน
+
+    python main.py --supervise
+
+- API รับคำขอจาก socket ที่ supervisor เปิดไว้ (1 worker: stores ล็อกได้เฉพาะภายใน process)
+- เมื่อมี API worker, scheduler รันเป็น thread ใน API worker (งานที่เขียน stores ใช้ lock เดียวกับคำขอ API)
+- watcher ส่งเหตุการณ์ไฟล์ให้ processor ผ่าน multiprocessing.Queue (แบ่งตาม path)
+- worker ที่ตาย, ไม่ส่ง heartbeat หรือ API ที่ /health ล้มเหลวติดกันจะถูก restart (มี backoff)
+"""
+
+import os
+import time
+import zlib
+import queue
+import signal
+import socket
+import logging
+import threading
+import urllib.request
+import multiprocessing
+from typing import Dict
+
+from config import (
+    DATA_DIR, API_HOST, API_PORT, SUPERVISOR_WORKERS,
+    SUPERVISOR_HEARTBEAT_TIMEOUT, SUPERVISOR_HEALTH_INTERVAL, SUPERVISOR_HEALTH_FAILURES,
+    PROCESSOR_BATCH_DELAY, ensure_directories
+)
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("api", "scheduler", "watcher", "processor")
+# บทบาทที่รันซ้อนกันไม่ได้ (งานตามเวลาจะรันซ้ำ / เหตุการณ์ไฟล์ซ้ำ)
+SINGLE_ROLES = ("scheduler", "watcher")
+# stores เป็นไฟล์ JSON แบบ read-modify-write ที่ล็อกด้วย threading.RLock ภายใน process เท่านั้น
+# API หลาย process จะเขียนทับกันและมีดัชนีในหน่วยความจำไม่ตรงกัน จึงจำกัดไว้ 1 worker
+MAX_API_WORKERS = 1
+
+HEARTBEAT_INTERVAL = 5
+CHECK_INTERVAL = 1
+STOP_TIMEOUT = 10
+RESTART_BACKOFF_MAX = 60
+# worker ที่อยู่ได้นานกว่านี้ (วินาที) ถือว่าเสถียร backoff กลับไปเริ่มใหม่
+STABLE_AFTER = 60
+
+
+# ===== Worker (รันใน process ลูก) =====
+
+def _worker_main(role, index, heartbeat, channels, listener, options=None):
+    """จุดเริ่มของ process ลูก: ตั้ง logging, heartbeat และสัญญาณหยุด แล้วรันบทบาท"""
+    from main import setup_logging
+    setup_logging(role=f"{role}-{index}")
+    # Ctrl+C ส่งถึงทั้ง process group ให้ supervisor เป็นผู้สั่งหยุดด้วย SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    stop = threading.Event()
+
+    def beat():
+        while not stop.is_set():
+            heartbeat.value = time.time()
+            stop.wait(HEARTBEAT_INTERVAL)
+
+    threading.Thread(target=beat, name="heartbeat", daemon=True).start()
+    ROLE_RUNNERS[role](stop, channels, listener, **(options or {}))
+    logger.info(f"⛔ {role}-{index} หยุดทำงาน")
+
+
+def _run_api(stop, channels, listener, scheduler=False):
+    from werkzeug.serving import make_server
+    from api import get_app
+    from system_monitor import system_sampler
+
+    server = make_server(API_HOST, API_PORT, get_app(), threaded=True, fd=listener.fileno())
+    system = None
+    if scheduler:
+        # งาน expire/purge/snapshot/backup เขียน stores เดียวกับ API จึงต้องใช้ lock และแคชใน process เดียวกัน
+        # (metrics ของงานจึงออกที่ /metrics ของ API ด้วย)
+        from main import AutomationSystem
+        system = AutomationSystem()
+        threading.Thread(target=system.run, kwargs={"api": False, "watcher": False},
+                         name="scheduler", daemon=True).start()
+
+    def shutdown(*_):
+        if system is not None:
+            system.stop()
+        # shutdown() ต้องเรียกจาก thread อื่นที่ไม่ใช่ serve_forever
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    system_sampler.start()
+    logger.info(f"🌐 API worker พร้อมรับคำขอที่ http://localhost:{API_PORT}"
+                + (" (รวม scheduler)" if scheduler else ""))
+    server.serve_forever()
+    stop.set()
+
+
+def _run_scheduler(stop, channels, listener):
+    from main import AutomationSystem
+
+    system = AutomationSystem()
+    signal.signal(signal.SIGTERM, lambda *_: system.stop())
+    system.run(api=False, watcher=False)
+    stop.set()
+
+
+def _run_watcher(stop, channels, listener):
+    from file_watcher import FileWatcher
+
+    def forward(kind, path):
+        # path เดียวกันไปที่ processor ตัวเดียวกันเสมอ (ไม่ประมวลผลซ้ำข้าม worker)
+        if channels:
+            channels[zlib.crc32(path.encode('utf-8')) % len(channels)].put((kind, path))
+
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    upload_dir = DATA_DIR / 'uploads'
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    watcher = FileWatcher([str(upload_dir)], on_event=forward)
+    watcher.start()
+    stop.wait()
+    watcher.stop()
+
+
+def _run_processor(stop, channels, listener):
+    from pathlib import Path
+    from data_processor import DataProcessor
+
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    processor = DataProcessor(DATA_DIR / 'uploads', DATA_DIR / 'results')
+    events = channels[0]
+    pending: Dict[str, float] = {}
+
+    def flush(force=False):
+        # ประมวลผลเฉพาะไฟล์ที่ไม่มีเหตุการณ์ใหม่นาน PROCESSOR_BATCH_DELAY (เขียนเสร็จแล้ว)
+        now = time.monotonic()
+        ready = [p for p, seen in pending.items() if force or now - seen >= PROCESSOR_BATCH_DELAY]
+        for path in ready:
+            del pending[path]
+        files = [Path(p) for p in ready if Path(p).is_file()]
+        if files:
+            results = processor.batch_process(files)
+            logger.info(f"✓ ประมวลผลไฟล์ {len(results)} ไฟล์")
+
+    while not stop.is_set():
+        try:
+            kind, path = events.get(timeout=0.5)
+            pending[path] = time.monotonic()
+            continue
+        except queue.Empty:
+            pass
+        except (EOFError, OSError):
+            break
+        if pending:
+            flush()
+    if pending:
+        flush(force=True)
+
+
+ROLE_RUNNERS = {
+    "api": _run_api,
+    "scheduler": _run_scheduler,
+    "watcher": _run_watcher,
+    "processor": _run_processor,
+}
+
+
+# ===== Supervisor (process หลัก) =====
+
+class _Worker:
+    """สถานะของ worker หนึ่งตัวใน supervisor"""
+
+    def __init__(self, role, index):
+        self.role = role
+        self.index = index
+        self.process = None
+        self.heartbeat = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 1.0
+        self.next_start = 0.0
+
+    @property
+    def name(self):
+        return f"{self.role}-{self.index}"
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+
+class Supervisor:
+    """เริ่มและดูแล process ของแต่ละบทบาท"""
+
+    def __init__(self, workers: Dict[str, int] = None):
+        """
+        Args:
+            workers: จำนวน process ต่อบทบาท (ค่าเริ่มต้น SUPERVISOR_WORKERS)
+        """
+        self.workers = self._normalize(workers or SUPERVISOR_WORKERS)
+        # stores ล็อกได้เฉพาะภายใน process: เมื่อมี API worker ให้ scheduler รันเป็น thread ใน API worker
+        # scheduler เป็น process แยกเฉพาะเมื่อไม่มี API (ไม่มีผู้เขียนอื่นให้ชน)
+        self.scheduler_in_api = bool(self.workers["api"] and self.workers["scheduler"])
+        if self.scheduler_in_api:
+            self.workers["scheduler"] = 0
+        # spawn: process ลูกเริ่มจาก interpreter ใหม่ ไม่รับ lock/thread ที่ค้างจาก fork
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop = threading.Event()
+        self._listener = None
+        self._channels = []
+        self._pool = [_Worker(role, i) for role in ROLES for i in range(self.workers[role])]
+        self._health_failures = 0
+        self._health_checked = 0.0
+        # heartbeat ถูกส่งทุก HEARTBEAT_INTERVAL จึงต้องรอนานกว่านั้นก่อนถือว่าค้าง
+        self.heartbeat_timeout = max(SUPERVISOR_HEARTBEAT_TIMEOUT, 2 * HEARTBEAT_INTERVAL)
+
+    # ===== Lifecycle =====
+
+    def run(self) -> int:
+        """เริ่มทุก worker แล้วดูแลจนได้รับ SIGTERM/SIGINT คืน exit code"""
+        ensure_directories()
+        if self.workers["scheduler"] or self.scheduler_in_api:
+            # worker ใหม่อ่าน config จาก environment: deep health ของ API ต้องเห็น heartbeat ของ scheduler
+            os.environ["HEALTH_EXPECT_SCHEDULER"] = "true"
+        if self.workers["api"]:
+            self._listener = self._listen()
+        # คิวของ processor แต่ละตัวเป็นของ supervisor เหตุการณ์ที่ค้างจึงไม่หายเมื่อ processor restart
+        self._channels = [self._ctx.Queue() for _ in range(self.workers["processor"])]
+
+        signal.signal(signal.SIGTERM, lambda *_: self._stop.set())
+        signal.signal(signal.SIGINT, lambda *_: self._stop.set())
+        logger.info(f"🚀 Supervisor เริ่มทำงาน: {self.workers}"
+                    + (" (scheduler รันใน API worker)" if self.scheduler_in_api else ""))
+
+        try:
+            while not self._stop.is_set():
+                self._check()
+                self._stop.wait(CHECK_INTERVAL)
+        finally:
+            self.shutdown()
+        return 0
+
+    def shutdown(self):
+        """ส่ง SIGTERM ให้ทุก worker รอ STOP_TIMEOUT แล้ว kill ตัวที่ยังไม่หยุด"""
+        logger.info("⛔ หยุด Supervisor และ worker ทั้งหมด")
+        running = [w for w in self._pool if w.alive()]
+        for worker in running:
+            worker.process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for worker in running:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logger.warning(f"⚠️ {worker.name} ไม่หยุดภายใน {STOP_TIMEOUT} วินาที ใช้ kill")
+                worker.process.kill()
+                worker.process.join()
+        for channel in self._channels:
+            channel.close()
+        if self._listener:
+            self._listener.close()
+
+    def status(self):
+        """สถานะของแต่ละ worker (pid, uptime, heartbeat ล่าสุด, จำนวน restart)"""
+        now, uptime_now = time.time(), time.monotonic()
+        return [{
+            "name": w.name,
+            "pid": w.process.pid if w.process else None,
+            "alive": w.alive(),
+            "uptime": round(uptime_now - w.started_at, 1) if w.alive() else 0,
+            "heartbeat_age": round(now - w.heartbeat.value, 1) if w.heartbeat else None,
+            "restarts": w.restarts
+        } for w in self._pool]
+
+    # ===== Internals =====
+
+    def _check(self):
+        now = time.time()
+        for worker in self._pool:
+            if worker.alive():
+                if now - worker.heartbeat.value > self.heartbeat_timeout:
+                    logger.error(f"❌ {worker.name} ไม่ส่ง heartbeat {now - worker.heartbeat.value:.0f} วินาที")
+                    self._restart(worker)
+                continue
+            if worker.process is not None:
+                self._schedule_restart(worker)
+            if time.monotonic() >= worker.next_start:
+                self._start(worker)
+
+        if self.workers["api"] and time.monotonic() - self._health_checked >= SUPERVISOR_HEALTH_INTERVAL:
+            self._check_api_health()
+
+    def _start(self, worker):
+        worker.heartbeat = self._ctx.RawValue('d', time.time())
+        channels = self._channels
+        if worker.role == "processor":
+            channels = [self._channels[worker.index]]
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.role, worker.index, worker.heartbeat, channels,
+                  self._listener if worker.role == "api" else None,
+                  {"scheduler": self.scheduler_in_api} if worker.role == "api" else None),
+            name=worker.name,
+            daemon=False
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        logger.info(f"✅ เริ่ม {worker.name} (pid {worker.process.pid})")
+
+    def _schedule_restart(self, worker):
+        """ตั้งเวลาเริ่มใหม่ให้ worker ที่ตาย (backoff เพิ่มเป็นเท่าตัวถ้าตายเร็ว)"""
+        uptime = time.monotonic() - worker.started_at
+        worker.backoff = 1.0 if uptime >= STABLE_AFTER else min(worker.backoff * 2, RESTART_BACKOFF_MAX)
+        worker.next_start = time.monotonic() + worker.backoff
+        worker.restarts += 1
+        logger.error(f"❌ {worker.name} หยุดทำงาน (exit code {worker.process.exitcode}) "
+                     f"เริ่มใหม่ใน {worker.backoff:.0f} วินาที")
+        worker.process = None
+
+    def _restart(self, worker):
+        """หยุด worker ที่ค้าง (terminate แล้ว kill) ให้ _check เริ่มใหม่"""
+        worker.process.terminate()
+        worker.process.join(STOP_TIMEOUT)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+
+    def _check_api_health(self):
+        self._health_checked = time.monotonic()
+        if not any(w.alive() and w.role == "api" for w in self._pool):
+            return
+        host = "127.0.0.1" if API_HOST in ("0.0.0.0", "") else API_HOST
+        try:
+            with urllib.request.urlopen(f"http://{host}:{API_PORT}/health", timeout=5) as response:
+                healthy = response.status == 200
+        except Exception:
+            healthy = False
+
+        self._health_failures = 0 if healthy else self._health_failures + 1
+        if self._health_failures >= SUPERVISOR_HEALTH_FAILURES:
+            logger.error(f"❌ /health ล้มเหลว {self._health_failures} ครั้งติดกัน restart API workers")
+            self._health_failures = 0
+            for worker in self._pool:
+                if worker.role == "api" and worker.alive():
+                    self._restart(worker)
+
+    def _listen(self):
+        """เปิด socket ของ API ครั้งเดียวใน supervisor แล้วแชร์ให้ทุก API worker"""
+        family = socket.AF_INET6 if ":" in API_HOST else socket.AF_INET
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((API_HOST, API_PORT))
+        listener.listen(128)
+        logger.info(f"🌐 เปิด socket ของ API ที่ {API_HOST}:{API_PORT}")
+        return listener
+
+    @staticmethod
+    def _normalize(workers):
+        counts = {}
+        for role in ROLES:
+            count = max(0, int(workers.get(role, 0)))
+            if role in SINGLE_ROLES and count > 1:
+                logger.warning(f"⚠️ {role} รันได้สูงสุด 1 process (ตั้งไว้ {count})")
+                count = 1
+            counts[role] = count
+        if counts["api"] > MAX_API_WORKERS:
+            logger.error(f"❌ SUPERVISOR_API_WORKERS={counts['api']} ไม่รองรับ: stores (users.json, profiles.json, "
+                         f"audit_logs.json, tokens.json, ...) ล็อกได้เฉพาะภายใน process API หลาย process "
+                         f"จะเขียนทับข้อมูลกัน ใช้ {MAX_API_WORKERS} worker")
+            counts["api"] = MAX_API_WORKERS
+        if counts["watcher"] and not counts["processor"]:
+            logger.warning("⚠️ ไม่มี processor worker เหตุการณ์จาก watcher จะถูกบันทึก log เท่านั้น")
+        return counts
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+System Monitor - เก็บค่าสุขภาพระบบแบบ background ลง ring buffer
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from array import array
+from typing import Dict, Optional
+
+from config import HEALTH_SAMPLE_INTERVAL, HEALTH_BUFFER_SIZE
+
+logger = logging.getLogger(__name__)
+
+# ค่าที่เก็บในแต่ละรอบ
+METRICS = ("cpu", "memory", "disk", "open_fds", "threads", "rss_mb")
+
+# หน้าต่างเวลา (วินาที) สำหรับสรุป p50/p95
+DEFAULT_WINDOWS = (60, 300, 900)
+# sample แรกของ process วัด CPU ในช่วงสั้นๆ นี้ (วินาที) เพราะยังไม่มีจุดอ้างอิงจาก sample ก่อนหน้า
+CPU_PRIME_INTERVAL = 0.1
+
+
+class SystemSampler:
+    """เก็บ CPU, หน่วยความจำ, disk, FD, threads และ RSS ของ process เป็นระยะ"""
+
+    def __init__(self, interval=10.0, capacity=360, disk_path="/"):
+        """
+        Args:
+            interval: ช่วงเวลาระหว่างการเก็บแต่ละครั้ง (วินาที)
+            capacity: จำนวน sample สูงสุดใน ring buffer
+            disk_path: path ที่ใช้วัดการใช้ disk
+        """
+        self.interval = interval
+        self.capacity = capacity
+        self.disk_path = disk_path
+
+        # ring buffer แบบ array('d') ขนาดคงที่ ไม่สร้าง object ต่อ sample
+        self._times = array('d', bytes(8 * capacity))
+        self._buffers = {name: array('d', bytes(8 * capacity)) for name in METRICS}
+        self._next = 0
+        self._count = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = None
+
+    # ===== Lifecycle =====
+
+    def start(self):
+        """เริ่ม thread เก็บค่า"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+        self._thread.start()
+        logger.info(f"📈 เริ่มเก็บสถานะระบบทุก {self.interval} วินาที")
+
+    def ensure_started(self):
+        """เริ่ม thread ถ้ายังไม่ทำงาน (เรียกซ้ำได้)"""
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+
+    def stop(self):
+        """หยุด thread เก็บค่า"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample_once()
+            except ImportError:
+                logger.warning("psutil ไม่ได้ติดตั้ง - หยุดเก็บสถานะระบบ")
+                return
+            except Exception as e:
+                logger.warning(f"ไม่สามารถเก็บสถานะระบบ: {e}")
+            self._stop.wait(self.interval)
+
+    # ===== Sampling =====
+
+    def sample_once(self) -> Dict:
+        """เก็บค่าหนึ่งครั้งและบันทึกลง ring buffer (ครั้งแรกรอ CPU_PRIME_INTERVAL ครั้งถัดไปไม่ block)"""
+        import psutil
+
+        if self._process is None:
+            self._process = psutil.Process(os.getpid())
+            # ครั้งแรกของ cpu_percent(None) คืนค่า 0 (ไม่มีจุดอ้างอิง) จึงวัดสองครั้งห่างกันสั้นๆ
+            psutil.cpu_percent(interval=None)
+            time.sleep(CPU_PRIME_INTERVAL)
+
+        process = self._process
+        try:
+            open_fds = process.num_fds()
+        except AttributeError:
+            open_fds = process.num_handles()
+
+        sample = {
+            "cpu": psutil.cpu_percent(interval=None),
+            "memory": psutil.virtual_memory().percent,
+            "disk": psutil.disk_usage(self.disk_path).percent,
+            "open_fds": float(open_fds),
+            "threads": float(process.num_threads()),
+            "rss_mb": process.memory_info().rss / (1024 * 1024),
+        }
+
+        with self._lock:
+            slot = self._next
+            self._times[slot] = time.time()
+            for name in METRICS:
+                self._buffers[name][slot] = sample[name]
+            self._next = (slot + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+        return sample
+
+    # ===== Queries =====
+
+    def current(self) -> Optional[Dict]:
+        """ค่าล่าสุด (None ถ้ายังไม่มี sample)"""
+        with self._lock:
+            if not self._count:
+                return None
+            slot = (self._next - 1) % self.capacity
+            current = {name: round(self._buffers[name][slot], 2) for name in METRICS}
+            current["timestamp"] = self._times[slot]
+        return current
+
+    def summary(self, windows=DEFAULT_WINDOWS) -> Dict:
+        """p50/p95 ของแต่ละค่าในแต่ละหน้าต่างเวลา"""
+        now = time.time()
+        with self._lock:
+            times = self._times.tolist()
+            columns = {name: self._buffers[name].tolist() for name in METRICS}
+            count = self._count
+
+        valid = [i for i in range(self.capacity) if times[i] > 0] if count else []
+        result = {}
+        for window in windows:
+            slots = [i for i in valid if times[i] >= now - window]
+            stats = {"samples": len(slots)}
+            for name in METRICS:
+                values = sorted(columns[name][i] for i in slots)
+                stats[name] = {
+                    "p50": _percentile(values, 50),
+                    "p95": _percentile(values, 95),
+                }
+            result[f"{window}s"] = stats
+        return result
+
+
+def _percentile(sorted_values, percent):
+    """percentile แบบ nearest-rank จาก list ที่เรียงแล้ว"""
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(percent / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[rank], 2)
+
+
+def health_status(sample: Dict) -> str:
+    """สรุปสถานะจากค่า sample"""
+    return "ปกติ" if sample["cpu"] < 80 and sample["memory"] < 80 else "ระวัง"
+
+
+# สร้าง instance เดียว
+system_sampler = SystemSampler(interval=HEALTH_SAMPLE_INTERVAL, capacity=HEALTH_BUFFER_SIZE)
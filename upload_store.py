@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Upload Store - เก็บไฟล์อัปโหลดแบบแบ่งโฟลเดอร์ย่อย (shard) แทนการวางทุกไฟล์ไว้ในโฟลเดอร์เดียว
+
+ไฟล์ชื่อ YYYYmmdd_HHMMSS_<ชื่อ> อยู่ที่ uploads/YYYY/MM/DD/ ชื่ออื่นอยู่ที่ uploads/_/<hash 2 หลัก>/
+ตำแหน่งคำนวณจากชื่อไฟล์ได้เลยจึงไม่ต้องมีดัชนี ไฟล์ที่ยังอยู่ที่ root (ก่อน migrate) ยังอ่าน/ลบได้ตามเดิม
+"""
+
+import os
+import re
+import sys
+import zlib
+import logging
+import argparse
+from pathlib import Path
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = DATA_DIR / "uploads"
+# ชื่อที่ upload_file สร้าง: YYYYmmdd_HHMMSS_<ชื่อ>
+DATED_NAME = re.compile(r"^(\d{4})(\d{2})(\d{2})_\d{6}_")
+# โฟลเดอร์ของไฟล์ที่ชื่อไม่มีวันที่ (แบ่งต่อด้วย crc32 ของชื่อ 256 โฟลเดอร์)
+HASH_SHARD = "_"
+MAX_NAME_ATTEMPTS = 1000
+
+
+class UploadStore:
+    """ที่เก็บไฟล์อัปโหลด: หา path จากชื่อ, บันทึกโดยไม่เขียนทับ, ลบ, ไล่รายการ และล้างไฟล์เก่าตาม shard"""
+
+    def __init__(self, root=UPLOAD_DIR):
+        """
+        Args:
+            root: โฟลเดอร์รากของไฟล์อัปโหลด
+        """
+        self.root = Path(root)
+
+    # ===== ตำแหน่งไฟล์ =====
+
+    def shard_for(self, name: str) -> Tuple[str, ...]:
+        """โฟลเดอร์ย่อยของชื่อไฟล์ เช่น ('2024', '05', '01') หรือ ('_', '3f')"""
+        match = DATED_NAME.match(name)
+        if match:
+            return match.groups()
+        return (HASH_SHARD, f"{zlib.crc32(name.encode('utf-8')) & 0xff:02x}")
+
+    def path_for(self, name: str) -> Path:
+        """path ของไฟล์ตาม layout แบบ shard (ไม่ตรวจว่ามีอยู่จริง)"""
+        return self.root.joinpath(*self.shard_for(name), name)
+
+    def resolve(self, name: str) -> Optional[Path]:
+        """path ของไฟล์ที่มีอยู่ (ดู shard ก่อน แล้วจึงดูตำแหน่งเดิมที่ root) คืน None ถ้าไม่พบ"""
+        if not name or name.startswith('.') or '/' in name or '\\' in name:
+            return None
+        for path in (self.path_for(name), self.root / name):
+            if path.is_file():
+                return path
+        return None
+
+    def relative_path(self, path: Path) -> str:
+        """path เทียบกับ root แบบ posix (ใช้กับ X-Accel-Redirect)"""
+        return Path(path).relative_to(self.root).as_posix()
+
+    # ===== เขียน/ลบ =====
+
+    def save_new(self, file, filename: str) -> Path:
+        """บันทึก FileStorage โดยไม่เขียนทับไฟล์เดิม (ชื่อซ้ำได้ _1, _2, ... ใน shard เดียวกัน)
+
+        ไฟล์จึงเปลี่ยนได้ด้วยการสร้าง/ลบเท่านั้น ลายเซ็นของโฟลเดอร์ shard ใช้เป็นเวอร์ชันของรายการได้
+        """
+        stem, suffix = os.path.splitext(filename)
+        for attempt in range(MAX_NAME_ATTEMPTS):
+            name = f"{stem}_{attempt}{suffix}" if attempt else filename
+            if (self.root / name).exists():
+                # ชื่อนี้ยังมีไฟล์เดิมที่ root (ยังไม่ migrate)
+                continue
+            path = self.path_for(name)
+            try:
+                return self._create(path, file)
+            except FileExistsError:
+                continue
+        raise FileExistsError(f"ไม่สามารถตั้งชื่อไฟล์ที่ไม่ซ้ำได้: {filename}")
+
+    def _create(self, path: Path, file) -> Path:
+        for _ in range(2):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                with open(path, 'xb') as dst:
+                    file.save(dst)
+                return path
+            except FileNotFoundError:
+                # shard ว่างถูกลบโดย prune_empty ระหว่าง mkdir กับ open สร้างใหม่แล้วลองอีกครั้ง
+                continue
+        raise FileNotFoundError(f"สร้างโฟลเดอร์ shard ไม่ได้: {path.parent}")
+
+    def delete(self, name: str) -> bool:
+        """ลบไฟล์ตามชื่อ คืน False ถ้าไม่พบ (โฟลเดอร์ shard ที่ว่างถูกเก็บกวาดโดย cleanup)"""
+        path = self.resolve(name)
+        if path is None:
+            return False
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    # ===== รายการไฟล์ =====
+
+    def shards(self) -> List[Tuple[Path, Optional[date]]]:
+        """โฟลเดอร์ shard ทั้งหมด (path, วันที่หรือ None สำหรับ hash shard) วันที่ใหม่สุดก่อน
+
+        อ่านเฉพาะโฟลเดอร์ระดับปี/เดือน/hash ซึ่งมีแต่โฟลเดอร์ย่อย ไม่ list ไฟล์ใน shard
+        """
+        dated, hashed = [], []
+        for year in _subdirs(self.root):
+            if year.name == HASH_SHARD:
+                hashed.extend((shard, None) for shard in _subdirs(year))
+                continue
+            for month in _subdirs(year):
+                for day in _subdirs(month):
+                    try:
+                        dated.append((day, date(int(year.name), int(month.name), int(day.name))))
+                    except ValueError:
+                        continue
+        dated.sort(key=lambda item: item[1], reverse=True)
+        return dated + sorted(hashed)
+
+    def iter_files(self) -> Iterator[os.DirEntry]:
+        """ไฟล์ทั้งหมด (shard วันที่ใหม่สุดก่อน, hash shard, แล้วไฟล์เดิมที่ root) เป็น os.DirEntry"""
+        for directory in [path for path, _ in self.shards()] + [self.root]:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if not entry.name.startswith('.') and entry.is_file(follow_symlinks=False):
+                            yield entry
+            except FileNotFoundError:
+                continue
+
+    def stats(self) -> Dict:
+        """จำนวนไฟล์และขนาดรวม"""
+        count = total = 0
+        for entry in self.iter_files():
+            count += 1
+            total += entry.stat(follow_symlinks=False).st_size
+        return {"files": count, "bytes": total}
+
+    def version(self) -> List:
+        """ลายเซ็นของ root และทุก shard (mtime ของโฟลเดอร์เปลี่ยนเมื่อมีไฟล์ถูกสร้าง/ลบ/ย้าย)
+
+        ใช้เป็นเวอร์ชันของ /files ได้โดยไม่ต้อง stat ทุกไฟล์
+        """
+        signature = []
+        for path in [self.root] + [path for path, _ in self.shards()]:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature.append((str(path), st.st_mtime_ns))
+        return signature
+
+    # ===== ล้างไฟล์ =====
+
+    def cleanup(self, max_age_days: int) -> Dict:
+        """ลบไฟล์ที่เก่ากว่า max_age_days วัน
+
+        shard วันที่ใหม่กว่าวันตัดรอบข้ามได้ทั้งโฟลเดอร์ (ไฟล์อัปโหลดไม่ถูกเขียนทับ mtime ไม่ใหม่กว่าชื่อ)
+        hash shard และไฟล์เดิมที่ root ถูกตรวจทุกไฟล์ตามปกติ
+        """
+        from retention import RetentionEngine, RetentionPolicy
+
+        cutoff = date.today() - timedelta(days=max_age_days)
+        policies = [
+            RetentionPolicy("uploads", path, recursive=False, max_age_days=max_age_days)
+            for path, day in self.shards() if day is None or day <= cutoff
+        ]
+        policies.append(RetentionPolicy("uploads", self.root, recursive=False, max_age_days=max_age_days))
+        summary = RetentionEngine(policies).run()
+        summary["pruned_dirs"] = self.prune_empty()
+        return summary
+
+    def prune_empty(self) -> int:
+        """ลบโฟลเดอร์ shard ที่ว่าง (รวมโฟลเดอร์ปี/เดือนที่ว่างตาม) คืนจำนวนโฟลเดอร์ที่ลบ"""
+        removed = 0
+        for path, _ in self.shards():
+            directory = path
+            while directory != self.root:
+                try:
+                    directory.rmdir()
+                except OSError:
+                    break
+                removed += 1
+                directory = directory.parent
+        return removed
+
+    # ===== Migration =====
+
+    def migrate(self, dry_run=False) -> Dict:
+        """ย้ายไฟล์ที่วางอยู่ที่ root (layout เดิม) เข้า shard ด้วย rename (mtime คงเดิม)"""
+        summary = {"files": 0, "moved": 0, "skipped": 0, "errors": 0}
+        try:
+            entries = [e for e in os.scandir(self.root)
+                       if not e.name.startswith('.') and e.is_file(follow_symlinks=False)]
+        except FileNotFoundError:
+            entries = []
+
+        for entry in entries:
+            summary["files"] += 1
+            target = self.path_for(entry.name)
+            if target.exists():
+                logger.warning(f"⚠️ ข้ามไฟล์ {entry.name}: มีไฟล์ชื่อเดียวกันใน shard แล้ว")
+                summary["skipped"] += 1
+                continue
+            if dry_run:
+                summary["moved"] += 1
+                continue
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.rename(entry.path, target)
+                summary["moved"] += 1
+            except OSError as e:
+                logger.error(f"❌ ย้ายไฟล์ {entry.name} ไม่สำเร็จ: {e}")
+                summary["errors"] += 1
+
+        logger.info(f"{'🔎 (dry-run) ' if dry_run else '✅ '}migrate uploads: {summary}")
+        return summary
+
+
+def _subdirs(path: Path) -> List[Path]:
+    try:
+        with os.scandir(path) as it:
+            return [Path(e.path) for e in it if not e.name.startswith('.') and e.is_dir(follow_symlinks=False)]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+# สร้าง instance เดียว
+upload_store = UploadStore()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="จัดการโฟลเดอร์ไฟล์อัปโหลด (data/uploads)")
+    parser.add_argument("command", choices=["migrate", "stats"],
+                        help="migrate: ย้ายไฟล์จาก layout เดิมเข้า shard, stats: จำนวนไฟล์และขนาดรวม")
+    parser.add_argument("--root", help="โฟลเดอร์อัปโหลด (ค่าเริ่มต้น data/uploads)")
+    parser.add_argument("--dry-run", action="store_true", help="แสดงผลโดยไม่ย้ายไฟล์")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = UploadStore(args.root) if args.root else upload_store
+    summary = store.migrate(dry_run=args.dry_run) if args.command == "migrate" else store.stats()
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
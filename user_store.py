@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+User Repository - ตารางผู้ใช้เดียว (data/users.json) ที่ AuthManager และ DatabaseManager ใช้ร่วมกัน
+"""
+
+import sys
+import logging
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from json_store import read_json, write_json_atomic, read_snapshot, file_signature
+from config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+USERS_FILE = DATA_DIR / "users.json"
+# ตารางผู้ใช้เดิมของ DatabaseManager (ย้ายมารวมด้วย migrate)
+LEGACY_USERS_FILE = Path("database") / "users.json"
+
+
+class UserBatch:
+    """การแก้ไขหลายรายการภายใน UserRepository.batch() (เขียนไฟล์ครั้งเดียวตอนจบ)"""
+
+    def __init__(self, users: List[Dict], index: Dict[str, Dict]):
+        self.users = users
+        self.index = index
+        self.changed = False
+        # ผู้ใช้ที่ถูกปิดบัญชีหรือเปลี่ยน role ใน batch นี้ (token เดิมต้องถูกเพิกถอน)
+        self.access_changed = set()
+        self._next_id = max((u.get('id', 0) for u in users), default=0) + 1
+
+    def get(self, username) -> Optional[Dict]:
+        return self.index.get(username)
+
+    def insert(self, username, password_hash, role='user', active=True) -> Dict:
+        now = datetime.now().isoformat()
+        user = {
+            "id": self._next_id,
+            "username": username,
+            "password": password_hash,
+            "role": role,
+            "active": active,
+            "created_at": now,
+            "updated_at": now
+        }
+        self._next_id += 1
+        self.users.append(user)
+        self.index[username] = user
+        self.changed = True
+        return user
+
+    def update(self, user: Dict, **fields) -> Dict:
+        if ('active' in fields and not fields['active'] and user.get('active', True)) or \
+                ('role' in fields and fields['role'] != user.get('role')):
+            self.access_changed.add(user['username'])
+        user.update(fields)
+        user['updated_at'] = datetime.now().isoformat()
+        self.changed = True
+        return user
+
+
+class UserRepository:
+    """เก็บผู้ใช้ในไฟล์เดียว พร้อมดัชนี username ในหน่วยความจำ"""
+
+    def __init__(self, users_file):
+        """
+        Args:
+            users_file: path ของ users.json
+        """
+        self.users_file = Path(users_file)
+        # lock สำหรับผู้เขียน (read-modify-write) และการถ่าย snapshot
+        self._lock = threading.RLock()
+        self._users = []
+        self._index = {}
+        self._active = 0
+        self._signature = None
+        self._access_listeners = []
+
+    # ===== Reads =====
+
+    def get(self, username) -> Optional[Dict]:
+        """ผู้ใช้ตาม username (None ถ้าไม่พบ)"""
+        self._load()
+        return self._index.get(username)
+
+    def all(self) -> List[Dict]:
+        """ผู้ใช้ทั้งหมด"""
+        return list(self._load())
+
+    def count(self) -> int:
+        return len(self._load())
+
+    def count_active(self) -> int:
+        """จำนวนผู้ใช้ที่ active (นับตอนสร้างดัชนี)"""
+        self._load()
+        return self._active
+
+    def exists(self) -> bool:
+        return self.users_file.exists()
+
+    # ===== Writes =====
+
+    def add(self, username, password_hash, role='user', active=True) -> Optional[Dict]:
+        """เพิ่มผู้ใช้ (None ถ้ามีอยู่แล้ว)"""
+        with self.batch() as batch:
+            if batch.get(username):
+                return None
+            return batch.insert(username, password_hash, role, active)
+
+    def update(self, username, **fields) -> Optional[Dict]:
+        """แก้ไขฟิลด์ของผู้ใช้ (None ถ้าไม่พบ)"""
+        with self.batch() as batch:
+            user = batch.get(username)
+            if user is None:
+                return None
+            return batch.update(user, **fields)
+
+    @contextmanager
+    def batch(self):
+        """แก้ไขหลายรายการภายใต้ lock เดียว แล้วเขียนไฟล์ครั้งเดียว (ถ้ามีการเปลี่ยน)"""
+        with self._lock:
+            batch = UserBatch(self._load(), self._index)
+            try:
+                yield batch
+            except Exception:
+                # record ในแคชอาจถูกแก้ไปแล้ว ให้โหลดจากไฟล์ใหม่
+                self._signature = None
+                raise
+            if batch.changed:
+                self._save(batch.users)
+        # เรียกนอก lock ของตารางผู้ใช้ (listener อาจถือ lock ของ manager อื่น)
+        for username in sorted(batch.access_changed):
+            for listener in self._access_listeners:
+                listener(username)
+
+    def invalidate(self):
+        """ทิ้งดัชนีในหน่วยความจำ ให้โหลดจากไฟล์ใหม่ครั้งถัดไป (หลังไฟล์ถูกเขียนจากภายนอก)"""
+        with self._lock:
+            self._signature = None
+
+    def on_access_change(self, listener):
+        """ลงทะเบียน listener(username) ที่ถูกเรียกหลังบันทึกการปิดบัญชีหรือเปลี่ยน role"""
+        if listener not in self._access_listeners:
+            self._access_listeners.append(listener)
+
+    # ===== Internals =====
+
+    def _load(self) -> List[Dict]:
+        """รายการผู้ใช้ (โหลดใหม่เมื่อไฟล์เปลี่ยน)"""
+        signature = file_signature(self.users_file)
+        if signature is None or signature != self._signature:
+            users = read_json(self.users_file)
+            self._index_users(users)
+            self._signature = signature
+        return self._users
+
+    def _save(self, users):
+        try:
+            write_json_atomic(self.users_file, users)
+        except Exception:
+            self._signature = None
+            raise
+        self._index_users(users)
+        self._signature = file_signature(self.users_file)
+
+    def _index_users(self, users):
+        self._users = users
+        self._index = {u['username']: u for u in users}
+        self._active = sum(1 for u in users if u.get('active', True))
+
+    # ===== Snapshot =====
+
+    def quiesce(self):
+        """หยุดผู้เขียนชั่วคราว (ใช้กับ with)"""
+        return self._lock
+
+    def snapshot(self) -> Dict[str, bytes]:
+        """ถ่าย snapshot ของ users.json"""
+        with self._lock:
+            return read_snapshot([self.users_file], self.users_file.parent)
+
+
+_repositories: Dict[Path, UserRepository] = {}
+_repositories_lock = threading.Lock()
+
+
+def get_user_repository(users_file=None) -> UserRepository:
+    """UserRepository ที่ใช้ร่วมกันต่อไฟล์ (หนึ่งดัชนีและหนึ่ง lock ต่อ path)"""
+    path = Path(users_file or USERS_FILE).resolve()
+    with _repositories_lock:
+        if path not in _repositories:
+            _repositories[path] = UserRepository(path)
+        return _repositories[path]
+
+
+# ===== Migration =====
+
+def migrate_users(data_dir=None, dry_run=False) -> Dict:
+    """รวม data/database/users.json (DatabaseManager เดิม) เข้ากับ data/users.json
+
+    รหัสผ่านและ role ใช้ของ users.json (ตัวที่ใช้ login) เป็นหลัก ผู้ใช้ที่มีเฉพาะในไฟล์เดิมถูกเพิ่มเข้าไป
+    ไฟล์เดิมถูกเปลี่ยนชื่อเป็น users.json.migrated-<เวลา>
+    อ่าน รวม และเขียนภายใต้ lock ของ repository ผู้ใช้ที่ถูกแก้ระหว่างนั้นจึงไม่หายไป
+    """
+    data_dir = Path(data_dir) if data_dir else DATA_DIR
+    users_file = data_dir / "users.json"
+    legacy_file = data_dir / LEGACY_USERS_FILE
+
+    repository = get_user_repository(users_file)
+    with repository.quiesce():
+        current = read_json(users_file) if users_file.exists() else []
+        legacy = read_json(legacy_file) if legacy_file.exists() else []
+        merged, summary = _merge_users(current, legacy)
+        if dry_run:
+            logger.info(f"🔎 (dry-run) migrate users: {summary}")
+            return summary
+
+        write_json_atomic(users_file, merged)
+        repository.invalidate()
+        if legacy_file.exists():
+            backup = legacy_file.with_name(f"users.json.migrated-{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            legacy_file.rename(backup)
+            summary["legacy_backup"] = str(backup)
+
+    logger.info(f"✅ migrate users: {summary}")
+    return summary
+
+
+def _merge_users(current: List[Dict], legacy: List[Dict]) -> Tuple[List[Dict], Dict]:
+    """รวมรายการผู้ใช้สองไฟล์ คืน (รายการใหม่, สรุป)"""
+    legacy_index = {u['username']: u for u in legacy}
+
+    merged, seen = [], set()
+    summary = {"users": len(current), "legacy_users": len(legacy), "merged": 0, "added_from_legacy": 0}
+
+    for user in current:
+        old = legacy_index.get(user['username'], {})
+        if old:
+            summary["merged"] += 1
+        merged.append({
+            "id": user.get('id') or old.get('id'),
+            "username": user['username'],
+            "password": user.get('password') or old.get('password', ""),
+            "role": user.get('role') or old.get('role', 'user'),
+            "active": user.get('active', old.get('active', True)),
+            "created_at": user.get('created_at') or user.get('created') or old.get('created_at'),
+            "updated_at": max(filter(None, (user.get('updated_at'), old.get('updated_at'),
+                                            user.get('created'))), default=None)
+        })
+        seen.add(user['username'])
+
+    for user in legacy:
+        if user['username'] in seen:
+            continue
+        summary["added_from_legacy"] += 1
+        merged.append({
+            "id": user.get('id'),
+            "username": user['username'],
+            "password": user.get('password', ""),
+            "role": user.get('role', 'user'),
+            "active": user.get('active', True),
+            "created_at": user.get('created_at'),
+            "updated_at": user.get('updated_at')
+        })
+        seen.add(user['username'])
+
+    # id ซ้ำหรือไม่มี ให้ออกใหม่ต่อจากค่าสูงสุด
+    next_id = max((u['id'] or 0 for u in merged), default=0) + 1
+    used = set()
+    for user in merged:
+        if not user['id'] or user['id'] in used:
+            user['id'] = next_id
+            next_id += 1
+        used.add(user['id'])
+
+    summary["total"] = len(merged)
+    return merged, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="จัดการตารางผู้ใช้ร่วม (data/users.json)")
+    parser.add_argument("command", choices=["migrate"], help="migrate: รวม database/users.json เข้ากับ users.json")
+    parser.add_argument("--data-dir", help="โฟลเดอร์ข้อมูล (ค่าเริ่มต้น DATA_DIR)")
+    parser.add_argument("--dry-run", action="store_true", help="แสดงผลโดยไม่เขียนไฟล์")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    summary = migrate_users(args.data_dir, dry_run=args.dry_run)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,19 +3,50 @@
 ฟังก์ชันช่วยเหลือและยูทิลิตี้
 """
 
+import json
 import logging
+import zipfile
 from datetime import datetime
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
 
-def create_backup(source_dir, backup_dir):
-    """สร้างสำรองข้อมูล"""
+def create_backup(source_dir, backup_dir, snapshot=None):
+    """สร้างสำรองข้อมูล
+
+    Args:
+        source_dir: โฟลเดอร์ข้อมูลต้นทาง
+        backup_dir: โฟลเดอร์เก็บไฟล์สำรอง
+        snapshot: dict {path สัมพัทธ์: bytes} จาก json_store.capture_snapshot
+    """
     try:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_name = f"backup_{timestamp}"
         logger.info(f"กำลังสร้างสำรองข้อมูล: {backup_name}")
+        
+        if snapshot is None:
+            return True
+        
+        backup_path = Path(backup_dir)
+        backup_path.mkdir(parents=True, exist_ok=True)
+        archive = backup_path / f"{backup_name}.zip"
+        
+        manifest = {
+            "created_at": datetime.now().isoformat(),
+            "source_dir": str(source_dir),
+            "files": {name: len(content) for name, content in snapshot.items()}
+        }
+        
+        # เขียนลงไฟล์ชั่วคราวก่อน แล้ว rename เพื่อไม่ให้เหลือ zip ที่เขียนไม่ครบ
+        tmp_archive = archive.with_suffix(".zip.tmp")
+        with zipfile.ZipFile(tmp_archive, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, content in snapshot.items():
+                zf.writestr(name, content)
+            zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        tmp_archive.replace(archive)
+        
+        logger.info(f"✓ สำรองข้อมูล {len(snapshot)} ไฟล์: {archive.name}")
         return True
     except Exception as e:
         logger.error(f"ข้อผิดพลาดในการสำรองข้อมูล: {e}")
@@ -23,17 +54,15 @@ def create_backup(source_dir, backup_dir):
 
 
 def cleanup_old_files(directory, days=7):
-    """ล้างไฟล์เก่า"""
+    """ล้างไฟล์เก่า (รวมโฟลเดอร์ย่อย) โฟลเดอร์อัปโหลดใช้ UploadStore.cleanup ที่ข้าม shard วันที่ใหม่ได้"""
     try:
-        from datetime import timedelta
-        cutoff_time = datetime.now() - timedelta(days=days)
-        path = Path(directory)
-        
-        if path.exists():
-            for file in path.glob("*"):
-                if file.stat().st_mtime < cutoff_time.timestamp():
-                    file.unlink()
-                    logger.info(f"ลบไฟล์: {file.name}")
+        from retention import RetentionEngine, RetentionPolicy
+        from upload_store import upload_store
+        if Path(directory).resolve() == upload_store.root.resolve():
+            upload_store.cleanup(days)
+            return True
+        policy = RetentionPolicy(Path(directory).name, directory, max_age_days=days)
+        RetentionEngine([policy]).run()
         return True
     except Exception as e:
         logger.error(f"ข้อผิดพลาดในการล้างไฟล์: {e}")
@@ -60,21 +89,19 @@ def generate_report(title, content):
 
 
 def check_system_health():
-    """ตรวจสอบสุขภาพระบบ"""
+    """ตรวจสอบสุขภาพระบบ (ใช้ค่าล่าสุดจาก SystemSampler ไม่ block)"""
     try:
-        import psutil
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        from system_monitor import system_sampler, health_status
+        sample = system_sampler.current() or system_sampler.sample_once()
         
         status = {
-            "cpu": cpu_percent,
-            "memory": memory.percent,
-            "disk": disk.percent,
-            "status": "ปกติ" if cpu_percent < 80 and memory.percent < 80 else "ระวัง"
+            "cpu": sample["cpu"],
+            "memory": sample["memory"],
+            "disk": sample["disk"],
+            "status": health_status(sample)
         }
         
-        logger.info(f"สถานะระบบ - CPU: {cpu_percent}%, หน่วยความจำ: {memory.percent}%, Disk: {disk.percent}%")
+        logger.info(f"สถานะระบบ - CPU: {status['cpu']}%, หน่วยความจำ: {status['memory']}%, Disk: {status['disk']}%")
         return status
     except ImportError:
         logger.warning("psutil ไม่ได้ติดตั้ง")
@@ -3,27 +3,58 @@
 Profile Verification System - ยืนยันตัวตนและส่งโปรไฟล์
 """
 
+import hmac
 import logging
 import secrets
 import string
+import threading
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 import json
 
+from json_store import read_json, write_json_atomic, synchronized, read_snapshot, file_signature
+from lazy import LazyInstance
+from config import DATA_DIR
+
 logger = logging.getLogger(__name__)
 
+# อายุรหัสยืนยัน และจำนวนครั้งที่กรอกผิดได้
+CODE_TTL_MINUTES = 15
+MAX_ATTEMPTS = 3
+
+# อายุคำขอแชร์โปรไฟล์ และระยะเก็บคำขอที่ปฏิเสธ/หมดอายุแล้ว
+SHARE_REQUEST_TTL_HOURS = 24
+SHARE_RETENTION_DAYS = 30
+
 
 class VerificationManager:
     """จัดการการยืนยันตัวตนและโปรไฟล์"""
     
-    def __init__(self):
-        self.data_dir = Path(__file__).parent / "data" / "database"
+    def __init__(self, data_dir=None):
+        """
+        Args:
+            data_dir: โฟลเดอร์ข้อมูล (ค่าเริ่มต้น config.DATA_DIR)
+        """
+        self.data_dir = (Path(data_dir) if data_dir else DATA_DIR) / "database"
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
         self.verifications_db = self.data_dir / "verifications.json"
         self.shared_profiles_db = self.data_dir / "shared_profiles.json"
         
+        # lock สำหรับผู้เขียน (read-modify-write) และการถ่าย snapshot
+        self._lock = threading.RLock()
+        
+        # ดัชนีในหน่วยความจำ: username -> รหัสล่าสุดที่ยังไม่ยืนยัน และชุดผู้ใช้ที่ยืนยันแล้ว
+        self._verifications = []
+        self._active_codes = {}
+        self._verified_users = set()
+        self._verifications_signature = None
+        self._shares = []
+        self._shares_by_code = {}
+        self._shares_by_recipient = {}
+        self._shares_signature = None
+        
         self._init_databases()
     
     def _init_databases(self):
@@ -35,25 +66,31 @@ class VerificationManager:
     
     # ===== Verification Endpoints =====
     
+    @synchronized
     def generate_verification_code(self, username: str) -> str:
-        """สร้างรหัสยืนยัน (6 หลัก)"""
+        """สร้างรหัสยืนยัน (6 หลัก) แทนที่รหัสเดิมที่ยังไม่ใช้ของผู้ใช้"""
         try:
             code = ''.join(secrets.choice(string.digits) for _ in range(6))
             
-            verifications = self._read_json(self.verifications_db)
+            verifications = self._verification_records()
+            # รหัสใหม่ทำให้รหัสเก่าที่ยังไม่ยืนยันของผู้ใช้นี้ใช้ไม่ได้
+            verifications = [
+                v for v in verifications
+                if v['username'] != username or v['verified']
+            ]
             
             verification = {
-                "id": len(verifications) + 1,
+                "id": max((v['id'] for v in verifications), default=0) + 1,
                 "username": username,
                 "code": code,
                 "created_at": datetime.now().isoformat(),
-                "expires_at": (datetime.now() + timedelta(minutes=15)).isoformat(),
+                "expires_at": (datetime.now() + timedelta(minutes=CODE_TTL_MINUTES)).isoformat(),
                 "verified": False,
                 "attempts": 0
             }
             
             verifications.append(verification)
-            self._write_json(self.verifications_db, verifications)
+            self._save_verifications(verifications)
             
             logger.info(f"✅ สร้างรหัสยืนยัน: {username}")
             return code
@@ -62,39 +99,45 @@ class VerificationManager:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return None
     
+    @synchronized
     def verify_code(self, username: str, code: str) -> bool:
-        """ตรวจสอบรหัสยืนยัน"""
+        """ตรวจสอบรหัสยืนยัน (รหัสล่าสุดของผู้ใช้)"""
         try:
-            verifications = self._read_json(self.verifications_db)
-            
-            for v in verifications:
-                if v['username'] == username and not v['verified']:
-                    # ตรวจสอบการหมดอายุ
-                    expires = datetime.fromisoformat(v['expires_at'])
-                    if expires < datetime.now():
-                        logger.warning(f"⚠️ รหัสหมดอายุ: {username}")
-                        return False
-                    
-                    # ตรวจสอบจำนวนครั้งที่พยายาม
-                    if v['attempts'] >= 3:
-                        logger.warning(f"❌ พยายามเกินจำนวน: {username}")
-                        return False
-                    
-                    if v['code'] == code:
-                        v['verified'] = True
-                        v['verified_at'] = datetime.now().isoformat()
-                        self._write_json(self.verifications_db, verifications)
-                        
-                        logger.info(f"✅ ยืนยันสำเร็จ: {username}")
-                        return True
-                    else:
-                        v['attempts'] += 1
-                        self._write_json(self.verifications_db, verifications)
-                        logger.warning(f"❌ รหัสไม่ถูกต้อง: {username}")
-                        return False
-            
-            logger.warning(f"❌ ไม่พบการยืนยัน: {username}")
-            return False
+            verifications = self._verification_records()
+            v = self._active_codes.get(username)
+            
+            if v is None:
+                logger.warning(f"❌ ไม่พบการยืนยัน: {username}")
+                return False
+            
+            # ตรวจสอบการหมดอายุ
+            expires = datetime.fromisoformat(v['expires_at'])
+            if expires < datetime.now():
+                logger.warning(f"⚠️ รหัสหมดอายุ: {username}")
+                return False
+            
+            # ตรวจสอบจำนวนครั้งที่พยายาม
+            if v['attempts'] >= MAX_ATTEMPTS:
+                logger.warning(f"❌ พยายามเกินจำนวน: {username}")
+                return False
+            
+            if hmac.compare_digest(v['code'], str(code)):
+                v['verified'] = True
+                v['verified_at'] = datetime.now().isoformat()
+                # เก็บไว้เฉพาะ record ที่ยืนยันล่าสุดของผู้ใช้
+                verifications = [
+                    r for r in verifications
+                    if r['username'] != username or r is v
+                ]
+                self._save_verifications(verifications)
+                
+                logger.info(f"✅ ยืนยันสำเร็จ: {username}")
+                return True
+            else:
+                v['attempts'] += 1
+                self._save_verifications(verifications)
+                logger.warning(f"❌ รหัสไม่ถูกต้อง: {username}")
+                return False
         
         except Exception as e:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
@@ -103,20 +146,78 @@ class VerificationManager:
     def is_verified(self, username: str) -> bool:
         """ตรวจสอบว่ายืนยันแล้วหรือไม่"""
         try:
-            verifications = self._read_json(self.verifications_db)
-            
-            for v in verifications:
-                if v['username'] == username and v['verified']:
-                    return True
-            
-            return False
+            self._verification_records()
+            return username in self._verified_users
         
         except Exception as e:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return False
     
+    @synchronized
+    def purge_expired_codes(self) -> int:
+        """ลบรหัสที่หมดอายุหรือใช้ครบจำนวนครั้งแล้ว คืนจำนวนที่ลบ"""
+        try:
+            verifications = self._verification_records()
+            now = datetime.now()
+            kept = [
+                v for v in verifications
+                if v['verified'] or (
+                    datetime.fromisoformat(v['expires_at']) >= now and v['attempts'] < MAX_ATTEMPTS
+                )
+            ]
+            removed = len(verifications) - len(kept)
+            if removed:
+                self._save_verifications(kept)
+                logger.info(f"🧹 ลบรหัสยืนยันที่หมดอายุ {removed} รายการ")
+            return removed
+        
+        except Exception as e:
+            logger.error(f"❌ ข้อผิดพลาด: {e}")
+            return 0
+    
+    @synchronized
+    def warm_up(self):
+        """โหลดดัชนีรหัสยืนยันและคำขอแชร์โปรไฟล์ล่วงหน้า"""
+        return {
+            "verifications": len(self._verification_records()),
+            "shared_profiles": len(self._share_records())
+        }
+    
+    def _verification_records(self):
+        """รายการ verifications พร้อมดัชนี (โหลดใหม่เมื่อไฟล์เปลี่ยน)"""
+        signature = file_signature(self.verifications_db)
+        if signature is None or signature != self._verifications_signature:
+            self._index_verifications(self._read_json(self.verifications_db))
+            self._verifications_signature = signature
+        return self._verifications
+    
+    def _save_verifications(self, verifications):
+        try:
+            self._write_json(self.verifications_db, verifications)
+        except Exception:
+            # record ในแคชอาจถูกแก้ไปแล้ว ให้โหลดจากไฟล์ใหม่ครั้งถัดไป
+            self._verifications_signature = None
+            raise
+        self._index_verifications(verifications)
+        self._verifications_signature = file_signature(self.verifications_db)
+    
+    def _index_verifications(self, verifications):
+        """สร้างดัชนีรหัสล่าสุดที่ยังไม่ยืนยันต่อผู้ใช้ และชุดผู้ใช้ที่ยืนยันแล้ว"""
+        active, verified = {}, set()
+        for v in verifications:
+            if v['verified']:
+                verified.add(v['username'])
+            else:
+                latest = active.get(v['username'])
+                if latest is None or v['created_at'] >= latest['created_at']:
+                    active[v['username']] = v
+        self._verifications = verifications
+        self._active_codes = active
+        self._verified_users = verified
+    
     # ===== Profile Sharing =====
     
+    @synchronized
     def request_profile_share(self, username: str, recipient: str) -> str:
         """ขออนุญาตแชร์โปรไฟล์"""
         try:
@@ -125,14 +226,14 @@ class VerificationManager:
                 "username": username,
                 "recipient": recipient,
                 "created_at": datetime.now().isoformat(),
-                "expires_at": (datetime.now() + timedelta(hours=24)).isoformat(),
-                "status": "pending",  # pending, approved, rejected
+                "expires_at": (datetime.now() + timedelta(hours=SHARE_REQUEST_TTL_HOURS)).isoformat(),
+                "status": "pending",  # pending, approved, rejected, expired
                 "security_code": self._generate_security_code()
             }
             
-            shared = self._read_json(self.shared_profiles_db)
+            shared = self._share_records()
             shared.append(share_request)
-            self._write_json(self.shared_profiles_db, shared)
+            self._save_shares(shared)
             
             logger.info(f"📤 ขออนุญาตแชร์โปรไฟล์: {username} -> {recipient}")
             return share_request['security_code']
@@ -141,63 +242,120 @@ class VerificationManager:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return None
     
+    @synchronized
     def approve_profile_share(self, username: str, security_code: str) -> bool:
         """อนุมัติการแชร์โปรไฟล์"""
+        return self._resolve_share(username, security_code, 'approved')
+    
+    @synchronized
+    def reject_profile_share(self, username: str, security_code: str) -> bool:
+        """ปฏิเสธการแชร์โปรไฟล์"""
+        return self._resolve_share(username, security_code, 'rejected')
+    
+    def _resolve_share(self, username, security_code, status):
+        """เปลี่ยนสถานะคำขอที่ยังรออยู่ (ค้นด้วยดัชนี username + security_code)"""
         try:
-            shared = self._read_json(self.shared_profiles_db)
+            shared = self._share_records()
+            share = self._shares_by_code.get((username, security_code))
             
-            for share in shared:
-                if share['username'] == username and share['security_code'] == security_code:
-                    share['status'] = 'approved'
-                    share['approved_at'] = datetime.now().isoformat()
-                    self._write_json(self.shared_profiles_db, shared)
-                    
-                    logger.info(f"✅ อนุมัติแชร์โปรไฟล์: {username}")
-                    return True
-            
-            logger.warning(f"❌ ไม่พบขออนุญาต")
-            return False
+            if share is None or share['status'] != 'pending':
+                logger.warning(f"❌ ไม่พบขออนุญาต")
+                return False
+            
+            if datetime.fromisoformat(share['expires_at']) < datetime.now():
+                share['status'] = 'expired'
+                self._save_shares(shared)
+                logger.warning(f"⚠️ คำขอแชร์หมดอายุ: {username}")
+                return False
+            
+            share['status'] = status
+            share[f'{status}_at'] = datetime.now().isoformat()
+            self._save_shares(shared)
+            
+            if status == 'approved':
+                logger.info(f"✅ อนุมัติแชร์โปรไฟล์: {username}")
+            else:
+                logger.info(f"❌ ปฏิเสธแชร์โปรไฟล์: {username}")
+            return True
         
         except Exception as e:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return False
     
-    def reject_profile_share(self, username: str, security_code: str) -> bool:
-        """ปฏิเสธการแชร์โปรไฟล์"""
+    def get_shared_profiles(self, recipient: str, offset: int = 0, limit: Optional[int] = None) -> list:
+        """ดึงโปรไฟล์ที่ได้รับอนุญาต (เรียงตามเวลาที่ขอ)"""
         try:
-            shared = self._read_json(self.shared_profiles_db)
-            
-            for share in shared:
-                if share['username'] == username and share['security_code'] == security_code:
-                    share['status'] = 'rejected'
-                    share['rejected_at'] = datetime.now().isoformat()
-                    self._write_json(self.shared_profiles_db, shared)
-                    
-                    logger.info(f"❌ ปฏิเสธแชร์โปรไฟล์: {username}")
-                    return True
-            
-            logger.warning(f"❌ ไม่พบขออนุญาต")
-            return False
+            self._share_records()
+            approved = self._shares_by_recipient.get((recipient, 'approved'), [])
+            end = None if limit is None else offset + limit
+            return approved[offset:end]
         
         except Exception as e:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
-            return False
+            return []
     
-    def get_shared_profiles(self, recipient: str) -> list:
-        """ดึงโปรไฟล์ที่ได้รับอนุญาต"""
+    def count_shared_profiles(self, recipient: str) -> int:
+        """จำนวนโปรไฟล์ที่ได้รับอนุญาต"""
+        self._share_records()
+        return len(self._shares_by_recipient.get((recipient, 'approved'), []))
+    
+    @synchronized
+    def expire_share_requests(self) -> Dict[str, int]:
+        """เปลี่ยนคำขอที่เลยกำหนดเป็น expired และลบคำขอที่ปิดไปนานแล้ว"""
         try:
-            shared = self._read_json(self.shared_profiles_db)
+            shared = self._share_records()
+            now = datetime.now()
+            cutoff = now - timedelta(days=SHARE_RETENTION_DAYS)
+            expired = 0
+            
+            for share in shared:
+                if share['status'] == 'pending' and datetime.fromisoformat(share['expires_at']) < now:
+                    share['status'] = 'expired'
+                    expired += 1
             
-            approved = [
-                s for s in shared 
-                if s['recipient'] == recipient and s['status'] == 'approved'
+            # คำขอที่ปฏิเสธ/หมดอายุเกิน SHARE_RETENTION_DAYS ไม่ต้องเก็บไว้
+            kept = [
+                share for share in shared
+                if share['status'] in ('pending', 'approved')
+                or datetime.fromisoformat(share['expires_at']) >= cutoff
             ]
+            removed = len(shared) - len(kept)
             
-            return approved
+            if expired or removed:
+                self._save_shares(kept)
+                logger.info(f"🧹 คำขอแชร์หมดอายุ {expired} รายการ, ลบ {removed} รายการ")
+            return {"expired": expired, "removed": removed}
         
         except Exception as e:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
-            return []
+            return {"expired": 0, "removed": 0}
+    
+    def _share_records(self):
+        """รายการ shared_profiles พร้อมดัชนี (โหลดใหม่เมื่อไฟล์เปลี่ยน)"""
+        signature = file_signature(self.shared_profiles_db)
+        if signature is None or signature != self._shares_signature:
+            self._index_shares(self._read_json(self.shared_profiles_db))
+            self._shares_signature = signature
+        return self._shares
+    
+    def _save_shares(self, shared):
+        try:
+            self._write_json(self.shared_profiles_db, shared)
+        except Exception:
+            self._shares_signature = None
+            raise
+        self._index_shares(shared)
+        self._shares_signature = file_signature(self.shared_profiles_db)
+    
+    def _index_shares(self, shared):
+        """ดัชนี (username, security_code) -> คำขอ และ (recipient, status) -> รายการคำขอ"""
+        by_code, by_recipient = {}, {}
+        for share in shared:
+            by_code[(share['username'], share['security_code'])] = share
+            by_recipient.setdefault((share['recipient'], share['status']), []).append(share)
+        self._shares = shared
+        self._shares_by_code = by_code
+        self._shares_by_recipient = by_recipient
     
     def _generate_security_code(self) -> str:
         """สร้างรหัสความปลอดภัย (8 หลัก)"""
@@ -207,17 +365,26 @@ class VerificationManager:
     
     def _read_json(self, filepath: Path):
         """อ่านไฟล์ JSON"""
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
+        return read_json(filepath)
     
     def _write_json(self, filepath: Path, data):
-        """เขียนไฟล์ JSON"""
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """เขียนไฟล์ JSON (atomic)"""
+        write_json_atomic(filepath, data)
+    
+    # ===== Snapshot =====
+    
+    def quiesce(self):
+        """หยุดผู้เขียนชั่วคราว (ใช้กับ with)"""
+        return self._lock
+    
+    def snapshot(self) -> Dict[str, bytes]:
+        """ถ่าย snapshot ของ verifications และ shared_profiles ณ จุดเวลาเดียว"""
+        with self._lock:
+            return read_snapshot(
+                [self.verifications_db, self.shared_profiles_db],
+                self.data_dir.parent
+            )
 
 
-# สร้าง instance เดียว
-verification_manager = VerificationManager()
+# สร้าง instance เดียว (สร้างจริงเมื่อถูกใช้ครั้งแรก)
+verification_manager = LazyInstance(VerificationManager)
@@ -8,6 +8,10 @@ from functools import wraps
 from datetime import datetime
 import logging
 
+from auth import current_context
+from rate_limit import rate_limiter, client_ip, current_username
+from http_cache import conditional
+
 logger = logging.getLogger(__name__)
 
 
@@ -41,7 +45,9 @@ def register_verification_routes(app, verification_manager, db_manager, require_
     
     
     @app.route('/verify/confirm-code', methods=['POST'])
+    @rate_limiter.limit(("verify_ip", client_ip))
     @require_auth
+    @rate_limiter.limit(("verify_user", current_username))
     def confirm_verification_code():
         """ยืนยันรหัส"""
         try:
@@ -84,8 +90,9 @@ def register_verification_routes(app, verification_manager, db_manager, require_
     def get_verification_status():
         """ตรวจสอบสถานะการยืนยัน"""
         try:
-            username = request.current_user['username']
-            profile = db_manager.get_profile(username)
+            context = current_context()
+            username = context.username
+            profile = context.profile
             
             verified = verification_manager.is_verified(username)
             
@@ -207,19 +214,30 @@ def register_profile_share_routes(app, verification_manager, db_manager, require
     
     @app.route('/profile/shared-with-me', methods=['GET'])
     @require_auth
+    @conditional(lambda: [verification_manager.shared_profiles_db])
     def get_shared_profiles():
         """ดูโปรไฟล์ที่ได้รับอนุญาติแชร์"""
         try:
             username = request.current_user['username']
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(max(1, int(request.args.get('limit', 50))), 500)
             
-            shared_profiles = verification_manager.get_shared_profiles(username)
+            shared_profiles = verification_manager.get_shared_profiles(username, offset=offset, limit=limit)
+            total = verification_manager.count_shared_profiles(username)
             
             return jsonify({
                 "success": True,
                 "count": len(shared_profiles),
+                "total": total,
+                "offset": offset,
+                "limit": limit,
+                "next_offset": offset + limit if offset + limit < total else None,
                 "shared_profiles": shared_profiles
             }), 200
         
+        except ValueError:
+            return jsonify({"error": "offset และ limit ต้องเป็นตัวเลข"}), 400
+        
         except Exception as e:
             logger.error(f"❌ ข้อผิดพลาด: {e}")
             return jsonify({"error": str(e)}), 500
@@ -231,4 +249,3 @@ def register_all_verification_routes(app, verification_manager, db_manager, requ
     register_profile_share_routes(app, verification_manager, db_manager, require_auth)
 
 
-from datetime import datetime